@@ -0,0 +1,436 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backend.home_simulator import ACTION_FIELDS
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_SEGMENT_S = float(os.getenv("ARCHIVE_SEGMENT_S", 300.0))  # 0 = no archive
+# "1" = leave the per-home actions out of the Mongo snapshots once they are archived
+ARCHIVE_STRIP_ACTIONS = os.getenv("ARCHIVE_STRIP_ACTIONS", "0") == "1"
+ARCHIVE_BLOCK_HOMES = int(os.getenv("ARCHIVE_BLOCK_HOMES", 4096))
+
+SCALAR_COLUMNS = ("frequency", "total_load", "total_generation", "use_featherless")
+# Continuous actions in [-1, 1] are stored as int8 steps of 1 / ACTION_SCALE; discrete ones as-is
+ACTION_SCALE = 127
+MANIFEST = "index.json"
+
+
+def _partition(t: float) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(t))
+
+
+def _write_atomic(path: str, write):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+class SnapshotArchive:
+    """
+    Columnar archive of the grid snapshots, in compressed segment files
+    partitioned by day.
+
+    append() runs on the event loop and only copies one snapshot into the
+    open segment. Scalars go in one column each. Actions are quantized to
+    int8 in a (ticks, homes, width) block. A segment is sealed when the
+    clock crosses a `segment_s` boundary or the block is full. A worker
+    thread then writes it as `<dir>/<YYYY-MM-DD>/seg_<t>.npz`. The actions
+    are split into blocks of `block_homes` homes, with one array per block
+    and field. Each home's series runs along time and is delta-coded, so a
+    home holding one action is a run of zeros for the compressor. Each
+    segment also stores, per field, how many ticks every home's action
+    was above zero.
+
+    Each partition has an `index.json` manifest. It records every
+    segment's time range, the min/max of every scalar column and the
+    per-block min/max of every action field. Queries use it to skip
+    segments outside the time range or value filter, and to decompress
+    only the blocks and field of the requested homes. A block that never
+    crosses a threshold is counted without being read. Counts above zero
+    over whole segments come from the stored per-home totals.
+    """
+
+    def __init__(self, directory: str, home_ids, segment_s: float = ARCHIVE_SEGMENT_S, interval: float = 1.0,
+                 block_homes: int = ARCHIVE_BLOCK_HOMES):
+        self.directory = directory
+        self.home_ids = list(home_ids)
+        self.index = {home_id: row for row, home_id in enumerate(self.home_ids)}
+        self.n_homes = len(self.home_ids)
+        self.segment_s = segment_s
+        # Ticks one buffer holds: a full window at the expected rate, with some slack
+        self.capacity = max(2, int(math.ceil(segment_s / interval * 1.1)))
+        self.block_homes = block_homes
+
+        self.segments = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive")
+        self._pending = None
+        self._free = []
+        self._open = None
+        self._rows = 0
+        self._window = None
+        self._quantized = None
+
+        self.appended = 0
+        self.sealed = 0
+        self.errors = 0
+        self.bytes_written = 0
+        self.raw_bytes = 0
+        self.last_write_ms = 0.0
+
+    def open(self):
+        """Loads the manifests of the partitions already on disk."""
+        os.makedirs(self.directory, exist_ok=True)
+        segments = []
+        for partition in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, partition, MANIFEST)
+            if os.path.exists(path):
+                with open(path) as f:
+                    segments += json.load(f)
+        segments.sort(key=lambda s: s["t_min"])
+        with self._lock:
+            self.segments = segments
+        logger.info(f"Archive at {self.directory}: {len(segments)} segment(s).")
+
+    def append(self, snapshot: dict, actions):
+        """Adds one snapshot; `actions` is an array aligned to the fleet rows or a `{home_id: action}` dict."""
+        t = float(snapshot["timestamp"])
+        actions = self._action_array(actions)
+        integer = actions.dtype.kind in "iub"
+        window = int(t // self.segment_s)
+        buf = self._open
+        if buf is not None and (window != self._window or self._rows == self.capacity
+                                or buf["actions"].shape[2] != actions.shape[1] or buf["integer"] != integer):
+            self._seal()
+            buf = None
+        if buf is None:
+            buf = self._open = self._buffer(actions.shape[1], integer)
+            self._window = window
+
+        row = self._rows
+        buf["t"][row] = t
+        for i, column in enumerate(SCALAR_COLUMNS):
+            buf["scalars"][row, i] = snapshot.get(column) or 0.0
+        target = buf["actions"][row]
+        if integer:
+            np.clip(actions, -ACTION_SCALE, ACTION_SCALE, out=target, casting="unsafe")
+        else:
+            q = self._quantized
+            np.multiply(actions, ACTION_SCALE, out=q)
+            np.rint(q, out=q)
+            np.clip(q, -ACTION_SCALE, ACTION_SCALE, out=q)
+            target[:] = q
+        self._rows += 1
+        self.appended += 1
+
+    def _action_array(self, actions) -> np.ndarray:
+        if not isinstance(actions, dict):
+            actions = np.asarray(actions)
+            return actions.reshape(len(actions), -1)
+        values = np.asarray(list(actions.values()))
+        values = values.reshape(len(values), -1)
+        if list(actions.keys()) == self.home_ids:
+            return values
+        array = np.zeros((self.n_homes, values.shape[1]), dtype=values.dtype)
+        rows = [self.index.get(home_id, -1) for home_id in actions]
+        known = np.asarray(rows) >= 0
+        array[np.asarray(rows)[known]] = values[known]
+        return array
+
+    def _buffer(self, width: int, integer: bool) -> dict:
+        for i, buf in enumerate(self._free):
+            if buf["actions"].shape[2] == width:
+                buf = self._free.pop(i)
+                break
+        else:
+            buf = {
+                "t": np.empty(self.capacity),
+                "scalars": np.empty((self.capacity, len(SCALAR_COLUMNS))),
+                "actions": np.empty((self.capacity, self.n_homes, width), dtype=np.int8),
+            }
+        buf["integer"] = integer
+        if self._quantized is None or self._quantized.shape[1] != width:
+            self._quantized = np.empty((self.n_homes, width), dtype=np.float32)
+        return buf
+
+    def _seal(self):
+        if self._open is None or not self._rows:
+            return
+        self._pending = self._executor.submit(self._write, self._open, self._rows)
+        self._open = None
+        self._rows = 0
+
+    def _write(self, buf: dict, rows: int):
+        start = time.perf_counter()
+        try:
+            self._write_segment(buf, rows)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Archive segment write failed: {e}", exc_info=True)
+        finally:
+            self._free.append(buf)  # the writer is done with it; append() may reuse it
+        self.last_write_ms = (time.perf_counter() - start) * 1000.0
+
+    def _write_segment(self, buf: dict, rows: int):
+        t = buf["t"][:rows]
+        scalars = buf["scalars"][:rows]
+        actions = buf["actions"][:rows]
+        width = actions.shape[2]
+
+        arrays = {"t": t}
+        columns = {}
+        for i, column in enumerate(SCALAR_COLUMNS):
+            arrays[column] = scalars[:, i]
+            columns[column] = [float(scalars[:, i].min()), float(scalars[:, i].max())]
+        active = (actions > 0).sum(axis=0, dtype=np.uint32)
+        for f in range(width):
+            arrays[f"active_{f}"] = active[:, f]
+        blocks = []
+        for b, lo in enumerate(range(0, self.n_homes, self.block_homes)):
+            block = actions[:, lo:lo + self.block_homes]
+            # (width, homes, ticks), each home's series contiguous, then delta-coded mod 256
+            series = np.ascontiguousarray(block.transpose(2, 1, 0)).view(np.uint8)
+            delta = series.copy()
+            np.subtract(series[..., 1:], series[..., :-1], out=delta[..., 1:])
+            for f in range(width):
+                arrays[f"actions_{b}_{f}"] = delta[f]
+            blocks.append([block.min(axis=(0, 1)).tolist(), block.max(axis=(0, 1)).tolist()])
+
+        partition = _partition(t[0])
+        directory = os.path.join(self.directory, partition)
+        os.makedirs(directory, exist_ok=True)
+        name = f"seg_{t[0]:.3f}.npz"
+        path = os.path.join(directory, name)
+        _write_atomic(path, lambda f: np.savez_compressed(f, **arrays))
+
+        size = os.path.getsize(path)
+        entry = {
+            "file": os.path.join(partition, name),
+            "t_min": float(t[0]),
+            "t_max": float(t[-1]),
+            "rows": rows,
+            "n_homes": self.n_homes,
+            "width": width,
+            "scale": 1 if buf["integer"] else ACTION_SCALE,
+            "block_homes": self.block_homes,
+            "bytes": size,
+            "columns": columns,
+            "blocks": blocks,
+        }
+        with self._lock:
+            self.segments.append(entry)
+            self.segments.sort(key=lambda s: s["t_min"])
+            manifest = [s for s in self.segments if s["file"].startswith(partition + os.sep)]
+        _write_atomic(os.path.join(directory, MANIFEST), lambda f: f.write(json.dumps(manifest).encode()))
+        self.sealed += 1
+        self.bytes_written += size
+        self.raw_bytes += t.nbytes + scalars.nbytes + actions.nbytes
+
+    def flush(self):
+        """Seals the open segment and blocks until every sealed segment is on disk."""
+        self._seal()
+        if self._pending is not None:
+            self._pending.result()
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+    # --- Queries (blocking; run them off the event loop) ---
+
+    def _select(self, start: float = None, end: float = None, where: dict = None):
+        """Segments overlapping [start, end] whose column ranges can satisfy `where`, and how many were skipped."""
+        start = -math.inf if start is None else start
+        end = math.inf if end is None else end
+        with self._lock:
+            segments = list(self.segments)
+        selected = []
+        for s in segments:
+            if s["t_max"] < start or s["t_min"] > end:
+                continue
+            if where and any(s["columns"][c][1] < lo or s["columns"][c][0] > hi
+                             for c, (lo, hi) in where.items()):
+                continue
+            selected.append(s)
+        return selected, len(segments) - len(selected)
+
+    def _load(self, segment: dict, keys):
+        with np.load(os.path.join(self.directory, segment["file"])) as data:
+            return [data[k] for k in keys]
+
+    def _rows_of(self, homes) -> np.ndarray:
+        rows = [self.index[h] if isinstance(h, str) else int(h) for h in homes]
+        return np.asarray(rows, dtype=np.int64)
+
+    def _decode(self, delta: np.ndarray) -> np.ndarray:
+        """(homes, ticks) int8 actions of one field from their delta-coded block."""
+        return np.cumsum(delta, axis=-1, dtype=np.uint8).view(np.int8)
+
+    def _field(self, segment: dict, field: str) -> int:
+        names = ACTION_FIELDS if segment["width"] == len(ACTION_FIELDS) else \
+            tuple(f"action{i}" for i in range(segment["width"]))
+        if field not in names:
+            raise ValueError(f"Unknown action field {field!r}; this segment has {', '.join(names)}.")
+        return names.index(field)
+
+    def query_grid(self, start: float = None, end: float = None, columns=SCALAR_COLUMNS, where: dict = None,
+                   limit: int = None) -> dict:
+        """
+        Scalar columns over [start, end]. `where` keeps rows with each named
+        column inside `[lo, hi]`, e.g. `{"frequency": [0, 49.8]}`, and skips
+        segments whose min/max rule them out.
+        """
+        unknown = (set(columns) | set(where or ())) - set(SCALAR_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+        segments, skipped = self._select(start, end, where)
+        keys = ["t", *dict.fromkeys([*columns, *(where or ())])]
+        parts = {k: [] for k in keys}
+        for s in segments:
+            values = dict(zip(keys, self._load(s, keys)))
+            mask = np.ones(len(values["t"]), dtype=bool)
+            if start is not None:
+                mask &= values["t"] >= start
+            if end is not None:
+                mask &= values["t"] <= end
+            for column, (lo, hi) in (where or {}).items():
+                mask &= (values[column] >= lo) & (values[column] <= hi)
+            for k in keys:
+                parts[k].append(values[k][mask])
+        out = {k: np.concatenate(v) if v else np.empty(0) for k, v in parts.items()}
+        rows = len(out["t"])
+        if limit and rows > limit:
+            keep = np.linspace(0, rows - 1, limit).astype(np.int64)
+            out = {k: v[keep] for k, v in out.items()}
+        return {
+            "rows": rows,
+            "segments_scanned": len(segments),
+            "segments_skipped": skipped,
+            **{k: out[k].tolist() for k in ["t", *columns]},
+        }
+
+    def home_actions(self, homes, start: float = None, end: float = None) -> dict:
+        """Per-tick actions of the given homes (ids or rows); only their blocks are decompressed."""
+        rows = self._rows_of(homes)
+        segments, skipped = self._select(start, end)
+        times, values = [], []
+        blocks_read = 0
+        for s in segments:
+            (t,) = self._load(s, ["t"])
+            mask = np.ones(len(t), dtype=bool)
+            if start is not None:
+                mask &= t >= start
+            if end is not None:
+                mask &= t <= end
+            out = np.zeros((len(rows), s["width"], int(mask.sum())), dtype=np.float32)
+            inside = rows < s["n_homes"]
+            for b in np.unique(rows[inside] // s["block_homes"]):
+                wanted = np.flatnonzero(inside & (rows // s["block_homes"] == b))
+                fields = self._load(s, [f"actions_{b}_{f}" for f in range(s["width"])])
+                local = rows[wanted] - b * s["block_homes"]
+                for f, delta in enumerate(fields):
+                    out[wanted, f] = self._decode(delta)[local][:, mask]
+                blocks_read += 1
+            times.append(t[mask])
+            values.append(out / s["scale"])
+        actions = np.concatenate(values, axis=2) if values else np.empty((len(rows), 0, 0))
+        return {
+            "homes": [self.home_ids[r] if r < self.n_homes else int(r) for r in rows],
+            "segments_scanned": len(segments),
+            "segments_skipped": skipped,
+            "blocks_read": blocks_read,
+            "t": np.concatenate(times).tolist() if times else [],
+            # per home: one list of values per action field
+            "actions": actions.tolist(),
+        }
+
+    def participation(self, homes=None, start: float = None, end: float = None, field: str = "ac",
+                      above: float = 0.0, top: int = 20) -> dict:
+        """
+        How often each home's `field` action was above `above` (e.g. AC
+        curtailed) over [start, end]. With `homes=None` every home is
+        counted and the `top` most frequent are returned. A block whose
+        recorded max never exceeds the threshold is counted as zero
+        without being read. With `above=0`, segments wholly inside the range
+        use their stored per-home counts.
+        """
+        rows = np.arange(self.n_homes) if homes is None else self._rows_of(homes)
+        counts = np.zeros(len(rows), dtype=np.int64)
+        segments, skipped = self._select(start, end)
+        ticks = 0
+        blocks_read = blocks_skipped = rollups = 0
+        for s in segments:
+            f = self._field(s, field)
+            threshold = above * s["scale"]
+            inside = rows < s["n_homes"]
+            whole = (start is None or s["t_min"] >= start) and (end is None or s["t_max"] <= end)
+            if whole and threshold == 0:
+                (active,) = self._load(s, [f"active_{f}"])
+                counts[inside] += active[rows[inside]]
+                ticks += s["rows"]
+                rollups += 1
+                continue
+            (t,) = self._load(s, ["t"])
+            mask = np.ones(len(t), dtype=bool)
+            if start is not None:
+                mask &= t >= start
+            if end is not None:
+                mask &= t <= end
+            ticks += int(mask.sum())
+            for b in np.unique(rows[inside] // s["block_homes"]):
+                if s["blocks"][b][1][f] <= threshold:
+                    blocks_skipped += 1
+                    continue
+                wanted = np.flatnonzero(inside & (rows // s["block_homes"] == b))
+                (delta,) = self._load(s, [f"actions_{b}_{f}"])
+                series = self._decode(delta)
+                counts[wanted] += (series[rows[wanted] - b * s["block_homes"]][:, mask] > threshold).sum(axis=1)
+                blocks_read += 1
+
+        order = np.argsort(-counts, kind="stable")[:top] if homes is None else np.arange(len(rows))
+        return {
+            "field": field,
+            "above": above,
+            "ticks": ticks,
+            "segments_scanned": len(segments),
+            "segments_skipped": skipped,
+            "blocks_read": blocks_read,
+            "blocks_skipped": blocks_skipped,
+            "segment_totals_used": rollups,
+            "participating_homes": int((counts > 0).sum()),
+            "homes": [{
+                "home_id": self.home_ids[rows[i]] if rows[i] < self.n_homes else int(rows[i]),
+                "count": int(counts[i]),
+                "share": round(int(counts[i]) / ticks, 6) if ticks else 0.0,
+            } for i in order],
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            segments = list(self.segments)
+        return {
+            "directory": self.directory,
+            "segment_s": self.segment_s,
+            "segments": len(segments),
+            "partitions": len({s["file"].split(os.sep)[0] for s in segments}),
+            "t_min": segments[0]["t_min"] if segments else None,
+            "t_max": segments[-1]["t_max"] if segments else None,
+            "archived_mb": round(sum(s["bytes"] for s in segments) / 1e6, 3),
+            "open_rows": self._rows,
+            "appended": self.appended,
+            "sealed": self.sealed,
+            "errors": self.errors,
+            # Raw int8 / float64 columns against what the compressed segments take
+            "compression_ratio": round(self.raw_bytes / self.bytes_written, 2) if self.bytes_written else None,
+            "last_write_ms": round(self.last_write_ms, 3),
+        }
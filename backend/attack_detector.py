@@ -0,0 +1,139 @@
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ATTACK_SYNC_THRESHOLD = float(os.getenv("ATTACK_SYNC_THRESHOLD", 8.0))
+ATTACK_MIN_FRACTION = float(os.getenv("ATTACK_MIN_FRACTION", 0.02))
+
+
+class SyncSpikeDetector:
+    """
+    Streaming detector for synchronized demand-side load spikes.
+
+    Per home, O(1) per sample:
+    - EWMA mean and variance of the load increment, giving a z-score for
+      each new increment
+    - a one-sided CUSUM on that z-score, which catches homes ramping up
+      together over a few ticks as well as single-tick jumps
+
+    Across homes, O(N) per tick with no pairwise terms:
+    - sync score: sqrt(N) * mean(z). For independent homes this is ~N(0, 1);
+      k homes jumping together push it to ~k * z / sqrt(N)
+    - average pairwise correlation of the increments, estimated from the
+      variance of their sum: rho = (var(sum z) / N - 1) / (N - 1), tracked as
+      an EWMA of (sum z)^2
+    - the fraction of homes whose CUSUM fired this tick
+
+    An alert needs both a high sync score and enough homes involved, and is
+    then held off for `cooldown` seconds.
+    """
+
+    def __init__(self, n_homes: int, home_ids=None, alpha: float = 0.05, cusum_k: float = 0.5, cusum_h: float = 5.0,
+                 sync_threshold: float = ATTACK_SYNC_THRESHOLD, min_fraction: float = ATTACK_MIN_FRACTION,
+                 warmup: int = 10, cooldown: float = 30.0, rho_alpha: float = 0.1):
+        self.n_homes = n_homes
+        self.home_ids = list(home_ids) if home_ids is not None else None
+        self.alpha = alpha
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.sync_threshold = sync_threshold
+        self.min_fraction = min_fraction
+        self.warmup = warmup
+        self.cooldown = cooldown
+        self.rho_alpha = rho_alpha
+
+        self.prev = None
+        self.mean = np.zeros(n_homes)
+        self.var = np.ones(n_homes)
+        self.cusum = np.zeros(n_homes)
+        self._z = np.empty(n_homes)
+        self.samples = 0
+        self.sync_score = 0.0
+        self.correlation = 0.0
+        self._sum_sq = float(n_homes)
+        self.fired_fraction = 0.0
+        self.last_alert_at = -np.inf
+        self.alerts = 0
+        self.alert_id = 0
+
+    def update(self, load_kw, now: float = None):
+        """
+        Feeds one tick of per-home load. Returns an alert dict when a
+        synchronized spike is detected, otherwise None.
+        """
+        now = time.monotonic() if now is None else now
+        load = np.asarray(load_kw, dtype=np.float64)
+        if self.prev is None:
+            self.prev = load.copy()
+            return None
+
+        # z-score of this increment against each home's own history
+        z = self._z
+        np.subtract(load, self.prev, out=z)
+        self.prev[:] = load
+        delta = z - self.mean
+        z_std = delta / np.sqrt(self.var + 1e-9)
+        self.mean += self.alpha * delta
+        self.var = (1 - self.alpha) * (self.var + self.alpha * delta * delta)
+        self.samples += 1
+        if self.samples <= self.warmup:
+            return None
+
+        np.clip(z_std, -20.0, 20.0, out=z_std)
+        np.maximum(self.cusum + z_std - self.cusum_k, 0.0, out=self.cusum)
+        fired = self.cusum > self.cusum_h
+
+        total = float(z_std.sum())
+        n = self.n_homes
+        self.sync_score = total / np.sqrt(n)
+        self._sum_sq += self.rho_alpha * (total * total - self._sum_sq)
+        self.correlation = (self._sum_sq / n - 1.0) / max(n - 1, 1)
+        self.fired_fraction = float(fired.mean())
+
+        alert = None
+        if (self.sync_score > self.sync_threshold
+                and self.fired_fraction >= self.min_fraction
+                and now - self.last_alert_at >= self.cooldown):
+            alert = self._alert(fired, z_std)
+            self.last_alert_at = now
+        # Homes that fired start a fresh CUSUM run
+        self.cusum[fired] = 0.0
+        return alert
+
+    def _alert(self, fired, z_std) -> dict:
+        self.alerts += 1
+        self.alert_id += 1
+        rows = np.flatnonzero(fired)
+        top = rows[np.argsort(-z_std[rows])[:10]]
+        logger.warning(
+            f"Synchronized load spike: sync score {self.sync_score:.1f}, "
+            f"{len(rows)} homes ({self.fired_fraction:.1%}) involved"
+        )
+        alert = {
+            "id": self.alert_id,
+            "type": "Security",
+            "message": f"Synchronized load spike across {len(rows)} homes (sync score {self.sync_score:.1f})",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "sync_score": round(self.sync_score, 2),
+            "correlation": round(self.correlation, 4),
+            "fraction": round(self.fired_fraction, 4),
+            "homes_involved": int(len(rows)),
+            "rows": top.tolist(),
+        }
+        if self.home_ids is not None:
+            alert["home_ids"] = [self.home_ids[i] for i in top]
+        return alert
+
+    def stats(self) -> dict:
+        return {
+            "samples": self.samples,
+            "sync_score": round(self.sync_score, 3),
+            "correlation": round(self.correlation, 5),
+            "fired_fraction": round(self.fired_fraction, 5),
+            "alerts": self.alerts,
+        }
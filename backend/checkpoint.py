@@ -0,0 +1,276 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "checkpoints/state.ckpt")
+CHECKPOINT_HZ = float(os.getenv("CHECKPOINT_HZ", 1.0))  # 0 = no checkpointing
+
+MAGIC = b"VPPSTATE"
+FORMAT_VERSION = 1
+PAGE = mmap.PAGESIZE
+HEADER_SIZE = 4 * PAGE
+# File header: magic, format version, layout length; the layout JSON follows
+HEADER = struct.Struct("<8sII")
+# Slot header: generation (0 = invalid), wall time, CRC32 of the payload, meta length
+SLOT_HEADER = struct.Struct("<QdII")
+SLOT_HEADER_SIZE = 64
+ALIGN = 64
+
+
+def _aligned(n: int, to: int) -> int:
+    return -(-n // to) * to
+
+
+class StateCheckpoint:
+    """
+    Crash-consistent checkpoint of live NumPy state in a memory-mapped file.
+
+    `arrays` names the arrays to persist. Their dtypes and shapes form the
+    layout, which is stored as JSON in a versioned header; a file written
+    with a different layout or version is ignored and rebuilt. After the
+    header come two page-aligned slots, each a slot header, a JSON `meta`
+    area for scalars, and one region per array.
+
+    capture() runs on the event loop and only copies the arrays and meta
+    into the slot that is not the newest. A worker thread then computes
+    the slot's CRC and flushes it to disk. The generation number is
+    written last and flushed again, so the slot only counts once
+    everything behind it is on disk; only then does that slot become the
+    newest. If the previous commit is still in flight, the capture is
+    skipped and counted rather than waited for. restore() takes the newest
+    slot whose CRC matches, so a crash mid-copy or mid-flush falls back to
+    the slot before it.
+
+    `dirty`, if given, is called once per capture and returns the rows
+    (along the first axis) written since its previous call, as
+    `{name: rows}`. Rows are accumulated per slot, so a capture copies
+    only what changed since that slot was last written; arrays missing
+    from the result are copied whole.
+    """
+
+    def __init__(self, path: str, arrays: dict, meta_bytes: int = 16384, dirty=None):
+        self.path = path
+        self.arrays = dict(arrays)
+        self.meta_bytes = meta_bytes
+        self.dirty = dirty
+
+        self.layout = {
+            "meta_bytes": meta_bytes,
+            "arrays": [[name, a.dtype.str, list(a.shape)] for name, a in self.arrays.items()],
+        }
+        offset = SLOT_HEADER_SIZE + meta_bytes
+        self._offsets = {}
+        for name, a in self.arrays.items():
+            offset = _aligned(offset, ALIGN)
+            self._offsets[name] = offset
+            offset += a.nbytes
+        self.slot_size = _aligned(offset, PAGE)
+        self.size = HEADER_SIZE + 2 * self.slot_size
+
+        self._file = None
+        self._mm = None
+        self._views = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self._pending = None
+        # Per slot, rows changed since it was last written: {name: [rows, ...] or None
+        # for the whole array}; None for the whole slot
+        self._stale = [None, None]
+        self.generation = 0
+        self.slot = 1  # newest committed slot; the first capture goes to slot 0
+
+        self.captures = 0
+        self.commits = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_capture_ms = 0.0
+        self.last_commit_ms = 0.0
+        self.restored_generation = None
+        self.restore_ms = None
+
+    def open(self):
+        """Maps the file, creating or rebuilding it when missing or written with another layout."""
+        if self._mm is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        layout = json.dumps(self.layout, sort_keys=True).encode()
+        if HEADER.size + len(layout) > HEADER_SIZE:
+            raise ValueError("Checkpoint layout does not fit in the header; register fewer arrays.")
+
+        self._file = open(self.path, "r+b" if os.path.exists(self.path) else "w+b")
+        reuse = os.path.getsize(self.path) == self.size
+        self._file.truncate(self.size)
+        self._mm = mmap.mmap(self._file.fileno(), self.size)
+        if reuse:
+            magic, version, length = HEADER.unpack_from(self._mm, 0)
+            stored = bytes(self._mm[HEADER.size:HEADER.size + length])
+            reuse = magic == MAGIC and version == FORMAT_VERSION and stored == layout
+        if not reuse:
+            logger.info(f"Initializing checkpoint file {self.path} ({self.size / 1e6:.1f} MB).")
+            self._mm[:HEADER_SIZE] = bytes(HEADER_SIZE)
+            for slot in (0, 1):
+                SLOT_HEADER.pack_into(self._mm, self._slot_offset(slot), 0, 0.0, 0, 0)
+            HEADER.pack_into(self._mm, 0, MAGIC, FORMAT_VERSION, len(layout))
+            self._mm[HEADER.size:HEADER.size + len(layout)] = layout
+            self._mm.flush()
+
+        self._views = [
+            {name: np.ndarray(a.shape, dtype=a.dtype, buffer=self._mm, offset=self._slot_offset(slot) + self._offsets[name])
+             for name, a in self.arrays.items()}
+            for slot in (0, 1)
+        ]
+
+    def _slot_offset(self, slot: int) -> int:
+        return HEADER_SIZE + slot * self.slot_size
+
+    def _read_slot(self, slot: int):
+        """(generation, wall time, meta) of a slot whose CRC checks out, else None."""
+        base = self._slot_offset(slot)
+        generation, wall_time, crc, meta_len = SLOT_HEADER.unpack_from(self._mm, base)
+        if generation == 0 or meta_len > self.meta_bytes:
+            return None
+        payload = memoryview(self._mm)[base + SLOT_HEADER_SIZE:base + self.slot_size]
+        try:
+            if zlib.crc32(payload) != crc:
+                logger.warning(f"Checkpoint slot {slot} (generation {generation}) failed its CRC; ignoring it.")
+                return None
+            meta = json.loads(bytes(payload[:meta_len]))
+        finally:
+            payload.release()
+        return generation, wall_time, meta
+
+    def restore(self):
+        """
+        Copies the newest valid slot back into the registered arrays and
+        returns its meta dict (with `checkpoint_time` and `generation`),
+        or None when there is nothing to restore.
+        """
+        self.open()
+        start = time.perf_counter()
+        slots = [(self._read_slot(slot), slot) for slot in (0, 1)]
+        slots = [(found, slot) for found, slot in slots if found is not None]
+        if not slots:
+            return None
+        (generation, wall_time, meta), slot = max(slots, key=lambda s: s[0][0])
+        for name, target in self.arrays.items():
+            np.copyto(target, self._views[slot][name])
+        self.generation = generation
+        self.slot = slot
+        self._stale = [None, None]
+        self._stale[slot] = {}
+        self.restored_generation = generation
+        self.restore_ms = (time.perf_counter() - start) * 1000.0
+        logger.info(f"Restored checkpoint generation {generation} from {time.time() - wall_time:.1f} s ago "
+                    f"in {self.restore_ms:.1f} ms.")
+        return {**meta, "checkpoint_time": wall_time, "generation": generation}
+
+    def capture(self, meta: dict = None) -> bool:
+        """
+        Copies the live arrays (or just their dirty rows) and `meta` into the
+        other slot and hands it to the commit thread. Returns False (and
+        counts a skip) while the previous commit is still in flight.
+        """
+        if self._pending is not None and not self._pending.done():
+            self.skipped += 1
+            return False
+        self.open()
+        start = time.perf_counter()
+        meta = json.dumps(meta or {}).encode()
+        if len(meta) > self.meta_bytes:
+            raise ValueError(f"Checkpoint meta is {len(meta)} bytes; the limit is {self.meta_bytes}.")
+
+        slot = 1 - self.slot
+        base = self._slot_offset(slot)
+        SLOT_HEADER.pack_into(self._mm, base, 0, 0.0, 0, 0)  # invalid until committed
+        self._mm[base + SLOT_HEADER_SIZE:base + SLOT_HEADER_SIZE + len(meta)] = meta
+        self._mm[base + SLOT_HEADER_SIZE + len(meta):base + SLOT_HEADER_SIZE + self.meta_bytes] = \
+            bytes(self.meta_bytes - len(meta))
+        self._mark_stale(self.dirty() if self.dirty is not None else {})
+        stale, views = self._stale[slot], self._views[slot]
+        for name, source in self.arrays.items():
+            rows = None if stale is None else stale.get(name, ())
+            if rows is None:
+                np.copyto(views[name], source)
+            elif rows:
+                rows = np.unique(np.concatenate(rows))
+                views[name][rows] = source[rows]
+        self._stale[slot] = {}
+
+        self.captures += 1
+        self.last_capture_ms = (time.perf_counter() - start) * 1000.0
+        self._pending = self._executor.submit(self._commit, slot, self.generation + 1, time.time(), len(meta))
+        return True
+
+    def _mark_stale(self, written: dict):
+        for stale in self._stale:
+            if stale is None:
+                continue  # the whole slot is copied anyway
+            for name in self.arrays:
+                rows = written.get(name)
+                if rows is None:
+                    stale[name] = None
+                elif stale.get(name, ()) is not None and len(rows):
+                    stale.setdefault(name, []).append(rows)
+
+    def _commit(self, slot: int, generation: int, wall_time: float, meta_len: int):
+        start = time.perf_counter()
+        base = self._slot_offset(slot)
+        try:
+            payload = memoryview(self._mm)[base + SLOT_HEADER_SIZE:base + self.slot_size]
+            try:
+                crc = zlib.crc32(payload)
+            finally:
+                payload.release()
+            self._mm.flush(base, self.slot_size)
+            SLOT_HEADER.pack_into(self._mm, base, generation, wall_time, crc, meta_len)
+            self._mm.flush(base, PAGE)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Checkpoint commit of generation {generation} failed: {e}")
+            return
+        # The slot becomes the newest only once it is on disk; after a failure
+        # the next capture rewrites it and the last good slot stays intact
+        self.slot = slot
+        self.generation = generation
+        self.commits += 1
+        self.last_commit_ms = (time.perf_counter() - start) * 1000.0
+
+    def wait(self):
+        """Blocks until the commit in flight, if any, is on disk."""
+        if self._pending is not None:
+            self._pending.result()
+
+    def close(self):
+        """Waits for the commit in flight and unmaps the file."""
+        self._executor.shutdown(wait=True)
+        self._pending = None
+        if self._mm is not None:
+            self._views = None
+            self._mm.close()
+            self._file.close()
+            self._mm = self._file = None
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "size_mb": round(self.size / 1e6, 3),
+            "generation": self.generation,
+            "captures": self.captures,
+            "commits": self.commits,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "last_capture_ms": round(self.last_capture_ms, 3),
+            "last_commit_ms": round(self.last_commit_ms, 3),
+            "restored_generation": self.restored_generation,
+            "restore_ms": None if self.restore_ms is None else round(self.restore_ms, 3),
+        }
@@ -1,4 +1,7 @@
 import os
+import time
+import asyncio
+from collections import deque
 from motor.motor_asyncio import AsyncIOMotorClient
 import logging
 
@@ -6,9 +9,163 @@ logger = logging.getLogger(__name__)
 
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = "vpp_database"
+WRITE_QUEUE_SIZE = int(os.getenv("WRITE_QUEUE_SIZE", 10000))
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", 100))
+WRITE_MAX_AGE = float(os.getenv("WRITE_MAX_AGE", 1.0))
+WRITE_FULL_POLICY = os.getenv("WRITE_FULL_POLICY", "drop_oldest")
+
+
+class WriteBehindQueue:
+    """
+    Bounded write-behind buffer that coalesces documents into insert_many batches.
+
+    A background task flushes whenever `batch_size` documents are queued or
+    the oldest queued document is `max_age` seconds old, grouping documents by
+    collection. `db` is anything indexable by collection name whose items
+    have an async `insert_many`, so an in-process stand-in can replace Mongo.
+
+    When the queue holds `max_size` documents, `full_policy` decides:
+    "block" makes put() wait for space (backpressure), "drop_oldest" evicts
+    the oldest document, "drop_newest" discards the incoming one. Documents
+    a failed insert_many did not write are counted as dropped too.
+    """
+    POLICIES = ("block", "drop_oldest", "drop_newest")
+
+    def __init__(self, db, max_size: int = WRITE_QUEUE_SIZE, batch_size: int = WRITE_BATCH_SIZE,
+                 max_age: float = WRITE_MAX_AGE, full_policy: str = WRITE_FULL_POLICY):
+        if full_policy not in self.POLICIES:
+            raise ValueError(f"Unknown full_policy: {full_policy}")
+        self.db = db
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.full_policy = full_policy
+
+        self._queue = deque()
+        self._oldest_at = None
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._task = None
+        self._closing = False
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="write-behind")
+
+    async def put(self, collection_name: str, document: dict):
+        if self._closing:
+            raise RuntimeError("Write-behind queue is closed.")
+        while len(self._queue) >= self.max_size:
+            if self.full_policy == "drop_newest":
+                self.dropped += 1
+                return
+            if self.full_policy == "drop_oldest":
+                self._queue.popleft()
+                self.dropped += 1
+                self._oldest_at = self._queue[0][0] if self._queue else None
+                break
+            self._space.clear()
+            await self._space.wait()
+            if self._closing:
+                raise RuntimeError("Write-behind queue is closed.")
+
+        now = time.monotonic()
+        if not self._queue:
+            self._oldest_at = now
+        self._queue.append((now, collection_name, document))
+        self.enqueued += 1
+        if len(self._queue) >= self.batch_size:
+            self._ready.set()
+
+    async def flush(self):
+        """Writes everything currently queued, in batches of `batch_size`."""
+        while self._queue:
+            await self._flush_batch()
+
+    async def close(self):
+        """Stops the background task and flushes what is left."""
+        self._closing = True
+        self._ready.set()
+        self._space.set()
+        if self._task is not None:
+            # Let an in-flight batch finish rather than cancelling it mid-write
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "max_size": self.max_size,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+        }
+
+    async def _run(self):
+        while not self._closing:
+            timeout = self.max_age
+            if self._oldest_at is not None:
+                timeout = max(0.0, self._oldest_at + self.max_age - time.monotonic())
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._ready.clear()
+            if self._queue:
+                await self._flush_batch()
+
+    async def _flush_batch(self):
+        n = min(self.batch_size, len(self._queue))
+        batch = [self._queue.popleft() for _ in range(n)]
+        # Leftovers keep their enqueue time, so staleness stays bounded by max_age
+        self._oldest_at = self._queue[0][0] if self._queue else None
+        if len(self._queue) >= self.batch_size:
+            self._ready.set()
+        self._space.set()
+
+        by_collection = {}
+        for _, collection_name, document in batch:
+            by_collection.setdefault(collection_name, []).append(document)
+
+        start = time.monotonic()
+        for collection_name, documents in by_collection.items():
+            try:
+                await self.db[collection_name].insert_many(documents, ordered=False)
+                self.written += len(documents)
+            except Exception as e:
+                # An unordered bulk write reports how many documents it did insert
+                inserted = (getattr(e, "details", None) or {}).get("nInserted", 0)
+                self.written += inserted
+                self.dropped += len(documents) - inserted
+                self.failed_batches += 1
+                logger.error(f"Write-behind insert_many into {collection_name} failed, "
+                             f"dropped {len(documents) - inserted} documents: {e}")
+        self.batches += 1
+        self.last_flush_ms = (time.monotonic() - start) * 1000.0
+        self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+
 
 class Database:
     client: AsyncIOMotorClient = None
+    write_queue: WriteBehindQueue = None
 
     @classmethod
     async def connect(cls):
@@ -18,8 +175,19 @@ class Database:
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
 
+    @classmethod
+    def start_write_behind(cls, **kwargs) -> WriteBehindQueue:
+        """Routes save_state through a WriteBehindQueue instead of one insert_one per call."""
+        if cls.write_queue is None:
+            cls.write_queue = WriteBehindQueue(cls.get_db(), **kwargs)
+            cls.write_queue.start()
+        return cls.write_queue
+
     @classmethod
     async def close(cls):
+        if cls.write_queue:
+            await cls.write_queue.close()
+            cls.write_queue = None
         if cls.client:
             cls.client.close()
             logger.info("MongoDB connection closed.")
@@ -32,6 +200,9 @@ class Database:
 
     @classmethod
     async def save_state(cls, collection_name: str, document: dict):
+        if cls.write_queue is not None:
+            await cls.write_queue.put(collection_name, document)
+            return
         db = cls.get_db()
         collection = db[collection_name]
         await collection.insert_one(document)
@@ -41,3 +212,12 @@ class Database:
          db = cls.get_db()
          collection = db[collection_name]
          return await collection.find_one(sort=[("_id", -1)])
+
+    @classmethod
+    async def get_recent_states(cls, collection_name: str, limit: int = 86400) -> list:
+        """The newest `limit` documents of a collection, oldest first."""
+        db = cls.get_db()
+        cursor = db[collection_name].find(sort=[("_id", -1)], limit=limit)
+        docs = await cursor.to_list(length=limit)
+        docs.reverse()
+        return docs
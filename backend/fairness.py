@@ -0,0 +1,196 @@
+import logging
+import math
+import os
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FAIRNESS_SCHEDULER = os.getenv("FAIRNESS_SCHEDULER", "1") == "1"
+# Half-life of the accumulated burden / comfort / wear scores
+FAIRNESS_HALF_LIFE_S = float(os.getenv("FAIRNESS_HALF_LIFE_S", 24 * 3600.0))
+
+# Column order of the `[ev, ac, battery]` action rows
+EV, AC, BATTERY = range(3)
+
+
+class FairnessScheduler:
+    """
+    Participation scheduler between the policy and actuation.
+
+    The policy's actions set how much load reduction the fleet should
+    deliver this tick: the sum over homes of the kW each action sheds
+    under the flexibility model. `ev_kw` comes back by pausing an EV and
+    `ac_kw` by curtailing AC, both capped by the home's load, plus up to
+    `battery_kw` from discharging a battery above `soc_floor`. The
+    scheduler then delivers that reduction from the homes that have been
+    inconvenienced least. They are fully curtailed, the last one
+    partially. Every other home is released to its neutral action, but
+    keeps any battery charging the policy asked for.
+
+    Per home it keeps three decaying scores: curtailed kWh (burden), AC
+    kWh given up (comfort) and battery cycles (wear). Their weighted sum
+    is the selection cost. The k cheapest homes are found with
+    argpartition, O(N), and only those k are sorted, so a tick is
+    O(N + k log k).
+
+    Scores decay with a common half-life. They are stored divided by one
+    global decay factor, so decaying every home costs one scalar multiply
+    and a tick only writes the k homes it touched. The common factor
+    leaves the ranking unchanged. Stored values are rescaled before they
+    could overflow.
+    """
+
+    def __init__(self, n_homes: int, ev_kw: float = 1.0, ac_kw: float = 0.8, battery_kw: float = 3.0,
+                 battery_kwh: float = 10.0, soc_floor: float = 0.2, half_life: float = FAIRNESS_HALF_LIFE_S,
+                 burden_weight: float = 1.0, comfort_weight: float = 1.0, wear_weight: float = 5.0, seed=None):
+        self.n_homes = n_homes
+        self.ev_kw = ev_kw
+        self.ac_kw = ac_kw
+        self.battery_kw = battery_kw
+        self.battery_kwh = battery_kwh
+        self.soc_floor = soc_floor
+        self.decay_rate = math.log(2.0) / half_life
+        self.weights = np.array([burden_weight, comfort_weight, wear_weight])
+
+        # (burden kWh, comfort kWh, wear cycles) rows per home, in units of 1 / self.scale
+        self.scores = np.zeros((n_homes, 3))
+        self.cost = np.zeros(n_homes)
+        self.scale = 1.0
+        self.participations = np.zeros(n_homes, dtype=np.int64)
+        # Far below any real cost step: orders equal-cost homes randomly, and keeps
+        # argpartition off its slow path on the many exact ties of a fresh fleet
+        self._tiebreak = np.random.default_rng(seed).random(n_homes) * 1e-12
+
+        self._out = np.empty((n_homes, 3), dtype=np.float32)
+        self._capacity = np.empty(n_homes)
+        self._last = None
+
+        self.ticks = 0
+        self.required_kw = 0.0
+        self.delivered_kw = 0.0
+        self.selected = 0
+        self.shortfall_ticks = 0
+
+    def requested_kw(self, actions, load_kw) -> float:
+        """Total load reduction (kW) the policy's (N, 3) actions ask for under the flexibility model."""
+        shed = np.minimum((1.0 - np.clip(actions[:, EV], 0.0, 1.0)) * self.ev_kw
+                          + np.clip(actions[:, AC], 0.0, 1.0) * self.ac_kw, load_kw)
+        return float(shed.sum() + np.maximum(actions[:, BATTERY], 0.0).sum() * self.battery_kw)
+
+    def schedule(self, actions, load_kw, soc, now: float = None) -> np.ndarray:
+        """
+        Redistributes the reduction requested by `actions` and returns the
+        (N, 3) actions to send. `soc` is the 0-1 battery fraction. The
+        returned buffer is reused across ticks, and `actions` is not modified.
+        """
+        now = time.monotonic() if now is None else now
+        dt = 0.0 if self._last is None else now - self._last
+        self._last = now
+        self._decay(dt)
+
+        actions = np.asarray(actions, dtype=np.float32)
+        required = self.requested_kw(actions, load_kw)
+
+        # Released homes: EVs charge, AC uncurtailed, batteries may still charge
+        out = self._out
+        out[:, EV] = 1.0
+        out[:, AC] = 0.0
+        np.minimum(actions[:, BATTERY], 0.0, out=out[:, BATTERY])
+
+        curtailable = np.minimum(load_kw, self.ev_kw + self.ac_kw)
+        battery_ok = soc > self.soc_floor
+        capacity = self._capacity
+        np.add(curtailable, battery_ok * self.battery_kw, out=capacity)
+
+        chosen, last_fraction = self._select(capacity, required)
+        self.ticks += 1
+        self.required_kw = required
+        self.selected = len(chosen)
+        if not len(chosen):
+            self.delivered_kw = 0.0
+            return out
+
+        fraction = np.ones(len(chosen))
+        fraction[-1] = last_fraction
+        shed = curtailable[chosen]
+        discharges = battery_ok[chosen]
+        rows = np.empty((len(chosen), 3), dtype=np.float32)
+        rows[:, EV] = 1.0 - fraction
+        rows[:, AC] = fraction
+        rows[:, BATTERY] = np.where(discharges, fraction, out[chosen, BATTERY])
+        out[chosen] = rows
+        discharged = discharges * fraction * self.battery_kw
+        delivered = shed * fraction + discharged
+        self.delivered_kw = float(delivered.sum())
+        if self.delivered_kw < required * 0.999:
+            self.shortfall_ticks += 1
+
+        # Charge this tick's inconvenience to the chosen homes only
+        hours = dt / 3600.0 / self.scale
+        added = np.empty((len(chosen), 3))
+        added[:, 0] = delivered * hours
+        added[:, 1] = np.minimum(shed, self.ac_kw) * fraction * hours
+        added[:, 2] = discharged * (hours / self.battery_kwh)
+        self.scores[chosen] += added
+        self.cost[chosen] += added @ self.weights
+        self.participations[chosen] += 1
+        return out
+
+    def _select(self, capacity, required: float):
+        """Cheapest homes whose capacity covers `required`, and the share of the last one that is needed."""
+        if required <= 0:
+            return np.empty(0, dtype=np.int64), 0.0
+        usable = capacity > 0
+        n = int(usable.sum())
+        if n == 0:
+            return np.empty(0, dtype=np.int64), 0.0
+        cost = np.where(usable, self.cost + self._tiebreak, np.inf)
+        # Start from the k the mean capacity suggests; widen if the cheapest k fall short
+        k = min(n, max(1, int(math.ceil(required / float(capacity[usable].mean()) * 1.25))))
+        while True:
+            candidates = np.argpartition(cost, k - 1)[:k] if k < len(cost) else np.arange(len(cost))
+            candidates = candidates[np.argsort(cost[candidates])]
+            candidates = candidates[usable[candidates]]
+            covered = np.cumsum(capacity[candidates])
+            if covered[-1] >= required or k >= n:
+                break
+            k = min(n, 2 * k)
+        m = int(np.searchsorted(covered, required)) + 1
+        m = min(m, len(candidates))
+        chosen = candidates[:m]
+        before = covered[m - 2] if m > 1 else 0.0
+        last_fraction = min(1.0, (required - before) / capacity[chosen[-1]])
+        return chosen, last_fraction
+
+    def _decay(self, dt: float):
+        if dt <= 0:
+            return
+        self.scale *= math.exp(-self.decay_rate * dt)
+        if self.scale < 1e-100:
+            # Fold the decay into the stored values before 1 / scale overflows
+            self.scores *= self.scale
+            self.cost *= self.scale
+            self.scale = 1.0
+
+    def scores_of(self, rows) -> np.ndarray:
+        """(len(rows), 3) decayed burden kWh, comfort kWh and wear cycles."""
+        return self.scores[rows] * self.scale
+
+    def stats(self) -> dict:
+        burden = self.scores[:, 0] * self.scale
+        total = burden.sum()
+        squares = (burden ** 2).sum()
+        return {
+            "ticks": self.ticks,
+            "required_kw": round(self.required_kw, 3),
+            "delivered_kw": round(self.delivered_kw, 3),
+            "selected": self.selected,
+            "shortfall_ticks": self.shortfall_ticks,
+            "participating_homes": int((self.participations > 0).sum()),
+            # Jain's index over burden: 1 = perfectly even, 1 / N = one home carries it all
+            "jain_index": round(float(total ** 2 / (self.n_homes * squares)), 4) if squares > 0 else 1.0,
+            "max_burden_kwh": round(float(burden.max(initial=0.0)), 4),
+            "mean_burden_kwh": round(float(total / max(self.n_homes, 1)), 4),
+        }
@@ -0,0 +1,40 @@
+import numpy as np
+
+
+class RuleBasedController:
+    """
+    Droop-style fleet controller used while the learned policy warms up.
+
+    Takes the (N, 4) `[freq, load, gen, soc]` observation matrix of
+    FleetState and returns (N, 3) `[ev, ac, battery]` actions in the VPPEnv
+    layout. Outside a `deadband` around nominal, the response grows
+    linearly to full at `full_response` Hz of deviation:
+
+    - under-frequency: pause EV charging, curtail AC, discharge batteries
+    - over-frequency: charge batteries
+    Batteries are held at their SoC limits.
+    """
+
+    def __init__(self, f_nominal: float = 50.0, deadband: float = 0.02, full_response: float = 0.2,
+                 soc_min: float = 0.1, soc_max: float = 0.95):
+        self.f_nominal = f_nominal
+        self.deadband = deadband
+        self.full_response = full_response
+        self.soc_min = soc_min
+        self.soc_max = soc_max
+
+    def get_actions(self, observations) -> np.ndarray:
+        obs = np.asarray(observations, dtype=np.float32)
+        error = self.f_nominal - obs[:, 0]  # > 0 when under-frequency
+        response = np.clip((np.abs(error) - self.deadband) / self.full_response, 0.0, 1.0) * np.sign(error)
+        under = np.maximum(response, 0.0)
+
+        actions = np.empty((len(obs), 3), dtype=np.float32)
+        actions[:, 0] = 1.0 - under
+        actions[:, 1] = under
+        battery = actions[:, 2]
+        battery[:] = response
+        soc = obs[:, 3]
+        battery[(soc <= self.soc_min) & (battery > 0)] = 0.0
+        battery[(soc >= self.soc_max) & (battery < 0)] = 0.0
+        return actions
@@ -1,5 +1,8 @@
 import os
+import time
+import asyncio
 import requests
+import httpx
 import json
 import logging
 
@@ -8,6 +11,7 @@ logger = logging.getLogger(__name__)
 FEATHERLESS_API_KEY = os.getenv("FEATHERLESS_API_KEY", "your-featherless-api-key")
 # Placeholder URL for inference endpoint on Featherless
 FEATHERLESS_ENDPOINT = os.getenv("FEATHERLESS_ENDPOINT", "https://api.featherless.ai/v1/inference")
+FEATHERLESS_HEDGE_AFTER = float(os.getenv("FEATHERLESS_HEDGE_AFTER", 0)) or None
 
 class FeatherlessClient:
     """
@@ -52,3 +56,159 @@ class FeatherlessClient:
     def _fallback_actions(self, observations: dict) -> dict:
         """Fallback when API fails. E.g., maintaining current state."""
         return {agent_id: 1 for agent_id in observations.keys()}  # 1 : Maintain
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive endpoint failures.
+
+    After `failure_threshold` failures the breaker opens and callers go
+    straight to the fallback. Once `reset_timeout` seconds have passed a
+    single probe request is let through (half-open); its outcome closes or
+    re-opens the breaker.
+    """
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and self.clock() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                logger.warning("Featherless circuit breaker opened; using fallback actions.")
+            self.state = "open"
+            self.opened_at = self.clock()
+
+
+class AsyncFeatherlessClient(FeatherlessClient):
+    """
+    Non-blocking Featherless client for the asyncio control loop.
+
+    Requests share one pooled keep-alive httpx connection pool. Each call
+    carries its own deadline (normally the time left in the control tick);
+    when it expires, when the request fails, or while the circuit breaker is
+    open, the fallback actions are returned instead. With `hedge_after` set,
+    a second identical request is fired if the first has not answered within
+    that many seconds, and whichever succeeds first wins.
+    """
+    def __init__(self, api_key: str = FEATHERLESS_API_KEY, endpoint: str = FEATHERLESS_ENDPOINT,
+                 max_connections: int = 20, default_deadline: float = 0.5,
+                 hedge_after: float = FEATHERLESS_HEDGE_AFTER, breaker: CircuitBreaker = None):
+        super().__init__(api_key=api_key, endpoint=endpoint)
+        self.default_deadline = default_deadline
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        self.http = httpx.AsyncClient(
+            headers=self.headers,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.requests_sent = 0
+        self.hedges_sent = 0
+        self.fallbacks = 0
+
+    async def infer_action(self, observations: dict, model_id: str = "vpp-marl-model-v1", deadline: float = None) -> dict:
+        """
+        Same contract as FeatherlessClient.infer_action, but awaitable and
+        bounded by `deadline` seconds.
+        """
+        deadline = self.default_deadline if deadline is None else deadline
+        if deadline <= 0:
+            # Our own tick budget is spent: no request goes out, so the breaker is not told
+            self.fallbacks += 1
+            return self._fallback_actions(observations)
+
+        if not self.breaker.allow():
+            self.fallbacks += 1
+            return self._fallback_actions(observations)
+
+        payload = {
+            "model_id": model_id,
+            "observations": observations
+        }
+
+        try:
+            data = await asyncio.wait_for(self._request(payload), timeout=deadline)
+            self.breaker.record_success()
+            return data.get("actions", {})
+
+        except asyncio.TimeoutError:
+            logger.error(f"Featherless inference missed its {deadline * 1000:.0f} ms deadline.")
+        except asyncio.CancelledError:
+            # Cancelled by the caller's own deadline; count it so a
+            # half-open probe is released instead of held forever
+            self.breaker.record_failure()
+            raise
+        except httpx.HTTPStatusError as http_err:
+            logger.error(f"HTTP error occurred during Featherless inference: {http_err} - {http_err.response.text}")
+        except Exception as err:
+            logger.error(f"An error occurred during Featherless inference: {err}")
+
+        self.breaker.record_failure()
+        self.fallbacks += 1
+        return self._fallback_actions(observations)
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.times_opened,
+            "requests_sent": self.requests_sent,
+            "hedges_sent": self.hedges_sent,
+            "fallbacks": self.fallbacks,
+        }
+
+    async def _post(self, payload: dict) -> dict:
+        self.requests_sent += 1
+        response = await self.http.post(self.endpoint, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    async def _request(self, payload: dict) -> dict:
+        if not self.hedge_after:
+            return await self._post(payload)
+
+        pending = {asyncio.create_task(self._post(payload))}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_after)
+            if not done:
+                self.hedges_sent += 1
+                pending.add(asyncio.create_task(self._post(payload)))
+
+            error = None
+            while done or pending:
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
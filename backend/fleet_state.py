@@ -0,0 +1,157 @@
+import logging
+from collections.abc import Mapping
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Column order of the fleet matrix; each name is also exposed as a 1-D view.
+COLUMNS = ("load_kw", "generation_kw", "battery_soc")
+
+
+class FleetState:
+    """
+    Struct-of-arrays store for the telemetry of every simulated home.
+
+    All homes live in one contiguous (len(COLUMNS), N) float64 block, so
+    `load_kw`, `generation_kw` and `battery_soc` are zero-copy row views that
+    the orchestration loop, the forecaster and the policy can read directly.
+    Home ids map to a stable row index that never changes for the lifetime of
+    the store. Fleet totals are cached and kept in sync on every write, so
+    reading them is O(1).
+
+    `buffer` lets the block live in memory owned by someone else (e.g. a
+    shared-memory segment written by simulator processes); call refresh()
+    after such external writes to bring the totals back in sync.
+    """
+
+    def __init__(self, home_ids, seed=None, buffer=None):
+        self.home_ids = list(home_ids)
+        self.index = {home_id: row for row, home_id in enumerate(self.home_ids)}
+        if len(self.index) != len(self.home_ids):
+            raise ValueError("Duplicate home ids in fleet.")
+
+        self.rng = np.random.default_rng(seed)
+        shape = (len(COLUMNS), len(self.home_ids))
+        if buffer is None:
+            self.data = np.zeros(shape, dtype=np.float64)
+        else:
+            self.data = np.ndarray(shape, dtype=np.float64, buffer=buffer)
+        self.load_kw = self.data[0]
+        self.generation_kw = self.data[1]
+        self.battery_soc = self.data[2]
+
+        # Reused output buffer for observation_matrix()
+        self._obs = np.empty((len(self.home_ids), 4), dtype=np.float32)
+        self.total_load = 0.0
+        self.total_generation = 0.0
+
+    @classmethod
+    def random(cls, n_homes: int = 100, seed=None):
+        """Builds a fleet of `home_0..home_{n-1}` with randomized initial state."""
+        fleet = cls((f"home_{i}" for i in range(n_homes)), seed=seed)
+        fleet.randomize()
+        return fleet
+
+    def __len__(self):
+        return len(self.home_ids)
+
+    def randomize(self):
+        """Simulate initial state of every smart home."""
+        n = len(self)
+        np.round(self.rng.uniform(0.5, 5.0, n), 2, out=self.load_kw)
+        np.round(self.rng.uniform(0.0, 3.0, n), 2, out=self.generation_kw)  # e.g., Solar panels
+        np.round(self.rng.uniform(20.0, 100.0, n), 1, out=self.battery_soc)  # State of Charge %
+        self._refresh_totals()
+
+    def apply_noise(self, load_scale: float = 0.1, gen_scale: float = 0.05):
+        """Adds uniform noise to load and generation for the whole fleet in place."""
+        n = len(self)
+        self.load_kw += self.rng.uniform(-load_scale, load_scale, n)
+        np.maximum(self.load_kw, 0.0, out=self.load_kw)
+        np.round(self.load_kw, 2, out=self.load_kw)
+
+        self.generation_kw += self.rng.uniform(-gen_scale, gen_scale, n)
+        np.maximum(self.generation_kw, 0.0, out=self.generation_kw)
+        np.round(self.generation_kw, 2, out=self.generation_kw)
+        self._refresh_totals()
+
+    def update_rows(self, rows, **columns):
+        """Vectorized write of one or more columns for the given row indices."""
+        for name, values in columns.items():
+            self._column(name)[rows] = values
+        self._refresh_totals()
+
+    def update_home(self, home_id: str, **fields):
+        """Writes a single home, adjusting the cached totals incrementally."""
+        row = self.index[home_id]
+        if "load_kw" in fields:
+            self.total_load += float(fields["load_kw"] - self.load_kw[row])
+        if "generation_kw" in fields:
+            self.total_generation += float(fields["generation_kw"] - self.generation_kw[row])
+        for name, value in fields.items():
+            self._column(name)[row] = value
+
+    def get_home(self, home_id: str) -> dict:
+        """Returns a plain dict copy of a single home's telemetry."""
+        row = self.index[home_id]
+        return {name: float(self.data[i, row]) for i, name in enumerate(COLUMNS)}
+
+    def observation_matrix(self, frequency: float) -> np.ndarray:
+        """
+        Returns the (N, 4) `[freq, load_kw, generation_kw, soc]` observation
+        batch in the VPPEnv layout, with SoC as a 0-1 fraction.
+        The buffer is reused across calls; copy it if it must outlive the tick.
+        """
+        self._obs[:, 0] = frequency
+        self._obs[:, 1] = self.load_kw
+        self._obs[:, 2] = self.generation_kw
+        np.multiply(self.battery_soc, 0.01, out=self._obs[:, 3])
+        return self._obs
+
+    def observations_dict(self, frequency: float) -> dict:
+        """Per-home observation lists, for consumers that still expect a dict."""
+        obs = self.observation_matrix(frequency).tolist()
+        return dict(zip(self.home_ids, obs))
+
+    def as_dict(self) -> "FleetStateView":
+        """Read-only `{home_id: {column: value}}` mapping view for API consumers."""
+        return FleetStateView(self)
+
+    def to_dict(self) -> dict:
+        """Materialized dict-of-dicts snapshot of the whole fleet."""
+        cols = [self.data[i].tolist() for i in range(len(COLUMNS))]
+        return {
+            home_id: dict(zip(COLUMNS, values))
+            for home_id, values in zip(self.home_ids, zip(*cols))
+        }
+
+    def refresh(self):
+        """Recomputes the cached totals after `data` was written directly."""
+        self._refresh_totals()
+
+    def _column(self, name: str) -> np.ndarray:
+        try:
+            return self.data[COLUMNS.index(name)]
+        except ValueError:
+            raise KeyError(f"Unknown fleet column: {name}") from None
+
+    def _refresh_totals(self):
+        self.total_load = float(self.load_kw.sum())
+        self.total_generation = float(self.generation_kw.sum())
+
+
+class FleetStateView(Mapping):
+    """Lazy dict-like view over a FleetState; rows are materialized on access."""
+
+    def __init__(self, fleet: FleetState):
+        self._fleet = fleet
+
+    def __getitem__(self, home_id):
+        return self._fleet.get_home(home_id)
+
+    def __iter__(self):
+        return iter(self._fleet.home_ids)
+
+    def __len__(self):
+        return len(self._fleet)
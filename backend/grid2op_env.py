@@ -1,16 +1,28 @@
-import grid2op
-from grid2op.Parameters import Parameters
+import asyncio
 import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backend.metrics import LatencyHistogram
 
 logger = logging.getLogger(__name__)
 
+GRID2OP_ENV = os.getenv("GRID2OP_ENV", "rte_case5_example")
+GRID2OP_POOL_SIZE = int(os.getenv("GRID2OP_POOL_SIZE", 4))
+# MW of grid load per kW of VPP net demand
+GRID2OP_INJECTION_SCALE = float(os.getenv("GRID2OP_INJECTION_SCALE", 0.001))
+
 class Grid2OpEnvWrapper:
     """
     Optional fallback grid simulation using Grid2Op.
     Grid2Op focuses on dispatching energy across an L2EO grid, simulating thermal lines and load flows.
     """
-    def __init__(self, env_name="rte_case5_example"):
+    def __init__(self, env_name="rte_case5_example", **make_kwargs):
         self.env_name = env_name
+        self.make_kwargs = make_kwargs
         self.env = None
         self.obs = None
         self.reward = None
@@ -20,9 +32,13 @@ class Grid2OpEnvWrapper:
     def make_env(self):
         """Initializes the Grid2Op environment."""
         try:
+            # Imported here: grid2op is heavy and only needed once the fallback is switched on
+            import grid2op
+            from grid2op.Parameters import Parameters
+
             param = Parameters()
             param.HARD_OVERFLOW_THRESHOLD = 5.0
-            self.env = grid2op.make(self.env_name, param=param)
+            self.env = grid2op.make(self.env_name, param=param, **self.make_kwargs)
             logger.info("Grid2Op environment initialized successfully.")
         except Exception as e:
             logger.error(f"Failed to initialize Grid2Op environment: {e}")
@@ -57,3 +73,254 @@ class Grid2OpEnvWrapper:
              self.env.close()
              self.env = None
              logger.info("Grid2Op environment closed.")
+
+
+class Grid2OpPool:
+    """
+    Pre-warmed pool of Grid2Op environments, stepped in lockstep off the event loop.
+
+    Each member env is confined to its own single-thread executor, since
+    grid2op envs are not thread-safe. Members are seeded alike, every tick
+    all of them step with the same action plus the VPP's aggregate net
+    demand added to the chronics' next loads as an injection, and when any episode ends all of them reset
+    together, so any member's observation can answer obs.simulate() for the
+    shared state. The step is shielded: a tick cancelled by its stage
+    budget still steps every member.
+
+    The candidate actions (do nothing, and each redispatchable generator up
+    or down) are split across the members and simulated in parallel until
+    the deadline. The best-ranked one is applied on the next tick: the
+    lowest peak line loading among those that do not end the episode.
+    Simulations still running at the deadline are dropped from the ranking
+    and stop after their current candidate; a tick that finds a member
+    still busy is skipped rather than queued behind it.
+    """
+
+    def __init__(self, env_name: str = GRID2OP_ENV, size: int = GRID2OP_POOL_SIZE, redispatch_share: float = 0.5,
+                 injection_scale: float = GRID2OP_INJECTION_SCALE, seed: int = 0):
+        self.env_name = env_name
+        self.size = size
+        self.redispatch_share = redispatch_share
+        self.injection_scale = injection_scale
+        self.seed = seed
+        self.members = []
+        self.executors = []
+        self.state = "cold"  # cold -> warming -> ready | failed
+        self.error = None
+        self.candidates = []
+        self.next_action = 0
+        self._inflight = set()
+        self._lookahead = 0  # bumped at each deadline; older simulations stop early
+
+        self.steps = 0
+        self.resets = 0
+        self.skipped = 0
+        self.evaluated = 0
+        self.dropped = 0
+        self.last = {}
+        self.step_latency = LatencyHistogram()
+        self.lookahead_latency = LatencyHistogram()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def busy(self) -> bool:
+        """True while any member still has a step, reset or simulation running."""
+        return bool(self._inflight)
+
+    async def warm(self):
+        """Creates and resets every member env on its own thread; idempotent."""
+        if self.state in ("warming", "ready"):
+            return
+        self.state = "warming"
+        self.error = None
+        start = time.monotonic()
+        self.members = [Grid2OpEnvWrapper(self.env_name) for _ in range(self.size)]
+        self.executors = [ThreadPoolExecutor(1, thread_name_prefix=f"grid2op-{i}") for i in range(self.size)]
+        try:
+            results = await asyncio.gather(*(self._call(i, self._warm_member, i) for i in range(self.size)),
+                                           return_exceptions=True)
+            failures = [r for r in results if isinstance(r, Exception)]
+            if failures:
+                raise failures[0]
+            self.candidates = await self._call(0, self._build_candidates)
+        except asyncio.CancelledError:
+            self.state = "failed"  # close() at shutdown releases the executors
+            self.error = "warm-up cancelled"
+            raise
+        except Exception as e:
+            self.state = "failed"
+            self.error = f"{type(e).__name__}: {e}"
+            logger.error(f"Grid2Op pool warm-up failed: {self.error}")
+            await asyncio.to_thread(self._shutdown)
+            return
+        self.next_action = 0
+        self.state = "ready"
+        logger.info(f"Grid2Op pool ready: {self.size} x {self.env_name}, {len(self.candidates)} candidate actions, "
+                    f"{time.monotonic() - start:.1f} s.")
+
+    def _call(self, i: int, fn, *args):
+        future = asyncio.get_running_loop().run_in_executor(self.executors[i], fn, *args)
+        self._inflight.add(future)
+        future.add_done_callback(self._inflight.discard)
+        return future
+
+    def _warm_member(self, i: int):
+        from grid2op.Action import CompleteAction  # allows load injections alongside redispatch
+
+        member = self.members[i]
+        member.make_kwargs = {"action_class": CompleteAction}
+        member.make_env()
+        if member.env is None:
+            raise RuntimeError(f"could not create {self.env_name}")
+        member.env.seed(self.seed)  # same chronics and noise on every member
+        if member.reset() is None:
+            raise RuntimeError(f"could not reset {self.env_name}")
+
+    def _build_candidates(self) -> list:
+        env = self.members[0].env
+        space = env.action_space
+        candidates = [("do_nothing", space({}))]
+        for gen in np.flatnonzero(env.gen_redispatchable):
+            step = self.redispatch_share * float(min(env.gen_max_ramp_up[gen], env.gen_max_ramp_down[gen]))
+            if step <= 0:
+                continue
+            candidates.append((f"gen_{gen}_up", space({"redispatch": [(int(gen), step)]})))
+            candidates.append((f"gen_{gen}_down", space({"redispatch": [(int(gen), -step)]})))
+        return candidates
+
+    def _injection(self, member, net_demand_mw: float):
+        # Base is the chronics' load for the step about to be applied, not the last
+        # observed load_p: that already holds last tick's shift, so it would compound
+        try:
+            load_p = np.asarray(member.obs.get_forecasted_inj(time_step=1)[2], dtype=np.float64)
+        except Exception as e:
+            logger.debug(f"Grid2Op load forecast unavailable: {e}")
+            load_p = np.empty(0)
+        if load_p.size == 0:
+            # No forecast to anchor on: leave the loads to the chronics
+            return member.env.action_space({})
+        total = load_p.sum()
+        shifted = load_p + net_demand_mw * (load_p / total if total > 0 else 1.0 / len(load_p))
+        return member.env.action_space({"injection": {"load_p": np.maximum(shifted, 0.0)}})
+
+    def _step_member(self, i: int, action_index: int, net_demand_mw: float) -> dict:
+        member = self.members[i]
+        action = self.candidates[action_index][1] + self._injection(member, net_demand_mw)
+        result = member.step(action)
+        return {"reward": float(result["reward"]), "done": bool(result["done"]),
+                "max_rho": float(np.max(member.obs.rho))}
+
+    def _reset_member(self, i: int) -> bool:
+        return self.members[i].reset() is not None
+
+    async def _step_all(self, action_index: int, net_demand_mw: float) -> list:
+        results = await asyncio.gather(*(self._call(i, self._step_member, i, action_index, net_demand_mw)
+                                         for i in range(self.size)))
+        self.steps += 1
+        if any(r["done"] for r in results):
+            # Reset everyone, not just the members whose episode ended, so they stay identical
+            reset = await asyncio.gather(*(self._call(i, self._reset_member, i) for i in range(self.size)))
+            self.resets += 1
+            if not all(reset):
+                self.state = "failed"
+                self.error = "RuntimeError: could not reset every member after the episode ended"
+                logger.error(f"Grid2Op pool {self.error}")
+        return results
+
+    def _simulate(self, i: int, indices: list, net_demand_mw: float, lookahead: int) -> list:
+        member = self.members[i]
+        injection = self._injection(member, net_demand_mw)
+        scores = []
+        for k in indices:
+            if lookahead != self._lookahead:
+                break  # past the deadline: nobody reads these scores any more
+            try:
+                sim_obs, _, sim_done, _ = member.obs.simulate(self.candidates[k][1] + injection)
+                score = -np.inf if sim_done else -float(np.max(sim_obs.rho))
+            except Exception as e:
+                logger.debug(f"Grid2Op simulate of {self.candidates[k][0]} failed: {e}")
+                score = -np.inf
+            scores.append((k, score))
+        return scores
+
+    async def step(self, net_injection_kw: float, deadline: float) -> dict:
+        """
+        Steps every member with the action ranked best last tick and the
+        fleet's net injection (generation - load, kW), then ranks the
+        candidates for the next tick within `deadline` seconds. Skipped,
+        returning the previous result, while a member is still busy.
+        """
+        if self.busy:
+            self.skipped += 1
+            return self.last
+        start = time.monotonic()
+        net_demand_mw = -net_injection_kw * self.injection_scale
+        applied = self.next_action
+        results = await asyncio.shield(self._step_all(applied, net_demand_mw))
+        self.step_latency.record(time.monotonic() - start)
+        if not self.ready:
+            return self.last
+
+        lookahead_start = time.monotonic()
+        lookahead = self._lookahead
+        chunks = [list(range(i, len(self.candidates), self.size)) for i in range(self.size)]
+        futures = {
+            self._call(i, self._simulate, i, chunk, net_demand_mw, lookahead): chunk
+            for i, chunk in enumerate(chunks) if chunk
+        }
+        remaining = max(0.0, deadline - (time.monotonic() - start))
+        try:
+            done, pending = await asyncio.wait(futures, timeout=remaining)
+        finally:
+            self._lookahead += 1  # also when the stage budget cancels this tick
+        scores = []
+        for future in done:
+            if future.exception() is None:
+                scores.extend(future.result())
+        self.evaluated += len(scores)
+        self.dropped += sum(len(futures[f]) for f in pending)
+        self.lookahead_latency.record(time.monotonic() - lookahead_start)
+
+        ranked = sorted(scores, key=lambda s: s[1], reverse=True)
+        self.next_action = ranked[0][0] if ranked and np.isfinite(ranked[0][1]) else 0
+        self.last = {
+            **results[0],
+            "done": any(r["done"] for r in results),
+            "applied": self.candidates[applied][0],
+            "next": self.candidates[self.next_action][0],
+            "evaluated": len(scores),
+            "ranking": [(self.candidates[k][0], round(-score, 4)) for k, score in ranked[:5] if np.isfinite(score)],
+        }
+        return self.last
+
+    def _shutdown(self):
+        self._lookahead += 1
+        for member, executor in zip(self.members, self.executors):
+            executor.submit(member.close)
+            executor.shutdown(wait=True)
+        self.members, self.executors = [], []
+
+    def close(self):
+        """Closes every member env on its own thread and shuts the executors down."""
+        self._shutdown()
+        self.state = "cold"
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "error": self.error,
+            "env": self.env_name,
+            "pool_size": self.size,
+            "candidates": len(self.candidates),
+            "steps": self.steps,
+            "resets": self.resets,
+            "skipped": self.skipped,
+            "evaluated": self.evaluated,
+            "dropped": self.dropped,
+            "step": self.step_latency.summary(),
+            "lookahead": self.lookahead_latency.summary(),
+            "last": self.last,
+        }
@@ -0,0 +1,264 @@
+import logging
+import os
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+AGGREGATE_SERIES = ("frequency", "total_load", "total_generation")
+
+# (resolution seconds, buckets kept): 24 h at 1 s, 24 h at 10 s, 7 days at 1 min, 30 days at 15 min
+AGGREGATE_LEVELS = ((1, 86400), (10, 8640), (60, 10080), (900, 2880))
+AGGREGATE_RAW_CAPACITY = int(os.getenv("HISTORY_RAW_CAPACITY", 36000))  # 1 h at 10 Hz
+
+# Per-home load history is kept shorter: 10 min raw, 1 h at 10 s, 24 h at 1 min
+HOME_LEVELS = ((10, 360), (60, 1440))
+HOME_RAW_CAPACITY = 600
+HISTORY_PER_HOME_MAX_HOMES = int(os.getenv("HISTORY_PER_HOME_MAX_HOMES", 5000))
+
+# Per-bucket arrays of every rollup level
+LEVEL_ARRAYS = ("bucket", "min", "max", "sum", "count")
+
+
+class TimeSeriesStore:
+    """
+    Fixed-memory history of `width` parallel series.
+
+    Samples go into a preallocated raw ring buffer and are folded into a
+    pyramid of rollup rings (min / max / sum / count per bucket) as they
+    arrive, so nothing is ever recomputed. A query picks the finest level
+    whose bucket count over the window fits `max_points` and gathers just
+    those buckets, which keeps it O(points returned).
+    """
+
+    def __init__(self, width: int, levels=AGGREGATE_LEVELS, raw_capacity: int = AGGREGATE_RAW_CAPACITY,
+                 dtype=np.float64):
+        self.width = width
+        self.raw_capacity = raw_capacity
+        self.raw_t = np.full(raw_capacity, np.nan)
+        self.raw_v = np.zeros((raw_capacity, width), dtype=dtype)
+        self.raw_head = 0  # next write position
+        self.raw_count = 0
+        self.appends = 0
+        self.last_t = None
+
+        self.levels = []
+        for resolution, capacity in levels:
+            self.levels.append({
+                "resolution": float(resolution),
+                "capacity": capacity,
+                "bucket": np.full(capacity, -1, dtype=np.int64),
+                "min": np.zeros((capacity, width), dtype=dtype),
+                "max": np.zeros((capacity, width), dtype=dtype),
+                "sum": np.zeros((capacity, width), dtype=np.float64),
+                "count": np.zeros(capacity, dtype=np.int64),
+            })
+
+    @property
+    def nbytes(self) -> int:
+        total = self.raw_t.nbytes + self.raw_v.nbytes
+        for level in self.levels:
+            total += sum(a.nbytes for k, a in level.items() if isinstance(a, np.ndarray))
+        return total
+
+    def append(self, t: float, values):
+        """Records one sample of every series at wall-clock time `t`."""
+        values = np.asarray(values)
+        self.raw_t[self.raw_head] = t
+        self.raw_v[self.raw_head] = values
+        self.raw_head = (self.raw_head + 1) % self.raw_capacity
+        self.raw_count = min(self.raw_count + 1, self.raw_capacity)
+        self.appends += 1
+        self.last_t = t
+
+        for level in self.levels:
+            bucket = int(t // level["resolution"])
+            slot = bucket % level["capacity"]
+            if level["bucket"][slot] != bucket:
+                level["bucket"][slot] = bucket
+                level["min"][slot] = values
+                level["max"][slot] = values
+                level["sum"][slot] = values
+                level["count"][slot] = 1
+            else:
+                np.minimum(level["min"][slot], values, out=level["min"][slot])
+                np.maximum(level["max"][slot], values, out=level["max"][slot])
+                level["sum"][slot] += values
+                level["count"][slot] += 1
+
+    def arrays(self, prefix: str) -> dict:
+        """Every ring array, named `<prefix>.raw_t`, `<prefix>.level<i>.min` and so on."""
+        arrays = {f"{prefix}.raw_t": self.raw_t, f"{prefix}.raw_v": self.raw_v}
+        for i, level in enumerate(self.levels):
+            for key in LEVEL_ARRAYS:
+                arrays[f"{prefix}.level{i}.{key}"] = level[key]
+        return arrays
+
+    def write_tracker(self, prefix: str):
+        """
+        Returns a callable that reports the ring rows written since its
+        previous call, as `{name: rows}` over the names of arrays(prefix).
+        A ring missing from the result may have changed anywhere: always on
+        the first call, after more appends than it holds, or when time went
+        backwards. Rows are derived from the append count and the bucket
+        span, so append() pays nothing for the tracking.
+        """
+        mark = None
+
+        def written() -> dict:
+            nonlocal mark
+            previous, mark = mark, (self.appends, self.last_t)
+            if previous is None:
+                return {}
+            n = self.appends - previous[0]
+            if n == 0:
+                return {name: np.empty(0, dtype=np.int64) for name in self.arrays(prefix)}
+            rows = {}
+            if n < self.raw_capacity:
+                raw = (self.raw_head - n + np.arange(n)) % self.raw_capacity
+                rows[f"{prefix}.raw_t"] = rows[f"{prefix}.raw_v"] = raw
+            if previous[1] is None or self.last_t < previous[1]:
+                return rows
+            for i, level in enumerate(self.levels):
+                # The bucket open at the previous call may have been updated too
+                first = int(previous[1] // level["resolution"])
+                last = int(self.last_t // level["resolution"])
+                if last - first + 1 < level["capacity"]:
+                    slots = np.arange(first, last + 1) % level["capacity"]
+                    for key in LEVEL_ARRAYS:
+                        rows[f"{prefix}.level{i}.{key}"] = slots
+            return rows
+
+        return written
+
+    def query(self, start: float, end: float, max_points: int = 500, column: int = 0) -> dict:
+        """
+        Returns `{"resolution", "t", "min", "max", "mean"}` for one column
+        over [start, end], at the finest resolution that fits `max_points`.
+        """
+        max_points = max(1, int(max_points))
+        raw = self._raw_window(start, end)
+        if raw is not None and len(raw) <= max_points:
+            values = self.raw_v[raw, column].tolist()
+            return {"resolution": 0.0, "t": self.raw_t[raw].tolist(), "min": values, "max": values, "mean": values}
+
+        level = self.levels[-1]
+        for candidate in self.levels:
+            n_buckets = int(end // candidate["resolution"]) - int(start // candidate["resolution"]) + 1
+            if n_buckets <= max_points:
+                level = candidate
+                break
+        return self._level_window(level, start, end, column, max_points)
+
+    def _raw_window(self, start, end):
+        """Ring positions of raw samples within [start, end], oldest first; None if not covered."""
+        if self.raw_count == 0:
+            return None
+        oldest = (self.raw_head - self.raw_count) % self.raw_capacity
+        if self.raw_t[oldest] > start:
+            return None  # window reaches back past the raw ring: use rollups
+
+        def position(i):
+            return (oldest + i) % self.raw_capacity
+
+        def bisect(target, right):
+            lo, hi = 0, self.raw_count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                t = self.raw_t[position(mid)]
+                if t < target or (right and t == target):
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return lo
+
+        first, last = bisect(start, False), bisect(end, True)
+        return (oldest + np.arange(first, last)) % self.raw_capacity
+
+    def _level_window(self, level, start, end, column, max_points):
+        resolution = level["resolution"]
+        # Only the retained span can hold data; clamp before building buckets
+        first, last = int(start // resolution), int(end // resolution)
+        if self.raw_count:
+            newest = int(self.raw_t[(self.raw_head - 1) % self.raw_capacity] // resolution)
+            first, last = max(first, newest - level["capacity"] + 1), min(last, newest)
+        else:
+            last = first - 1
+        buckets = np.arange(first, max(first, last + 1))
+        slots = buckets % level["capacity"]
+        present = level["bucket"][slots] == buckets
+        slots = slots[present]
+        buckets = buckets[present]
+
+        mins = level["min"][slots, column]
+        maxs = level["max"][slots, column]
+        sums = level["sum"][slots, column]
+        counts = level["count"][slots]
+
+        # Coarsest level still too dense: merge runs of adjacent buckets
+        group = -(-len(slots) // max_points)
+        if group > 1:
+            starts = np.arange(0, len(slots), group)
+            mins = np.minimum.reduceat(mins, starts)
+            maxs = np.maximum.reduceat(maxs, starts)
+            sums = np.add.reduceat(sums, starts)
+            counts = np.add.reduceat(counts, starts)
+            buckets = buckets[starts]
+            resolution *= group
+
+        return {
+            "resolution": resolution,
+            "t": (buckets * level["resolution"]).astype(np.float64).tolist(),
+            "min": mins.tolist(),
+            "max": maxs.tolist(),
+            "mean": (sums / np.maximum(counts, 1)).tolist(),
+        }
+
+
+class GridHistory:
+    """
+    History for the dashboard: aggregate frequency / load / generation and,
+    for fleets up to HISTORY_PER_HOME_MAX_HOMES, per-home load.
+    """
+
+    def __init__(self, fleet, per_home_max_homes: int = HISTORY_PER_HOME_MAX_HOMES):
+        self.fleet = fleet
+        self.aggregate = TimeSeriesStore(len(AGGREGATE_SERIES))
+        self.homes = None
+        if len(fleet) <= per_home_max_homes:
+            self.homes = TimeSeriesStore(len(fleet), levels=HOME_LEVELS, raw_capacity=HOME_RAW_CAPACITY,
+                                         dtype=np.float32)
+        else:
+            logger.info(f"Per-home history disabled for a fleet of {len(fleet)} homes.")
+
+    def record_grid(self, frequency: float, t: float = None):
+        fleet = self.fleet
+        t = time.time() if t is None else t
+        self.aggregate.append(t, (frequency, fleet.total_load, fleet.total_generation))
+
+    def record_homes(self, t: float = None):
+        if self.homes is not None:
+            self.homes.append(time.time() if t is None else t, self.fleet.load_kw)
+
+    def query(self, series: str = "frequency", start: float = None, end: float = None,
+              points: int = 500, home_id: str = None) -> dict:
+        end = time.time() if end is None else end
+        start = end - 3600 if start is None else start
+        if not (np.isfinite(start) and np.isfinite(end)):
+            raise ValueError("start and end must be finite")
+        if start > end:
+            raise ValueError("start must not be after end")
+
+        if home_id is not None:
+            if self.homes is None:
+                raise ValueError("Per-home history is disabled for this fleet size.")
+            if home_id not in self.fleet.index:
+                raise KeyError(home_id)
+            result = self.homes.query(start, end, points, column=self.fleet.index[home_id])
+            return {"series": "load_kw", "home_id": home_id, **result}
+
+        if series not in AGGREGATE_SERIES:
+            raise KeyError(series)
+        result = self.aggregate.query(start, end, points, column=AGGREGATE_SERIES.index(series))
+        return {"series": series, **result}
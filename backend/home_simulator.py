@@ -0,0 +1,296 @@
+import logging
+import multiprocessing as mp
+import os
+import time
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from backend.fleet_state import COLUMNS, FleetState
+
+logger = logging.getLogger(__name__)
+
+HOME_SIM_SHARDS = int(os.getenv("HOME_SIM_SHARDS", 0))  # 0 = perturb the fleet in-loop instead
+HOME_SIM_HZ = float(os.getenv("HOME_SIM_HZ", 10.0))
+# Simulated seconds per wall-clock second, e.g. 60 to run a day in 24 minutes
+HOME_SIM_TIME_SCALE = float(os.getenv("HOME_SIM_TIME_SCALE", 1.0))
+
+MAX_SHARDS = 256
+
+# Per-home model state, one row each in the shared state block
+STATE_FIELDS = (
+    "base_kw", "pv_peak_kw", "cloud", "indoor_c", "ac_on", "ac_kw", "setpoint_c",
+    "ev_plugged", "ev_soc", "ev_kw", "battery_kwh", "battery_kw",
+)
+(BASE_KW, PV_PEAK_KW, CLOUD, INDOOR_C, AC_ON, AC_KW, SETPOINT_C,
+ EV_PLUGGED, EV_SOC, EV_KW, BATTERY_KWH, BATTERY_KW) = range(len(STATE_FIELDS))
+
+# Control block rows, in the VPPEnv `[ev, ac, battery]` action layout
+ACTION_FIELDS = ("ev", "ac", "battery")
+
+AC_TAU_S = 3 * 3600.0  # indoor temperature time constant with the AC off
+AC_COOL_C_PER_S = 2.0 / 3600.0
+AC_BAND_C = 0.5
+AC_CURTAIL_C = 3.0  # setpoint raise at a full `ac` curtailment action
+EV_CAPACITY_KWH = 60.0
+
+
+def _segment_size(n_homes: int) -> int:
+    rows = len(COLUMNS) + len(STATE_FIELDS) + len(ACTION_FIELDS)
+    return rows * n_homes * 8 + MAX_SHARDS * 8
+
+
+def _views(buf, n_homes: int):
+    """(fleet, state, control, ticks) arrays over one shared segment; the fleet block comes first."""
+    offset = 0
+    views = []
+    for rows in (len(COLUMNS), len(STATE_FIELDS), len(ACTION_FIELDS)):
+        views.append(np.ndarray((rows, n_homes), dtype=np.float64, buffer=buf, offset=offset))
+        offset += rows * n_homes * 8
+    views.append(np.ndarray(MAX_SHARDS, dtype=np.int64, buffer=buf, offset=offset))
+    return views
+
+
+def init_homes(fleet, state, control, rng):
+    """Draws per-home parameters and initial state for a (columns, n) fleet slice."""
+    n = fleet.shape[1]
+    state[BASE_KW] = rng.uniform(0.3, 1.5, n)
+    state[PV_PEAK_KW] = np.where(rng.random(n) < 0.7, rng.uniform(2.0, 6.0, n), 0.0)
+    state[CLOUD] = 1.0
+    state[INDOOR_C] = rng.uniform(22.0, 27.0, n)
+    state[AC_ON] = 0.0
+    state[AC_KW] = np.where(rng.random(n) < 0.6, rng.uniform(1.5, 3.5, n), 0.0)
+    state[SETPOINT_C] = rng.uniform(22.0, 25.0, n)
+    state[EV_KW] = np.where(rng.random(n) < 0.3, 7.2, 0.0)
+    state[EV_PLUGGED] = (state[EV_KW] > 0) & (rng.random(n) < 0.5)
+    state[EV_SOC] = rng.uniform(0.2, 0.9, n)
+    state[BATTERY_KWH] = rng.uniform(5.0, 15.0, n)
+    state[BATTERY_KW] = state[BATTERY_KWH] / 2.0
+
+    fleet[COLUMNS.index("battery_soc")] = rng.uniform(20.0, 100.0, n)
+    control[0] = 1.0  # EVs charge freely until told otherwise
+    control[1:] = 0.0
+
+
+def step_homes(fleet, state, control, t: float, dt: float, rng):
+    """
+    Advances a slice of homes by `dt` simulated seconds ending at epoch time
+    `t`, and writes load, PV generation and battery SoC into `fleet`.
+
+    - PV: clear-sky half-sine between 06:00 and 18:00 times a per-home
+      random-walk cloud factor
+    - AC: first-order indoor temperature with a hysteresis thermostat; the
+      `ac` action raises the setpoint by up to AC_CURTAIL_C
+    - EV: plug-in in the evening, leave in the morning; charges at EV_KW
+      scaled by the `ev` action until full
+    - battery: `battery` action in [-1, 1] discharges (+) or charges (-) at
+      up to BATTERY_KW, within capacity
+    """
+    n = fleet.shape[1]
+    hour = (t / 3600.0) % 24.0
+
+    cloud = state[CLOUD]
+    cloud += rng.normal(0.0, 0.03, n)
+    np.clip(cloud, 0.2, 1.0, out=cloud)
+    sun = max(0.0, np.sin(np.pi * (hour - 6.0) / 12.0))
+    pv = state[PV_PEAK_KW] * cloud * sun
+
+    outdoor = 26.0 + 7.0 * np.sin(2 * np.pi * (hour - 9.0) / 24.0)
+    indoor = state[INDOOR_C]
+    indoor += dt * ((outdoor - indoor) / AC_TAU_S - state[AC_ON] * AC_COOL_C_PER_S)
+    setpoint = state[SETPOINT_C] + np.clip(control[1], 0.0, 1.0) * AC_CURTAIL_C
+    ac_on = np.where(indoor > setpoint + AC_BAND_C, 1.0, np.where(indoor < setpoint - AC_BAND_C, 0.0, state[AC_ON]))
+    ac_on *= state[AC_KW] > 0
+    state[AC_ON] = ac_on
+
+    plugged = state[EV_PLUGGED]
+    u = rng.random(n)
+    p_arrive = dt / 3600.0 * (0.6 if 17.0 <= hour < 22.0 else 0.05)
+    p_depart = dt / 3600.0 * (0.6 if 6.0 <= hour < 9.0 else 0.05)
+    arrive = (plugged == 0) & (state[EV_KW] > 0) & (u < p_arrive)
+    depart = (plugged == 1) & (u < p_depart)
+    state[EV_SOC, arrive] = rng.uniform(0.2, 0.6, int(arrive.sum()))
+    plugged[arrive] = 1.0
+    plugged[depart] = 0.0
+    ev_soc = state[EV_SOC]
+    ev = state[EV_KW] * np.clip(control[0], 0.0, 1.0) * plugged * (ev_soc < 1.0)
+    np.minimum(ev_soc + ev * dt / 3600.0 / EV_CAPACITY_KWH, 1.0, out=ev_soc)
+
+    evening = np.exp(-((hour - 19.0) / 2.5) ** 2)
+    household = state[BASE_KW] * (1.0 + 0.5 * evening) * (1.0 + rng.normal(0.0, 0.05, n))
+
+    # Battery power, positive while charging
+    soc = fleet[COLUMNS.index("battery_soc")]
+    capacity = state[BATTERY_KWH]
+    energy = soc * 0.01 * capacity
+    battery = -np.clip(control[2], -1.0, 1.0) * state[BATTERY_KW]
+    np.clip(battery, -energy * 3600.0 / dt, (capacity - energy) * 3600.0 / dt, out=battery)
+    soc[:] = (energy + battery * dt / 3600.0) / capacity * 100.0
+
+    load = household + ac_on * state[AC_KW] + ev + battery
+    np.maximum(load, 0.0, out=fleet[COLUMNS.index("load_kw")])
+    fleet[COLUMNS.index("generation_kw")] = pv
+
+
+def _run_shard(shm_name: str, n_homes: int, lo: int, hi: int, shard: int, tick_hz: float,
+               time_scale: float, sim_t0: float, wall_t0: float, seed, stop):
+    """Worker process: steps homes [lo, hi) of the shared fleet until `stop` is set."""
+    shm = SharedMemory(name=shm_name)
+    try:
+        _shard_loop(shm.buf, n_homes, lo, hi, shard, tick_hz, time_scale, sim_t0, wall_t0, seed, stop)
+    finally:
+        shm.close()
+
+
+def _shard_loop(buf, n_homes, lo, hi, shard, tick_hz, time_scale, sim_t0, wall_t0, seed, stop):
+    fleet, state, control, ticks = _views(buf, n_homes)
+    rows = slice(lo, hi)
+    fleet, state, control = fleet[:, rows], state[:, rows], control[:, rows]
+    rng = np.random.default_rng([seed, lo])
+    period = 1.0 / tick_hz
+    next_tick = time.monotonic()
+    while not stop.is_set():
+        t = sim_t0 + (time.time() - wall_t0) * time_scale
+        step_homes(fleet, state, control, t, period * time_scale, rng)
+        ticks[shard] += 1
+        next_tick += period
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            stop.wait(delay)
+        else:
+            next_tick = time.monotonic()  # overran: skip the backlog rather than burst
+
+
+class ShardedHomeSimulator:
+    """
+    Simulated homes (EV charging, AC cycles, battery SoC, solar PV) stepped
+    by a pool of worker processes.
+
+    The fleet block, every model's state and the control inputs all live
+    in one shared-memory segment. Each worker owns a contiguous row range
+    and writes its homes' load / generation / SoC in place, so `fleet` is a
+    FleetState over that segment that the orchestrator reads with no copies
+    or pickling; call `fleet.refresh()` before using the totals. Readers may
+    see a tick that a worker is half-way through writing, which is fine for
+    telemetry.
+
+    Because no state lives in the workers, they can be stopped, started and
+    rebalanced onto a different shard count at any time.
+    """
+
+    def __init__(self, n_homes: int = 100, shards: int = HOME_SIM_SHARDS or 1, tick_hz: float = HOME_SIM_HZ,
+                 time_scale: float = HOME_SIM_TIME_SCALE, seed: int = 0):
+        self.n_homes = n_homes
+        self.shards = shards
+        self.tick_hz = tick_hz
+        self.time_scale = time_scale
+        self.seed = seed
+
+        self.shm = SharedMemory(create=True, size=_segment_size(n_homes))
+        self.fleet = FleetState((f"home_{i}" for i in range(n_homes)), seed=seed, buffer=self.shm.buf)
+        _, self.state, self.control, self.ticks = _views(self.shm.buf, n_homes)
+        self.sim_t0 = time.time()
+        self.wall_t0 = None
+
+        rng = np.random.default_rng(seed)
+        init_homes(self.fleet.data, self.state, self.control, rng)
+        step_homes(self.fleet.data, self.state, self.control, self.sim_t0, 1.0 / tick_hz, rng)
+        self.fleet.refresh()
+
+        self._ctx = mp.get_context("spawn")
+        self._stop = None
+        self.workers = []
+        self.rebalances = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self.workers)
+
+    def sim_time(self) -> float:
+        if self.wall_t0 is None:
+            return self.sim_t0
+        return self.sim_t0 + (time.time() - self.wall_t0) * self.time_scale
+
+    def start(self, shards: int = None):
+        """Spawns one worker per shard; a no-op if already running."""
+        if self.running:
+            return
+        shards = self._check_shards(self.shards if shards is None else shards)
+        self.shards = shards
+        self.wall_t0 = time.time()
+        self._stop = self._ctx.Event()
+        self.ticks[:] = 0
+
+        bounds = np.linspace(0, self.n_homes, shards + 1).astype(int)
+        for shard, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+            process = self._ctx.Process(
+                target=_run_shard, name=f"home-sim-{shard}", daemon=True,
+                args=(self.shm.name, self.n_homes, int(lo), int(hi), shard, self.tick_hz,
+                      self.time_scale, self.sim_t0, self.wall_t0, self.seed, self._stop),
+            )
+            process.start()
+            self.workers.append((process, int(lo), int(hi)))
+        logger.info(f"Home simulator started: {self.n_homes} homes on {shards} worker processes.")
+
+    def stop(self, timeout: float = 5.0):
+        """Stops every worker; the fleet keeps its last state and the sim clock pauses."""
+        if not self.running:
+            return
+        self._stop.set()
+        for process, _, _ in self.workers:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"{process.name} did not stop in {timeout}s, terminating.")
+                process.terminate()
+                process.join()
+        self.sim_t0 = self.sim_time()
+        self.wall_t0 = None
+        self.workers = []
+        logger.info("Home simulator stopped.")
+
+    def rebalance(self, shards: int):
+        """Moves the fleet onto `shards` workers; state carries over through shared memory."""
+        shards = self._check_shards(shards)  # before anything is stopped
+        was_running = self.running
+        self.stop()
+        self.shards = shards
+        self.rebalances += 1
+        if was_running:
+            self.start(shards)
+
+    def _check_shards(self, shards: int) -> int:
+        if not 1 <= shards <= min(MAX_SHARDS, self.n_homes):
+            raise ValueError(f"shards must be in 1..{min(MAX_SHARDS, self.n_homes)}")
+        return shards
+
+    def apply_actions(self, actions):
+        """Writes an (N, 3) `[ev, ac, battery]` action array into the shared control block."""
+        actions = np.asarray(actions, dtype=np.float64)
+        if actions.shape != (self.n_homes, len(ACTION_FIELDS)):
+            logger.debug(f"Ignoring actions of shape {actions.shape} for the home simulator.")
+            return
+        self.control[:] = actions.T
+
+    def close(self):
+        self.stop()
+        self.state = self.control = self.ticks = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # the fleet still holds views; the segment is released at exit once unlinked
+        self.shm.unlink()
+
+    def stats(self) -> dict:
+        return {
+            "homes": self.n_homes,
+            "running": self.running,
+            "shards": self.shards,
+            "tick_hz": self.tick_hz,
+            "time_scale": self.time_scale,
+            "sim_time": self.sim_time(),
+            "rebalances": self.rebalances,
+            "workers": [
+                {"name": p.name, "rows": [lo, hi], "alive": p.is_alive(), "ticks": int(self.ticks[i])}
+                for i, (p, lo, hi) in enumerate(self.workers)
+            ],
+        }
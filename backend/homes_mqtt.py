@@ -1,14 +1,30 @@
 import asyncio
 import json
-import random
 import logging
 from paho.mqtt.client import Client, CallbackAPIVersion
 import os
+import numpy as np
+
+from backend.fleet_state import FleetState
+from backend.home_simulator import HOME_SIM_SHARDS, ShardedHomeSimulator
+from backend.telemetry_ingest import TelemetryIngestor
+from backend.wire_format import (
+    ControlDeltaEncoder, FrameError, decode_frame, encode_control, encode_telemetry
+)
 
 logger = logging.getLogger(__name__)
 
 MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost")
 MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
+# "json" = per-home JSON topics (default), "binary" = batched frames, "both" = publish both
+MQTT_WIRE_MODE = os.getenv("MQTT_WIRE_MODE", "json")
+MQTT_DELTA_ACTUATION = os.getenv("MQTT_DELTA_ACTUATION", "1") == "1"
+# "1" = perturb and publish simulated telemetry, "0" = ingest real telemetry from the homes
+MQTT_SIMULATE_HOMES = os.getenv("MQTT_SIMULATE_HOMES", "1") == "1"
+VPP_N_HOMES = int(os.getenv("VPP_N_HOMES", 100))
+
+TELEMETRY_BATCH_TOPIC = "vpp/telemetry/batch"
+CONTROL_BATCH_TOPIC = "vpp/control/batch"
 
 # Callback functions
 def on_connect(client, userdata, flags, rc, properties=None):
@@ -21,25 +37,52 @@ def on_connect(client, userdata, flags, rc, properties=None):
 def on_message(client, userdata, msg):
     try:
         topic = msg.topic
+        if topic.endswith("/batch"):
+            header, records = decode_frame(msg.payload)
+            logger.debug(f"Received batched frame on {topic}: {header['count']} records")
+            return
         payload = json.loads(msg.payload.decode())
         logger.info(f"Received MQTT message on {topic}: {payload}")
         # In a real setup, parse the command for specific agents
-    except json.JSONDecodeError:
+    except (json.JSONDecodeError, UnicodeDecodeError, FrameError):
          logger.warning("Failed to decode MQTT message payload.")
 
+def encode_action(action):
+    """JSON-safe form of a policy action: int for discrete, list for vector actions."""
+    if hasattr(action, "tolist") and getattr(action, "ndim", 0) > 0:
+        return action.tolist()
+    return int(action)
+
 class MQTTHub:
     """
     Manages telemetry from and actuation commands to the 100 smart homes.
     """
-    def __init__(self, broker: str = MQTT_BROKER, port: int = MQTT_PORT):
+    def __init__(self, broker: str = MQTT_BROKER, port: int = MQTT_PORT, n_homes: int = VPP_N_HOMES,
+                 wire_mode: str = MQTT_WIRE_MODE, delta_actuation: bool = MQTT_DELTA_ACTUATION,
+                 simulate: bool = MQTT_SIMULATE_HOMES, sim_shards: int = HOME_SIM_SHARDS):
+        if wire_mode not in ("json", "binary", "both"):
+            raise ValueError(f"Unknown MQTT wire mode: {wire_mode}")
         self.client = Client(CallbackAPIVersion.VERSION2, "vpp_backend_mqtt", clean_session=True)
         self.broker = broker
         self.port = port
-        self.client.on_connect = on_connect
-        self.client.on_message = on_message
-        self.homes_state = {f"home_{i}": self._generate_random_home_state() for i in range(100)}
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
         self.running = False
 
+        self.simulate = simulate
+        # With sim_shards > 0 the homes are stepped by worker processes writing
+        # into a shared-memory fleet; otherwise the fleet is perturbed in-loop
+        self.simulator = ShardedHomeSimulator(n_homes, shards=sim_shards) if simulate and sim_shards else None
+        self.fleet = self.simulator.fleet if self.simulator else FleetState.random(n_homes)
+        self.ingestor = None if simulate else TelemetryIngestor(self.fleet)
+
+        self.wire_mode = wire_mode
+        self.delta_actuation = delta_actuation
+        self.control_encoder = ControlDeltaEncoder(n_homes)
+        self.telemetry_seq = 0
+        self.messages_published = 0
+        self.bytes_published = 0
+
     def connect(self):
         try:
             self.client.connect(self.broker, self.port, 60)
@@ -55,34 +98,120 @@ class MQTTHub:
              self.client.disconnect()
              self.running = False
 
-    def _generate_random_home_state(self):
-        """Simulate initial state of a smart home."""
-        return {
-            "load_kw": round(random.uniform(0.5, 5.0), 2),
-            "generation_kw": round(random.uniform(0.0, 3.0), 2),  # e.g., Solar panels
-            "battery_soc": round(random.uniform(20.0, 100.0), 1)  # State of Charge %
-        }
+    def _on_connect(self, client, userdata, flags, rc, properties=None):
+        on_connect(client, userdata, flags, rc, properties)
+        if rc == 0 and self.ingestor is not None:
+            client.subscribe("vpp/telemetry/#")
+
+    def _on_message(self, client, userdata, msg):
+        # Runs on the paho network thread: hand telemetry off undecoded
+        if self.ingestor is not None and msg.topic.startswith("vpp/telemetry/"):
+            self.ingestor.buffer.push(msg.topic, msg.payload)
+        else:
+            on_message(client, userdata, msg)
+
+    def start_ingest(self):
+        """Starts the asyncio-side telemetry consumer; call from the running event loop."""
+        if self.ingestor is not None:
+            self.ingestor.start()
+
+    async def stop_ingest(self):
+        if self.ingestor is not None:
+            await self.ingestor.stop()
+
+    def start_simulator(self):
+        if self.simulator is not None:
+            self.simulator.start()
+
+    def stop_simulator(self):
+        if self.simulator is not None:
+            self.simulator.close()
+
+    @property
+    def homes_state(self):
+        """Dict-style `{home_id: {...}}` view over the columnar fleet store."""
+        return self.fleet.as_dict()
 
-    async def poll_homes(self) -> dict:
+    async def poll_homes(self) -> FleetState:
         """
-        In a real scenario, this would wait for telemetry. 
-        Here, we slightly permute internal state as a simulation.
+        With real telemetry the ingestor keeps the fleet current, so this just
+        returns it. In simulation, we slightly permute internal state and
+        publish it as telemetry.
         """
-        for home_id, state in self.homes_state.items():
-             # Add slight noise to simulate natural load variation
-             state["load_kw"] = max(0.0, round(state["load_kw"] + random.uniform(-0.1, 0.1), 2))
-             state["generation_kw"] = max(0.0, round(state["generation_kw"] + random.uniform(-0.05, 0.05), 2))
-             
-             # Example: Publish telemetry to MQTT broker
-             payload = json.dumps(state)
-             self.client.publish(f"vpp/telemetry/{home_id}", payload)
-             
-        return self.homes_state
-
-    def send_control_commands(self, actions: dict):
+        if not self.simulate:
+            return self.fleet
+
+        if self.simulator is not None:
+            # Worker processes keep the shared fleet current
+            self.fleet.refresh()
+        else:
+            # Add slight noise to simulate natural load variation
+            self.fleet.apply_noise()
+
+        # Example: Publish telemetry to MQTT broker
+        if self.wire_mode in ("json", "both"):
+            for home_id, state in self.fleet.to_dict().items():
+                self._publish(f"vpp/telemetry/{home_id}", json.dumps(state))
+
+        if self.wire_mode in ("binary", "both"):
+            fleet = self.fleet
+            frames = encode_telemetry(
+                np.arange(len(fleet), dtype=np.uint32),
+                fleet.load_kw, fleet.generation_kw, fleet.battery_soc,
+                seq=self.telemetry_seq
+            )
+            self.telemetry_seq += 1
+            for frame in frames:
+                self._publish(TELEMETRY_BATCH_TOPIC, frame)
+
+        return self.fleet
+
+    def send_control_commands(self, actions):
         """
         Sends multi-agent RL control actions to the individual smart homes.
+        `actions` is either a `{home_id: action}` dict or an array aligned to
+        the fleet row index.
         """
-        for home_id, action in actions.items():
-            payload = json.dumps({"agent_id": home_id, "action": int(action)})
-            self.client.publish(f"vpp/control/{home_id}", payload)
+        if self.simulator is not None:
+            self.simulator.apply_actions(self._action_array(actions))
+
+        if self.wire_mode in ("json", "both"):
+            items = actions.items() if isinstance(actions, dict) else zip(self.fleet.home_ids, actions)
+            for home_id, action in items:
+                payload = json.dumps({"agent_id": home_id, "action": encode_action(action)})
+                self._publish(f"vpp/control/{home_id}", payload)
+
+        if self.wire_mode in ("binary", "both"):
+            action_array = self._action_array(actions)
+            # Echo the telemetry these actions answer, so homes can time the round trip
+            seq = self.ingestor.last_seq if self.ingestor is not None else None
+            if self.delta_actuation:
+                frames = self.control_encoder.encode(action_array, seq=seq)
+            else:
+                frames = encode_control(np.arange(len(self.fleet), dtype=np.uint32), action_array, seq=seq or 0)
+            for frame in frames:
+                self._publish(CONTROL_BATCH_TOPIC, frame)
+
+    def wire_stats(self) -> dict:
+        return {
+            "wire_mode": self.wire_mode,
+            "delta_actuation": self.delta_actuation,
+            "messages_published": self.messages_published,
+            "bytes_published": self.bytes_published,
+        }
+
+    def _publish(self, topic: str, payload):
+        self.messages_published += 1
+        self.bytes_published += len(payload)
+        self.client.publish(topic, payload)
+
+    def _action_array(self, actions) -> np.ndarray:
+        if not isinstance(actions, dict):
+            return np.asarray(actions, dtype=np.float32)
+        values = np.asarray(list(actions.values()), dtype=np.float32)
+        if list(actions.keys()) == self.fleet.home_ids:
+            return values
+        # Partial or reordered dict: homes without an entry get a zero action
+        array = np.zeros((len(self.fleet),) + values.shape[1:], dtype=np.float32)
+        array[[self.fleet.index[home_id] for home_id in actions]] = values
+        return array
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import threading
+import time
+
+import numpy as np
+
+from backend.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceWorker:
+    """
+    Runs policy forward passes on a dedicated thread, off the event loop.
+
+    The loop posts each tick's observation matrix with submit(); it is
+    copied into one of two input buffers (the one the worker is not reading),
+    and a newer observation simply overwrites one still waiting, so the
+    worker always computes on the latest fleet state. Results are published
+    by swapping a reference to the completed action array, never by copying.
+    `compute` must therefore return an array it will not mutate afterwards.
+
+    infer() waits for the current tick's result until a deadline; on a miss
+    it returns the last completed actions (or None before the first one) and
+    counts the miss, so a slow forward pass never stretches the control tick.
+    """
+
+    def __init__(self, compute, name: str = "inference"):
+        self.compute = compute
+        self.name = name
+        self._cond = threading.Condition()
+        self._inputs = [None, None]
+        self._pending = None  # (seq, input slot) waiting for the worker
+        self._busy_slot = None  # input slot the worker is reading
+        self._front = None  # most recent completed actions
+        self._front_seq = 0
+        self._seq = 0
+        self._running = False
+        self._thread = None
+        self._loop = None
+        self._completed = None
+
+        self.superseded = 0
+        self.misses = 0
+        self.errors = 0
+        self.completed = 0
+        self.latency = LatencyHistogram()
+
+    def start(self):
+        """Starts the worker thread; call from the running event loop."""
+        if self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._completed = asyncio.Event()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        if self._thread is None:
+            return
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, observations) -> int:
+        """Queues `observations` for the next forward pass and returns its sequence number."""
+        obs = np.asarray(observations)
+        with self._cond:
+            if self._pending is not None:
+                slot = self._pending[1]
+                self.superseded += 1
+            else:
+                slot = 1 if self._busy_slot == 0 else 0
+            buf = self._inputs[slot]
+            if buf is None or buf.shape != obs.shape or buf.dtype != obs.dtype:
+                buf = self._inputs[slot] = np.empty_like(obs)
+            np.copyto(buf, obs)
+            self._seq += 1
+            self._pending = (self._seq, slot)
+            self._cond.notify()
+            return self._seq
+
+    def latest(self):
+        """(actions, seq) of the most recent completed forward pass; actions is None before the first."""
+        return self._front, self._front_seq
+
+    async def infer(self, observations, deadline: float):
+        """
+        Submits `observations` and waits up to `deadline` seconds for their
+        actions. On a miss, returns the last good actions instead.
+        """
+        seq = self.submit(observations)
+        try:
+            await asyncio.wait_for(self._wait_for(seq), timeout=max(deadline, 0.0))
+        except asyncio.TimeoutError:
+            self.misses += 1
+        return self._front
+
+    async def _wait_for(self, seq: int):
+        while self._front_seq < seq:
+            self._completed.clear()
+            if self._front_seq >= seq:
+                break
+            await self._completed.wait()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                seq, slot = self._pending
+                self._pending = None
+                self._busy_slot = slot
+
+            start = time.perf_counter()
+            try:
+                actions = self.compute(self._inputs[slot])
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Inference worker forward pass failed: {e}", exc_info=True)
+                actions = None
+            self.latency.record(time.perf_counter() - start)
+
+            with self._cond:
+                self._busy_slot = None
+                if actions is not None:
+                    self._front = np.asarray(actions)  # publish by reference swap
+                    self._front_seq = seq
+                    self.completed += 1
+            if actions is not None:
+                self._loop.call_soon_threadsafe(self._completed.set)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._thread is not None,
+            "submitted": self._seq,
+            "completed": self.completed,
+            "superseded": self.superseded,
+            "misses": self.misses,
+            "errors": self.errors,
+            "staleness": self._seq - self._front_seq,
+            **self.latency.summary(),
+        }
@@ -1,22 +1,37 @@
 import asyncio
+import json
 import logging
 import os
+import time
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 # Load environment variables from the root .env file
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from backend.database import Database
 from backend.swing_equation import SwingEquation
-from backend.homes_mqtt import MQTTHub
+from backend.homes_mqtt import MQTTHub, encode_action
 from backend.rllib_marl import MARLController
-from backend.featherless_client import FeatherlessClient
-from backend.grid2op_env import Grid2OpEnvWrapper
+from backend.fallback_controller import RuleBasedController
+from backend.inference_worker import InferenceWorker
+from backend.featherless_client import AsyncFeatherlessClient
+from backend.grid2op_env import Grid2OpPool
+from backend.scheduler import MultiRateScheduler, Stage
+from backend.ws_fanout import ConnectionManager
+from backend.history import GridHistory
+from backend.patchtst_forecast import PatchTSTForecaster
+from backend.attack_detector import SyncSpikeDetector
+from backend.metrics import Metric, PerfMetrics
+from backend.replay import ReplayEngine, ReplayTrace
+from backend.microgrid import MICROGRID_CLUSTERS, MicrogridClusters
+from backend.fairness import FAIRNESS_SCHEDULER, FairnessScheduler
+from backend.checkpoint import CHECKPOINT_HZ, CHECKPOINT_PATH, StateCheckpoint
+from backend.archive import ARCHIVE_DIR, ARCHIVE_SEGMENT_S, ARCHIVE_STRIP_ACTIONS, SCALAR_COLUMNS, SnapshotArchive
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -25,108 +40,381 @@ logger = logging.getLogger(__name__)
 mqtt_hub = MQTTHub()
 swing_eq = SwingEquation()
 marl_controller = None  # To be init on startup
-featherless_client = FeatherlessClient()
-grid_fallback = Grid2OpEnvWrapper()
+fallback_controller = RuleBasedController()
+inference_worker = None  # Started on startup for the shared policy
+featherless_client = AsyncFeatherlessClient()
+grid_pool = Grid2OpPool()
+grid2op_warmup = None  # Background pool build; kept so it is not garbage-collected
+history = GridHistory(mqtt_hub.fleet)
+forecaster = PatchTSTForecaster(model_path=os.getenv("PATCHTST_MODEL_PATH"))
+attack_detector = SyncSpikeDetector(len(mqtt_hub.fleet), home_ids=mqtt_hub.fleet.home_ids)
+microgrid = MicrogridClusters(len(mqtt_hub.fleet), MICROGRID_CLUSTERS, f_nominal=swing_eq.f_nominal) \
+    if MICROGRID_CLUSTERS else None
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Failed to send to websocket: {e}")
+fairness = FairnessScheduler(len(mqtt_hub.fleet)) if FAIRNESS_SCHEDULER else None
 
 manager = ConnectionManager()
+metrics = PerfMetrics()
 state_store = {
     "use_featherless": False,
     "current_freq": 50.0,
-    "grid2op_fallback_active": False
+    "grid2op_fallback_active": False,
+    "grid2op": {},
+    "last_actions": {},
+    # This tick's actions as computed (array or dict), for the archive
+    "last_actions_raw": None
 }
 
-async def orchestration_loop():
-    """Main VPP control loop running at fixed intervals."""
-    while True:
-        try:
-            # 1. Gather Telemetry (Simulated or Real from MQTT)
-            homes_state = await mqtt_hub.poll_homes()
-            
-            # Aggregate Power Mismatch
-            total_load = sum(h["load_kw"] for h in homes_state.values())
-            total_gen = sum(h["generation_kw"] for h in homes_state.values())
-
-            # 2. Physics Simulation: Update Frequency using Swing Equation
-            new_freq = swing_eq.step(power_generation=total_gen, power_load=total_load)
-            state_store["current_freq"] = new_freq
-
-            # Formulate observations for MARL
-            observations = {}
-            for home_id, state in homes_state.items():
-                observations[home_id] = [new_freq, state["load_kw"], state["generation_kw"]]
-
-            # 3. Decision Making: MARL or Featherless Inference
-            if state_store["use_featherless"]:
-                actions_dict = featherless_client.infer_action(observations)
-            else:
-                actions_dict = marl_controller.get_actions(observations)
-
-            # 4. Actuation
-            mqtt_hub.send_control_commands(actions_dict)
-
-            # 5. Persistence
-            grid_snapshot = {
-                "frequency": new_freq,
-                "total_load": total_load,
-                "total_generation": total_gen,
-                "actions": {k: int(v) for k, v in actions_dict.items()},
-                "use_featherless": state_store["use_featherless"]
-            }
-            await Database.save_state("grid_snapshots", grid_snapshot)
-
-            # 6. WebSocket Update Frontend
-            await manager.broadcast({
-                "type": "GRID_UPDATE",
-                "frequency": grid_snapshot["frequency"],
-                "total_load": grid_snapshot["total_load"],
-                "total_generation": grid_snapshot["total_generation"],
-                "sample_actions": dict(list(grid_snapshot["actions"].items())[:5]) # just a sample
-            })
-
-        except Exception as e:
-             logger.error(f"Error in orchestration loop: {e}", exc_info=True)
-             
-        await asyncio.sleep(1.0) # 1 second control interval
+PHYSICS_HZ = float(os.getenv("PHYSICS_HZ", 1.0 / swing_eq.dt))
+CONTROL_HZ = float(os.getenv("CONTROL_HZ", 1.0))
+PERSIST_HZ = float(os.getenv("PERSIST_HZ", 1.0))
+BROADCAST_HZ = float(os.getenv("BROADCAST_HZ", 1.0))
+GRID2OP_HZ = float(os.getenv("GRID2OP_HZ", CONTROL_HZ))
+# "1" = build the Grid2Op env pool at startup so activating the fallback is instant
+GRID2OP_PREWARM = os.getenv("GRID2OP_PREWARM", "1") == "1"
+# Fraction of the grid2op stage budget spent on step + candidate lookahead
+GRID2OP_BUDGET_SHARE = float(os.getenv("GRID2OP_BUDGET_SHARE", 0.8))
+# Fraction of the remaining control budget a Featherless request may use
+FEATHERLESS_BUDGET_SHARE = float(os.getenv("FEATHERLESS_BUDGET_SHARE", 0.8))
+# "background" = serve rule-based actions while the PPO policy builds, "blocking" = wait for it before the first tick
+MARL_WARMUP = os.getenv("MARL_WARMUP", "background")
+# "1" = shared-policy forward passes on a worker thread, "0" = inline on the event loop
+INFERENCE_WORKER = os.getenv("INFERENCE_WORKER", "1") == "1"
+# Fraction of the remaining control budget to wait for this tick's worker result
+INFERENCE_BUDGET_SHARE = float(os.getenv("INFERENCE_BUDGET_SHARE", 0.5))
+
+def physics_step():
+    """Integrates the swing equation against the latest fleet totals."""
+    fleet = mqtt_hub.fleet
+    generation, load = fleet.total_generation, fleet.total_load
+    if microgrid is not None:
+        # Islanded clusters no longer feed the main grid's mismatch
+        generation, load = microgrid.grid_totals(generation, load)
+    with metrics.timer("physics.swing"):
+        state_store["current_freq"] = swing_eq.step(
+            power_generation=generation,
+            power_load=load
+        )
+    if microgrid is not None:
+        with metrics.timer("physics.microgrid"):
+            microgrid.step_frequency(state_store["current_freq"], 1.0 / PHYSICS_HZ)
+    with metrics.timer("physics.history"):
+        history.record_grid(state_store["current_freq"])
+
+async def control_step():
+    """Telemetry -> decision -> actuation."""
+    # 1. Gather Telemetry (Simulated or Real from MQTT)
+    with metrics.timer("control.poll"):
+        fleet = await mqtt_hub.poll_homes()
+    with metrics.timer("control.history"):
+        history.record_homes()
+    with metrics.timer("control.forecast"):
+        forecaster.observe(fleet)
+    with metrics.timer("control.attack"):
+        alert = attack_detector.update(fleet.load_kw)
+    if alert is not None:
+        await manager.broadcast_event({"type": "ATTACK_ALERT", "alert": alert})
+    freq = state_store["current_freq"]
+    if microgrid is not None:
+        with metrics.timer("control.microgrid"):
+            events = microgrid.update(fleet.data, freq)
+        if events:
+            await manager.broadcast_event({"type": "MICROGRID_EVENT", "events": events})
+
+    # 2. Decision Making: MARL or Featherless Inference
+    with metrics.timer("control.inference"):
+        if state_store["use_featherless"]:
+            # Remote call bounded by what is left of this tick's budget
+            actions = actions_dict = await featherless_client.infer_action(
+                fleet.observations_dict(freq),
+                deadline=scheduler.stages["control"].remaining() * FEATHERLESS_BUDGET_SHARE
+            )
+        elif inference_worker is not None:
+            # Forward pass on the worker thread; a late result falls back to the last good actions
+            obs = fleet.observation_matrix(freq)
+            actions = await inference_worker.infer(
+                obs, deadline=scheduler.stages["control"].remaining() * INFERENCE_BUDGET_SHARE
+            )
+            if actions is None:
+                actions = fallback_controller.get_actions(obs)
+            actions_dict = dict(zip(fleet.home_ids, actions))
+        elif not marl_controller.ready:
+            # Policy still warming up: droop rules keep the fleet responding meanwhile
+            actions = fallback_controller.get_actions(fleet.observation_matrix(freq))
+            actions_dict = dict(zip(fleet.home_ids, actions))
+        elif marl_controller.policy_mode == "shared":
+            # One batched forward pass, rows aligned to the fleet index
+            actions = marl_controller.get_actions(fleet.observation_matrix(freq))
+            actions_dict = dict(zip(fleet.home_ids, actions))
+        else:
+            actions = actions_dict = marl_controller.get_actions(fleet.observations_dict(freq))
+
+    # 2b. Spread the requested reduction over the least-burdened homes (vector actions only)
+    if fairness is not None and getattr(actions, "ndim", 0) == 2:
+        with metrics.timer("control.fairness"):
+            actions = fairness.schedule(actions, fleet.load_kw, fleet.battery_soc * 0.01)
+        actions_dict = dict(zip(fleet.home_ids, actions))
+
+    # 3. Actuation
+    with metrics.timer("control.actuation"):
+        mqtt_hub.send_control_commands(actions)
+        state_store["last_actions_raw"] = actions
+        state_store["last_actions"] = {k: encode_action(v) for k, v in actions_dict.items()}
+
+def policy_actions(obs):
+    """Inference-worker forward pass: the learned policy once warm, droop rules before."""
+    if marl_controller.ready:
+        return marl_controller.get_actions(obs)
+    return fallback_controller.get_actions(obs)
+
+async def grid2op_step():
+    """Steps the Grid2Op fallback with the fleet's net injection and ranks its next action."""
+    if not state_store["grid2op_fallback_active"] or not grid_pool.ready:
+        return
+    fleet = mqtt_hub.fleet
+    with metrics.timer("grid2op.step"):
+        state_store["grid2op"] = await grid_pool.step(
+            fleet.total_generation - fleet.total_load,
+            deadline=scheduler.stages["grid2op"].remaining() * GRID2OP_BUDGET_SHARE
+        )
+
+def start_grid2op_warmup():
+    """Builds the Grid2Op pool in the background unless a build is already running."""
+    global grid2op_warmup
+    if grid2op_warmup is not None and not grid2op_warmup.done():
+        return
+    grid2op_warmup = asyncio.create_task(grid_pool.warm(), name="grid2op-warmup")
+    grid2op_warmup.add_done_callback(_log_grid2op_warmup)
+
+def _log_grid2op_warmup(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Grid2Op warm-up task failed: {task.exception()!r}")
+
+async def control_hold():
+    """Degraded control tick after an overrun: refresh telemetry, keep the previous actions."""
+    await mqtt_hub.poll_homes()
+
+def build_grid_snapshot() -> dict:
+    fleet = mqtt_hub.fleet
+    return {
+        "timestamp": time.time(),
+        "frequency": state_store["current_freq"],
+        "total_load": fleet.total_load,
+        "total_generation": fleet.total_generation,
+        "actions": state_store["last_actions"],
+        "use_featherless": state_store["use_featherless"]
+    }
+
+async def persistence_step():
+    snapshot = build_grid_snapshot()
+    if archive is not None and state_store["last_actions_raw"] is not None:
+        with metrics.timer("persistence.archive"):
+            archive.append(snapshot, state_store["last_actions_raw"])
+        if ARCHIVE_STRIP_ACTIONS:
+            # The archive holds the per-home actions; keep the Mongo document small
+            snapshot = {k: v for k, v in snapshot.items() if k != "actions"}
+            snapshot["n_homes"] = len(mqtt_hub.fleet)
+    with metrics.timer("persistence.save"):
+        await Database.save_state("grid_snapshots", snapshot)
+
+async def broadcast_step():
+    grid_snapshot = build_grid_snapshot()
+    with metrics.timer("broadcast.grid"):
+        await manager.broadcast({
+            "type": "GRID_UPDATE",
+            "frequency": grid_snapshot["frequency"],
+            "total_load": grid_snapshot["total_load"],
+            "total_generation": grid_snapshot["total_generation"],
+            "sample_actions": dict(list(grid_snapshot["actions"].items())[:5]) # just a sample
+        })
+    # Full-fleet deltas only for dashboards that subscribed to them
+    if manager.wants_fleet():
+        with metrics.timer("broadcast.fleet"):
+            manager.publish_fleet(mqtt_hub.fleet)
+
+def checkpoint_arrays() -> dict:
+    """Live arrays a restart resumes from: fleet, physics, aggregate history and simulator state."""
+    arrays = {
+        "fleet": mqtt_hub.fleet.data,
+        "swing.frequency": swing_eq.frequency,
+        **history.aggregate.arrays("history"),
+    }
+    if mqtt_hub.simulator is not None:
+        arrays["simulator.state"] = mqtt_hub.simulator.state
+        arrays["simulator.control"] = mqtt_hub.simulator.control
+    if microgrid is not None:
+        arrays["microgrid.frequency"] = microgrid.frequency
+        arrays["microgrid.islanded"] = microgrid.islanded
+        arrays["microgrid.pinned"] = microgrid.pinned
+    return arrays
+
+# History rings only change where new samples landed, so captures copy just those rows
+checkpoint = StateCheckpoint(CHECKPOINT_PATH, checkpoint_arrays(), dirty=history.aggregate.write_tracker("history")) \
+    if CHECKPOINT_HZ > 0 else None
+archive = SnapshotArchive(ARCHIVE_DIR, mqtt_hub.fleet.home_ids, ARCHIVE_SEGMENT_S, interval=1.0 / PERSIST_HZ) \
+    if ARCHIVE_SEGMENT_S > 0 else None
+
+def checkpoint_meta() -> dict:
+    return {
+        "current_freq": state_store["current_freq"],
+        "use_featherless": state_store["use_featherless"],
+        "grid2op_fallback_active": state_store["grid2op_fallback_active"],
+        "history_raw_head": history.aggregate.raw_head,
+        "history_raw_count": history.aggregate.raw_count,
+    }
+
+def restore_checkpoint():
+    """Resumes fleet, physics, history and toggles from the checkpoint file, if it has a valid slot."""
+    try:
+        meta = checkpoint.restore()
+    except Exception as e:
+        logger.error(f"Checkpoint restore failed, starting fresh: {e}")
+        return
+    if meta is None:
+        return
+    for key in ("current_freq", "use_featherless", "grid2op_fallback_active"):
+        state_store[key] = meta[key]
+    history.aggregate.raw_head = meta["history_raw_head"]
+    history.aggregate.raw_count = meta["history_raw_count"]
+    mqtt_hub.fleet.refresh()
+
+def checkpoint_step():
+    """Copies live state into the checkpoint's spare slot; the flush happens on its own thread."""
+    with metrics.timer("checkpoint.capture"):
+        checkpoint.capture(checkpoint_meta())
+
+def build_scheduler() -> MultiRateScheduler:
+    """Main VPP control loop: each stage on its own rate and time budget."""
+    stages = [
+        Stage("physics", physics_step, rate_hz=PHYSICS_HZ),
+        Stage("control", control_step, rate_hz=CONTROL_HZ, degrade=control_hold),
+        Stage("grid2op", grid2op_step, rate_hz=GRID2OP_HZ),
+        Stage("persistence", persistence_step, rate_hz=PERSIST_HZ),
+        Stage("broadcast", broadcast_step, rate_hz=BROADCAST_HZ),
+    ]
+    if checkpoint is not None:
+        stages.append(Stage("checkpoint", checkpoint_step, rate_hz=CHECKPOINT_HZ))
+    return MultiRateScheduler(stages, profiler=metrics.profiler)
+
+scheduler = build_scheduler()
+
+@metrics.add_collector
+def loop_metrics():
+    """Stage latencies, MQTT / WebSocket counters and queue depths, read at scrape time."""
+    for name, stage in scheduler.stages.items():
+        labels = {"stage": name}
+        yield Metric("stage_duration_seconds", "histogram", "Wall time of each scheduler stage run.", labels, stage.latency)
+        yield Metric("stage_runs_total", "counter", "Stage runs.", labels, stage.runs)
+        yield Metric("stage_overruns_total", "counter", "Stage runs that exceeded their budget.", labels, stage.overruns)
+        yield Metric("stage_skipped_total", "counter", "Stage deadlines skipped after a late run.", labels, stage.skipped)
+        yield Metric("stage_errors_total", "counter", "Stage runs that raised.", labels, stage.errors)
+
+    yield Metric("mqtt_messages_published_total", "counter", "MQTT messages published.", {}, mqtt_hub.messages_published)
+    yield Metric("mqtt_bytes_published_total", "counter", "MQTT payload bytes published.", {}, mqtt_hub.bytes_published)
+    ingestor = mqtt_hub.ingestor
+    if ingestor is not None:
+        yield Metric("mqtt_messages_received_total", "counter", "Telemetry messages received.", {}, ingestor.buffer.received)
+        yield Metric("mqtt_messages_dropped_total", "counter", "Telemetry messages dropped by the full ingest buffer.", {}, ingestor.buffer.dropped)
+        yield Metric("ingest_applied_total", "counter", "Telemetry records applied to the fleet.", {}, ingestor.applied)
+        yield Metric("queue_depth", "gauge", "Items waiting in each internal queue.", {"queue": "ingest"}, len(ingestor.buffer))
+
+    if inference_worker is not None:
+        yield Metric("inference_duration_seconds", "histogram", "Forward-pass time on the inference worker.", {}, inference_worker.latency)
+        yield Metric("inference_deadline_misses_total", "counter", "Control ticks that reused the last good actions.", {}, inference_worker.misses)
+        yield Metric("inference_superseded_total", "counter", "Observations replaced by a newer one before inference.", {}, inference_worker.superseded)
+        yield Metric("inference_errors_total", "counter", "Failed forward passes.", {}, inference_worker.errors)
+
+    yield Metric("grid2op_lookahead_seconds", "histogram", "Candidate-action lookahead time on the Grid2Op pool.", {}, grid_pool.lookahead_latency)
+    yield Metric("grid2op_candidates_dropped_total", "counter", "Candidate actions not simulated before the deadline.", {}, grid_pool.dropped)
+    yield Metric("grid2op_ticks_skipped_total", "counter", "Grid2Op ticks skipped while a pool member was still busy.", {}, grid_pool.skipped)
+    if microgrid is not None:
+        yield Metric("microgrid_islanded_clusters", "gauge", "Clusters currently islanded.", {}, int(microgrid.islanded.sum()))
+        yield Metric("microgrid_islandings_total", "counter", "Cluster islanding events.", {}, microgrid.islandings)
+        yield Metric("microgrid_reconnections_total", "counter", "Cluster reconnection events.", {}, microgrid.reconnections)
+    if fairness is not None:
+        yield Metric("fairness_required_kw", "gauge", "Load reduction requested by the policy this tick.", {}, fairness.required_kw)
+        yield Metric("fairness_selected_homes", "gauge", "Homes curtailed this tick.", {}, fairness.selected)
+        yield Metric("fairness_shortfall_ticks_total", "counter", "Ticks where the fleet could not cover the request.", {}, fairness.shortfall_ticks)
+    if checkpoint is not None:
+        yield Metric("checkpoint_generation", "gauge", "Generation of the newest checkpoint slot.", {}, checkpoint.generation)
+        yield Metric("checkpoint_skipped_total", "counter", "Captures skipped while a commit was in flight.", {}, checkpoint.skipped)
+        yield Metric("checkpoint_errors_total", "counter", "Failed checkpoint commits.", {}, checkpoint.errors)
+    if archive is not None:
+        yield Metric("archive_segments_written_total", "counter", "Archive segments sealed and written.", {}, archive.sealed)
+        yield Metric("archive_bytes_written_total", "counter", "Compressed archive bytes written.", {}, archive.bytes_written)
+        yield Metric("archive_errors_total", "counter", "Failed archive segment writes.", {}, archive.errors)
+    ws = manager.stats()
+    yield Metric("ws_clients", "gauge", "Connected dashboard WebSockets.", {}, ws["subscribers"])
+    yield Metric("ws_frames_sent_total", "counter", "WebSocket frames sent.", {}, ws["sent"])
+    yield Metric("ws_frames_dropped_total", "counter", "WebSocket frames dropped from full client queues.", {}, ws["dropped"])
+    yield Metric("ws_events_dropped_total", "counter", "Alert/event frames refused by full client event queues.", {}, ws["events_dropped"])
+    yield Metric("queue_depth", "gauge", "Items waiting in each internal queue.", {"queue": "ws"}, ws["queued"])
+
+    write_queue = Database.write_queue
+    if write_queue is not None:
+        yield Metric("queue_depth", "gauge", "Items waiting in each internal queue.", {"queue": "write_behind"}, write_queue.depth)
+        yield Metric("db_documents_written_total", "counter", "Documents written by the write-behind queue.", {}, write_queue.written)
+        yield Metric("db_documents_dropped_total", "counter", "Documents dropped by the write-behind queue.", {}, write_queue.dropped)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup Events
     logger.info("Initializing Backend Services...")
+    if checkpoint is not None:
+        # Before the simulator workers start writing the shared fleet block
+        restore_checkpoint()
+    if archive is not None:
+        await asyncio.to_thread(archive.open)
     await Database.connect()
+    Database.start_write_behind()
     mqtt_hub.connect()
+    mqtt_hub.start_ingest()
+    mqtt_hub.start_simulator()
     
-    global marl_controller
-    marl_controller = MARLController(n_homes=100)
+    global marl_controller, inference_worker
+    marl_controller = MARLController(
+        n_homes=len(mqtt_hub.fleet),
+        policy_mode=os.getenv("MARL_POLICY_MODE", "shared")
+    )
+    if MARL_WARMUP == "blocking":
+        await marl_controller.warm_up()
+    if INFERENCE_WORKER and marl_controller.policy_mode == "shared":
+        inference_worker = InferenceWorker(policy_actions, name="marl-inference")
+        inference_worker.start()
     
-    # Start the orchestration loop
-    task = asyncio.create_task(orchestration_loop())
-    logger.info("Orchestration loop started.")
+    # Start the orchestration stages
+    scheduler.start()
+    logger.info("Orchestration scheduler started.")
+    if MARL_WARMUP != "blocking":
+        # Held for the lifetime of the app so the task is not garbage-collected mid-build
+        warmup_task = asyncio.create_task(marl_controller.warm_up(), name="marl-warmup")
+    if GRID2OP_PREWARM:
+        start_grid2op_warmup()
     
     yield
     
     # Shutdown Events
     logger.info("Shutting down Backend Services...")
-    task.cancel()
+    await scheduler.stop()
+    metrics.profiler.disable()
+    if checkpoint is not None:
+        # Final capture so a rolling restart resumes from the last tick
+        await asyncio.to_thread(checkpoint.wait)
+        checkpoint.capture(checkpoint_meta())
+        await asyncio.to_thread(checkpoint.close)
+    if archive is not None:
+        # Seal the partial segment so the last minutes are queryable after restart
+        await asyncio.to_thread(archive.close)
+    if inference_worker is not None:
+        await asyncio.to_thread(inference_worker.stop)
     mqtt_hub.disconnect()
+    await mqtt_hub.stop_ingest()
+    mqtt_hub.stop_simulator()
+    if grid2op_warmup is not None:
+        grid2op_warmup.cancel()
+    await asyncio.to_thread(grid_pool.close)
+    await featherless_client.aclose()
     await Database.close()
 
 app = FastAPI(title="AI-Driven VPP Orchestrator", lifespan=lifespan)
@@ -145,6 +433,318 @@ app.add_middleware(
 def health_check():
     return {"status": "Backend Active"}
 
+@app.get("/ready")
+def readiness():
+    """
+    200 once the control loop has completed a tick and the learned policy
+    is warm; 503 (with the failing checks) before that. `/` stays a plain
+    liveness check.
+    """
+    checks = {
+        "scheduler": scheduler.running,
+        "first_tick": scheduler.stages["control"].runs > 0,
+        "policy": marl_controller is not None and marl_controller.ready,
+    }
+    body = {
+        "ready": all(checks.values()),
+        "checks": checks,
+        "marl": marl_controller.status() if marl_controller is not None else None,
+    }
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text exposition of every loop metric."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/perf")
+def perf_stats():
+    """The /metrics data as JSON, with latency histograms summarised as percentiles."""
+    return metrics.snapshot()
+
+@app.get("/api/perf/slow_ticks")
+def slow_ticks():
+    """Collapsed stacks sampled during recent slow stage runs (profiler must be on)."""
+    return {"profiler": metrics.profiler.stats(), "slow_ticks": list(metrics.profiler.profiles)}
+
+@app.post("/api/perf/profiler")
+async def toggle_profiler(request: Request):
+    """`{"enabled": bool, "interval_ms": 5, "threshold_ms": 100}`"""
+    data = await request.json()
+    profiler = metrics.profiler
+    if data.get("enabled", True):
+        # Runs on the event-loop thread, which is the one the profiler samples
+        interval, threshold = data.get("interval_ms"), data.get("threshold_ms")
+        profiler.enable(
+            interval=interval / 1000 if interval else None,
+            threshold=threshold / 1000 if threshold is not None else None,
+        )
+    else:
+        await asyncio.to_thread(profiler.disable)
+    return profiler.stats()
+
+@app.get("/api/inference")
+def inference_stats():
+    """Inference worker counters: deadline misses, superseded observations, staleness and forward-pass latency."""
+    if inference_worker is None:
+        raise HTTPException(status_code=404, detail="Inference worker is not enabled.")
+    return inference_worker.stats()
+
+@app.get("/api/scheduler")
+def scheduler_stats():
+    """Per-stage run, overrun and skip counters of the orchestration scheduler."""
+    return scheduler.stats()
+
+@app.get("/api/persistence")
+def persistence_stats():
+    """Depth, drop count and flush latency of the write-behind snapshot queue."""
+    if Database.write_queue is None:
+        return {"write_behind": False}
+    return {"write_behind": True, **Database.write_queue.stats()}
+
+@app.get("/api/ingest")
+def ingest_stats():
+    """Telemetry ingest rate, drops, lag and stale homes (real telemetry mode only)."""
+    if mqtt_hub.ingestor is None:
+        return {"ingest": False}
+    return {"ingest": True, **mqtt_hub.ingestor.stats()}
+
+@app.get("/api/ws")
+def websocket_stats():
+    """Subscriber count and per-frame send/drop/coalesce counters of the WebSocket fan-out."""
+    return manager.stats()
+
+@app.get("/api/history")
+def get_history(series: str = "frequency", start: float = None, end: float = None,
+                points: int = 500, home_id: str = None):
+    """
+    In-memory history of `series` (frequency, total_load, total_generation)
+    or of one home's load, between epoch seconds `start` and `end`
+    (default: the last hour), downsampled to at most ~`points` buckets.
+    """
+    try:
+        return history.query(series=series, start=start, end=end, points=points, home_id=home_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Unknown series or home: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/forecast")
+def get_forecast(horizon: int = None, home_id: str = None):
+    """Aggregate (or one home's) load/generation forecast `horizon` control ticks ahead."""
+    try:
+        result = forecaster.forecast(horizon)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response = {k: result[k] for k in ("horizon", "ready", "predicted_load", "predicted_gen")}
+    if home_id is not None:
+        if home_id not in mqtt_hub.fleet.index:
+            raise HTTPException(status_code=404, detail=f"Unknown home: {home_id}")
+        row = mqtt_hub.fleet.index[home_id]
+        response.update(home_id=home_id, home_load=float(result["home_load"][row]), home_gen=float(result["home_gen"][row]))
+    return response
+
+@app.get("/api/attack")
+def attack_stats():
+    """Current synchronization score, correlation estimate and alert count of the spike detector."""
+    return attack_detector.stats()
+
+@app.get("/api/checkpoint")
+def checkpoint_stats():
+    """Checkpoint generation, capture/commit timings, skipped captures and the last restore."""
+    if checkpoint is None:
+        raise HTTPException(status_code=404, detail="Checkpointing is not enabled (CHECKPOINT_HZ=0).")
+    return checkpoint.stats()
+
+@app.get("/api/archive")
+def archive_stats():
+    """Archived segments and partitions, time span, size on disk and compression ratio."""
+    if archive is None:
+        raise HTTPException(status_code=404, detail="The snapshot archive is not enabled (ARCHIVE_SEGMENT_S=0).")
+    return archive.stats()
+
+@app.post("/api/archive/query")
+async def archive_query(request: Request):
+    """
+    Analytics over the archived snapshots. Body: `{"kind": "grid" | "actions" |
+    "participation", "start": t0, "end": t1, ...}` with epoch-second bounds.
+    - grid: `"columns": [...], "where": {"frequency": [lo, hi]}, "limit": 1000`
+    - actions: `"homes": ["home_42", ...]`
+    - participation: `"homes": [...] (omit for the top homes), "field": "ac", "above": 0.0, "top": 20`
+    """
+    if archive is None:
+        raise HTTPException(status_code=404, detail="The snapshot archive is not enabled (ARCHIVE_SEGMENT_S=0).")
+    data = await request.json()
+    kind = data.get("kind", "grid")
+    start, end = data.get("start"), data.get("end")
+    try:
+        if kind == "grid":
+            query = lambda: archive.query_grid(start, end, columns=data.get("columns", SCALAR_COLUMNS),
+                                               where=data.get("where"), limit=data.get("limit"))
+        elif kind == "actions":
+            query = lambda: archive.home_actions(data.get("homes", []), start, end)
+        elif kind == "participation":
+            query = lambda: archive.participation(data.get("homes"), start, end, field=data.get("field", "ac"),
+                                                  above=float(data.get("above", 0.0)), top=int(data.get("top", 20)))
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown archive query kind: {kind}")
+        # Segment reads and decompression stay off the event loop
+        return await asyncio.to_thread(query)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Unknown home: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/fairness")
+def fairness_stats(home_id: str = None):
+    """Requested vs delivered reduction, homes selected and burden spread; or one home's decayed scores."""
+    if fairness is None:
+        raise HTTPException(status_code=404, detail="Fairness scheduler is not enabled (FAIRNESS_SCHEDULER=0).")
+    if home_id is not None:
+        if home_id not in mqtt_hub.fleet.index:
+            raise HTTPException(status_code=404, detail=f"Unknown home: {home_id}")
+        row = mqtt_hub.fleet.index[home_id]
+        burden, comfort, wear = fairness.scores_of([row])[0]
+        return {"home_id": home_id, "burden_kwh": burden, "comfort_kwh": comfort, "wear_cycles": wear,
+                "participations": int(fairness.participations[row])}
+    return fairness.stats()
+
+@app.get("/api/microgrid")
+def microgrid_stats(cluster: int = None):
+    """Islanding state, event counters and weakest clusters by balance index; or one `cluster` in detail."""
+    if microgrid is None:
+        raise HTTPException(status_code=404, detail="Microgrid clustering is not enabled (MICROGRID_CLUSTERS=0).")
+    if cluster is not None:
+        if not 0 <= cluster < len(microgrid):
+            raise HTTPException(status_code=404, detail=f"Unknown cluster: {cluster}")
+        return microgrid.cluster(cluster)
+    return microgrid.stats()
+
+@app.post("/api/microgrid")
+async def control_microgrid(request: Request):
+    """
+    Operator actions: `{"action": "island" | "reconnect", "clusters": [...]}`
+    or `{"action": "move", "homes": [...], "cluster": k}` (k = -1 for an empty cluster).
+    """
+    if microgrid is None:
+        raise HTTPException(status_code=404, detail="Microgrid clustering is not enabled (MICROGRID_CLUSTERS=0).")
+    data = await request.json()
+    action = data.get("action")
+    try:
+        if action in ("island", "reconnect"):
+            clusters = [int(c) for c in data.get("clusters", [])]
+            if any(not 0 <= c < len(microgrid) for c in clusters):
+                raise ValueError("cluster ids out of range")
+            events = microgrid.set_islanded(clusters, action == "island", state_store["current_freq"])
+        elif action == "move":
+            rows = [mqtt_hub.fleet.index[h] for h in data.get("homes", [])]
+            cluster = int(data.get("cluster", -1))
+            if cluster < 0:
+                cluster = microgrid.empty_cluster()
+                if cluster < 0:
+                    raise ValueError("no empty cluster left")
+            microgrid.move(rows, cluster)
+            events = []
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown microgrid action: {action}")
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Unknown home: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if events:
+        await manager.broadcast_event({"type": "MICROGRID_EVENT", "events": events})
+    return {"events": events, **microgrid.stats()}
+
+@app.post("/api/replay")
+async def replay(request: Request):
+    """
+    What-if replay of recorded data, as fast as it computes. Body:
+    `{"source": "history" | "snapshots", "seconds": 3600, "limit": 86400,
+    "variants": [{"name", "inertia", "damping", "policy": "none" | "droop" | "marl",
+    "deadband", "full_response"}], "limits": [49.8, 50.2], "power_scale": 1.0}`.
+    Returns frequency-deviation statistics for each variant.
+    """
+    data = await request.json()
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Request body must be a JSON object.")
+    try:
+        if data.get("source", "history") == "snapshots":
+            docs = await Database.get_recent_states("grid_snapshots", int(data.get("limit", 86400)))
+            if not docs:
+                raise HTTPException(status_code=404, detail="No snapshots recorded yet.")
+            trace = ReplayTrace.from_snapshots(docs)
+        else:
+            seconds = data.get("seconds")
+            trace = ReplayTrace.from_history(history, None if seconds is None else float(seconds))
+
+        specs = data.get("variants") or [{"name": "live", "inertia": swing_eq.inertia, "damping": swing_eq.damping}]
+        if not isinstance(specs, list) or not all(isinstance(spec, dict) for spec in specs):
+            raise ValueError("variants must be a list of objects.")
+
+        # Identical droop settings share one controller so their variants are batched together
+        droops = {}
+        variants = []
+        for spec in specs:
+            numeric = ("inertia", "damping", "deadband", "full_response")
+            spec = {**spec, **{k: float(spec[k]) for k in numeric if k in spec}}
+            if spec.get("inertia", 1.0) <= 0 or spec.get("damping", 0.0) < 0:
+                raise ValueError("inertia must be positive and damping non-negative.")
+            kind = spec.get("policy", "none")
+            if kind == "droop":
+                key = (spec.get("deadband", 0.02), spec.get("full_response", 0.2))
+                if key[1] <= 0:
+                    raise ValueError("full_response must be positive.")
+                policy = droops.setdefault(key, RuleBasedController(deadband=key[0], full_response=key[1]))
+            elif kind == "marl":
+                if not marl_controller.ready or marl_controller.policy_mode != "shared":
+                    raise HTTPException(status_code=409, detail="MARL policy is not ready for batched replay.")
+                policy = marl_controller
+            elif kind == "none":
+                policy = None
+            else:
+                raise ValueError(f"Unknown policy: {kind}")
+            variants.append({**spec, "policy": policy})
+
+        low, high = (float(x) for x in data.get("limits", (49.8, 50.2)))
+        engine = ReplayEngine(trace, variants, f_nominal=swing_eq.f_nominal, limits=(low, high),
+                              power_scale=float(data.get("power_scale", 1.0)))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # CPU-bound: keep it off the event loop
+    return await asyncio.to_thread(engine.run)
+
+@app.get("/api/simulator")
+def simulator_stats():
+    """Worker processes, row ranges and tick counts of the sharded home simulator."""
+    if mqtt_hub.simulator is None:
+        raise HTTPException(status_code=404, detail="Sharded home simulator is not enabled (HOME_SIM_SHARDS=0).")
+    return mqtt_hub.simulator.stats()
+
+@app.post("/api/simulator")
+async def control_simulator(request: Request):
+    """`{"action": "start" | "stop" | "rebalance", "shards": k}`; the API keeps serving throughout."""
+    simulator = mqtt_hub.simulator
+    if simulator is None:
+        raise HTTPException(status_code=404, detail="Sharded home simulator is not enabled (HOME_SIM_SHARDS=0).")
+    data = await request.json()
+    action = data.get("action")
+    shards = data.get("shards")
+    try:
+        shards = None if shards is None else int(shards)
+        # Spawning and joining workers blocks, so keep it off the event loop
+        if action == "start":
+            await asyncio.to_thread(simulator.start, shards)
+        elif action == "stop":
+            await asyncio.to_thread(simulator.stop)
+        elif action == "rebalance" and shards is not None:
+            await asyncio.to_thread(simulator.rebalance, shards)
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown simulator action: {action}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return simulator.stats()
+
 @app.post("/api/toggle_inference")
 async def toggle_inference(request: Request):
     data = await request.json()
@@ -159,21 +759,49 @@ async def toggle_grid2op(request: Request):
     activate = data.get("activate", False)
     state_store["grid2op_fallback_active"] = activate
     
-    if activate and grid_fallback.env is None:
-        grid_fallback.make_env()
-        grid_fallback.reset()
-    elif not activate and grid_fallback.env is not None:
-        grid_fallback.close()
+    if activate and grid_pool.state in ("cold", "failed"):
+        # Not pre-warmed: build the pool in the background, the grid2op stage picks it up once ready
+        start_grid2op_warmup()
+    # Deactivating keeps the pool warm so the next activation is instant
         
-    return {"status": "success", "grid2op_fallback": activate}
+    return {"status": "success", "grid2op_fallback": activate, "pool": grid_pool.state}
+
+@app.get("/api/grid2op")
+def grid2op_stats():
+    """Grid2Op pool state, step/lookahead latency and the latest candidate ranking."""
+    return {"active": state_store["grid2op_fallback_active"], **grid_pool.stats()}
 
 @app.websocket("/ws/grid")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    """
+    Live grid stream. Clients may pass `?rate_hz=2&fleet=1`, or later send
+    `{"rate_hz": 2, "fleet": true}`, to cap their frame rate and receive
+    delta-encoded FLEET_UPDATE frames for every home.
+    """
+    params = websocket.query_params
+    try:
+        await manager.connect(
+            websocket,
+            rate_hz=params.get("rate_hz") or None,
+            fleet=params.get("fleet") in ("1", "true")
+        )
+    except ValueError:
+        await websocket.close(code=1008)  # policy violation: bad preferences
+        return
     try:
         while True:
-             # Keep connection alive, listen for client pings/commands if needed
+             # Keep connection alive, listen for client pings/subscription changes
              data = await websocket.receive_text()
-             pass
+             try:
+                 request = json.loads(data)
+             except json.JSONDecodeError:
+                 continue
+             if isinstance(request, dict):
+                 try:
+                     manager.configure(websocket, rate_hz=request.get("rate_hz"), fleet=request.get("fleet"))
+                 except (ValueError, TypeError) as e:
+                     await websocket.send_json({"type": "ERROR", "detail": str(e)})
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
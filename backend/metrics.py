@@ -0,0 +1,262 @@
+import bisect
+import logging
+import math
+import sys
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from itertools import groupby
+
+logger = logging.getLogger(__name__)
+
+# name, kind ("counter" | "gauge" | "histogram"), help text, labels dict, value
+# (a number, or a LatencyHistogram for kind "histogram")
+Metric = namedtuple("Metric", "name kind help labels value")
+
+
+def _log_bounds(low: float = 1e-5, high: float = 60.0, per_decade: int = 10) -> list:
+    decades = math.log10(high / low)
+    return [low * 10 ** (i / per_decade) for i in range(int(round(decades * per_decade)) + 1)]
+
+
+LATENCY_BOUNDS = _log_bounds()
+
+
+class LatencyHistogram:
+    """
+    Fixed log-bucketed latency histogram, 10 buckets per decade from 10 µs to
+    60 s (about 26% relative resolution, in the spirit of HDR histograms).
+
+    record() is one bisect and two adds, so it is cheap enough to call on
+    every stage run. Memory is constant regardless of how many samples.
+    """
+
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile (0-1); 0 when empty."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def cumulative(self):
+        """(upper bound, cumulative count) pairs in Prometheus `le` order, ending with +Inf."""
+        total = 0
+        for bound, c in zip(self.bounds + [math.inf], self.counts):
+            total += c
+            yield bound, total
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.50) * 1000, 3),
+            "p90_ms": round(self.percentile(0.90) * 1000, 3),
+            "p99_ms": round(self.percentile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class _SectionTimer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter() - self.start)
+        return False
+
+
+class SlowTickProfiler:
+    """
+    Sampling profiler for slow ticks, switched on and off at runtime.
+
+    While enabled, a daemon thread samples the event-loop thread's Python
+    stack every `interval` seconds into a short ring. When a stage run takes
+    longer than `threshold` seconds, the samples that fall inside that run
+    are folded into collapsed-stack counts (`outer;inner;leaf count`, the
+    flame-graph input format) and kept with the run. Stages share one
+    thread, so a run's samples can include other stages' code that ran while
+    it was awaiting. Disabled, it costs nothing.
+    """
+
+    def __init__(self, interval: float = 0.005, threshold: float = 0.1, keep: int = 20, max_depth: int = 64):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_depth = max_depth
+        self.profiles = deque(maxlen=keep)
+        self.samples = deque(maxlen=4096)
+        self._thread = None
+        self._stop = threading.Event()
+        self._target = None
+        self.sampled = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None
+
+    def enable(self, interval: float = None, threshold: float = None):
+        """Starts sampling the calling thread, which should be the event-loop thread."""
+        if interval is not None:
+            self.interval = interval
+        if threshold is not None:
+            self.threshold = threshold
+        if self.enabled:
+            return
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="slow-tick-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"Slow-tick profiler on: {self.interval * 1000:.1f} ms interval, {self.threshold * 1000:.0f} ms threshold.")
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.samples.clear()
+        logger.info("Slow-tick profiler off.")
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.samples.append((time.monotonic(), ";".join(reversed(stack))))
+            self.sampled += 1
+
+    def observe(self, stage: str, start: float, duration: float):
+        """Called after every stage run (monotonic `start`); keeps the stacks of slow ones."""
+        if not self.enabled or duration < self.threshold:
+            return
+        end = start + duration
+        stacks = Counter(stack for t, stack in list(self.samples) if start <= t <= end)
+        self.profiles.append({
+            "stage": stage,
+            "at": time.time() - (time.monotonic() - start),
+            "duration_ms": round(duration * 1000, 3),
+            "samples": sum(stacks.values()),
+            "stacks": [f"{stack} {count}" for stack, count in stacks.most_common()],
+        })
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "interval_ms": round(self.interval * 1000, 3),
+            "threshold_ms": round(self.threshold * 1000, 3),
+            "sampled": self.sampled,
+            "slow_ticks": len(self.profiles),
+        }
+
+
+class PerfMetrics:
+    """
+    Process-wide performance metrics for the control loop.
+
+    Code sections are timed into named LatencyHistograms with `timer()`.
+    Everything else (counters, queue depths, stage histograms) is pulled
+    from the owning components by collector callbacks at scrape time, so it
+    adds no work to the hot path. Rendered as Prometheus text or JSON.
+    """
+
+    def __init__(self, namespace: str = "vpp"):
+        self.namespace = namespace
+        self.sections = {}
+        self.collectors = []
+        self.profiler = SlowTickProfiler()
+
+    def timer(self, section: str) -> _SectionTimer:
+        """`with metrics.timer("control.inference"):` records the block's wall time."""
+        histogram = self.sections.get(section)
+        if histogram is None:
+            histogram = self.sections[section] = LatencyHistogram()
+        return _SectionTimer(histogram)
+
+    def add_collector(self, fn):
+        """`fn()` returns an iterable of Metric; called on every scrape."""
+        self.collectors.append(fn)
+        return fn
+
+    def collect(self) -> list:
+        metrics = [
+            Metric("section_duration_seconds", "histogram", "Wall time of instrumented code sections.",
+                   {"section": name}, histogram)
+            for name, histogram in self.sections.items()
+        ]
+        for fn in self.collectors:
+            try:
+                metrics.extend(fn())
+            except Exception as e:
+                logger.error(f"Metrics collector {getattr(fn, '__name__', fn)} failed: {e}")
+        return metrics
+
+    def render_prometheus(self) -> str:
+        lines = []
+        # The exposition format wants each family's samples contiguous under one
+        # HELP/TYPE: a stable sort on first appearance keeps collector order otherwise
+        first_seen = {}
+        metrics = sorted(self.collect(), key=lambda m: first_seen.setdefault(m.name, len(first_seen)))
+        for metric_name, family in groupby(metrics, key=lambda m: m.name):
+            family = list(family)
+            name = f"{self.namespace}_{metric_name}"
+            lines.append(f"# HELP {name} {family[0].help}")
+            lines.append(f"# TYPE {name} {family[0].kind}")
+            for m in family:
+                if m.kind == "histogram":
+                    for bound, total in m.value.cumulative():
+                        le = "+Inf" if bound == math.inf else f"{bound:.6g}"
+                        lines.append(f"{name}_bucket{_labels({**m.labels, 'le': le})} {total}")
+                    lines.append(f"{name}_sum{_labels(m.labels)} {m.value.sum:.9g}")
+                    lines.append(f"{name}_count{_labels(m.labels)} {m.value.count}")
+                else:
+                    lines.append(f"{name}{_labels(m.labels)} {float(m.value):.9g}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """JSON form: histograms as percentile summaries, grouped by metric name."""
+        out = {}
+        for m in self.collect():
+            key = ",".join(f"{k}={v}" for k, v in m.labels.items()) or "value"
+            value = m.value.summary() if m.kind == "histogram" else m.value
+            out.setdefault(m.name, {})[key] = value
+        out["profiler"] = self.profiler.stats()
+        return out
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for k, v in labels.items():
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{k}="{v}"')
+    return "{" + ",".join(pairs) + "}"
@@ -0,0 +1,250 @@
+import logging
+import os
+import time
+
+import numpy as np
+
+from backend.fleet_state import COLUMNS
+from backend.swing_equation import BatchSwingEquation
+
+logger = logging.getLogger(__name__)
+
+MICROGRID_CLUSTERS = int(os.getenv("MICROGRID_CLUSTERS", 0))  # 0 = one global grid, no islanding
+MICROGRID_AUTO_ISLAND = os.getenv("MICROGRID_AUTO_ISLAND", "1") == "1"
+
+LOAD, GEN, SOC = (COLUMNS.index(c) for c in ("load_kw", "generation_kw", "battery_soc"))
+
+
+def contiguous_clusters(n_homes: int, n_clusters: int) -> np.ndarray:
+    """Default feeder assignment: contiguous blocks of homes, as cluster_feature() numbers them."""
+    return (np.arange(n_homes) * n_clusters // max(n_homes, 1)).astype(np.int64)
+
+
+class MicrogridClusters:
+    """
+    Feeder/cluster view of the fleet for the islanding controller.
+
+    Membership is a home -> cluster index array. Per-cluster load,
+    generation and summed SoC come from a single bincount over the
+    fleet's contiguous (3, N) block per tick. The block is indexed with
+    `cluster + column * C`, so the order of homes never matters. Moving
+    homes only rewrites their entries and adjusts the member counts; it
+    costs O(moved), never a rebuild.
+
+    Each cluster has a balance index over `horizon_h` hours:
+    (generation + deliverable battery power - load) / load. A cluster at
+    or above `island_margin` can carry itself. When the grid frequency
+    leaves the `island_deviation` band, such clusters island
+    automatically. Islanded clusters run their own swing equation: each
+    has an inertia and damping share in proportion to its size, and the
+    mismatch is its own generation minus load, less what its batteries
+    can cover. They reconnect once the
+    grid has been back inside `reconnect_deviation` for `reconnect_hold`
+    seconds and their frequency is within `sync_tolerance` of it. An
+    islanded cluster whose frequency collapses outside `collapse_band` is
+    reconnected as soon as the grid is no longer disturbed. Clusters
+    islanded by an operator are pinned and never auto-reconnect. All
+    decisions are array operations over the clusters.
+    """
+
+    def __init__(self, n_homes: int, n_clusters: int, membership=None, f_nominal: float = 50.0,
+                 inertia_per_home: float = 0.001, damping_per_home: float = 0.0005, battery_kwh: float = 10.0,
+                 battery_kw: float = 5.0, soc_floor: float = 0.2, horizon_h: float = 1.0, island_margin: float = 0.0,
+                 island_deviation: float = 0.5, reconnect_deviation: float = 0.1, reconnect_hold: float = 10.0,
+                 sync_tolerance: float = 0.1, collapse_band: float = 1.0, auto_island: bool = MICROGRID_AUTO_ISLAND):
+        self.n_homes = n_homes
+        self.n_clusters = n_clusters
+        self.f_nominal = f_nominal
+        self.inertia_per_home = inertia_per_home
+        self.damping_per_home = damping_per_home
+        self.battery_kwh = battery_kwh
+        self.battery_kw = battery_kw
+        self.soc_floor = soc_floor
+        self.horizon_h = horizon_h
+        self.island_margin = island_margin
+        self.island_deviation = island_deviation
+        self.reconnect_deviation = reconnect_deviation
+        self.reconnect_hold = reconnect_hold
+        self.sync_tolerance = sync_tolerance
+        self.collapse_band = collapse_band
+        self.auto_island = auto_island
+
+        membership = contiguous_clusters(n_homes, n_clusters) if membership is None else membership
+        self.cluster_of = np.asarray(membership, dtype=np.int64).copy()
+        if self.cluster_of.shape != (n_homes,) or self.cluster_of.min(initial=0) < 0 \
+                or self.cluster_of.max(initial=0) >= n_clusters:
+            raise ValueError(f"membership must be {n_homes} cluster ids in [0, {n_clusters})")
+        # Flat bincount index into the fleet block: column c of home i -> cluster_of[i] + c * C
+        self._offsets = np.arange(len(COLUMNS), dtype=np.int64)[:, None] * n_clusters
+        self._index = (self.cluster_of[None, :] + self._offsets).ravel()
+        self.counts = np.bincount(self.cluster_of, minlength=n_clusters)
+
+        self.load = np.zeros(n_clusters)
+        self.generation = np.zeros(n_clusters)
+        self.reserve_kwh = np.zeros(n_clusters)
+        self.deliverable_kw = np.zeros(n_clusters)
+        self.balance = np.zeros(n_clusters)
+
+        self.islanded = np.zeros(n_clusters, dtype=bool)
+        self.pinned = np.zeros(n_clusters, dtype=bool)
+        self.swing = BatchSwingEquation(n_clusters, f_nominal=f_nominal, method="exp")
+        self._size_physics()
+        self.healthy_for = 0.0
+        self._last_update = None
+
+        self.moves = 0
+        self.islandings = 0
+        self.reconnections = 0
+        self.collapses = 0
+
+    def __len__(self):
+        return self.n_clusters
+
+    @property
+    def frequency(self) -> np.ndarray:
+        return self.swing.frequency
+
+    def _size_physics(self):
+        size = np.maximum(self.counts, 1)
+        self.swing.inertia[:] = self.inertia_per_home * size
+        self.swing.damping[:] = self.damping_per_home * size
+
+    def move(self, rows, clusters):
+        """Reassigns fleet rows to `clusters` (scalar or per row) in O(len(rows))."""
+        rows = np.asarray(rows, dtype=np.int64).ravel()
+        clusters = np.broadcast_to(np.asarray(clusters, dtype=np.int64), rows.shape)
+        if clusters.size and (clusters.min() < 0 or clusters.max() >= self.n_clusters):
+            raise ValueError(f"cluster ids must be in [0, {self.n_clusters})")
+        rows, first = np.unique(rows, return_index=True)  # a row listed twice keeps its first target
+        clusters = clusters[first]
+        old = self.cluster_of[rows]
+        np.subtract.at(self.counts, old, 1)
+        np.add.at(self.counts, clusters, 1)
+        self.cluster_of[rows] = clusters
+        index = self._index.reshape(len(COLUMNS), self.n_homes)
+        index[:, rows] = clusters[None, :] + self._offsets
+        self._size_physics()
+        self.moves += len(rows)
+
+    def empty_cluster(self) -> int:
+        """Id of a cluster with no members (to split homes into), or -1 if none is free."""
+        free = np.flatnonzero(self.counts == 0)
+        return int(free[0]) if len(free) else -1
+
+    def aggregate(self, fleet_data: np.ndarray):
+        """Per-cluster load, generation, SoC reserve and balance index from the (3, N) fleet block."""
+        sums = np.bincount(self._index, weights=fleet_data.ravel(), minlength=len(COLUMNS) * self.n_clusters)
+        sums = sums.reshape(len(COLUMNS), self.n_clusters)
+        self.load[:] = sums[LOAD]
+        self.generation[:] = sums[GEN]
+        usable = np.maximum(sums[SOC] * 0.01 - self.counts * self.soc_floor, 0.0)
+        np.multiply(usable, self.battery_kwh, out=self.reserve_kwh)
+
+        np.minimum(self.reserve_kwh / self.horizon_h, self.counts * self.battery_kw, out=self.deliverable_kw)
+        surplus = self.generation + self.deliverable_kw - self.load
+        np.divide(surplus, np.maximum(self.load, 1e-6), out=self.balance)
+
+    def update(self, fleet_data: np.ndarray, grid_frequency: float, now: float = None) -> list:
+        """
+        One control tick: aggregates the fleet, then makes the island and
+        reconnect decisions. Returns the events (dicts) of clusters that
+        changed state.
+        """
+        now = time.monotonic() if now is None else now
+        dt = 0.0 if self._last_update is None else now - self._last_update
+        self._last_update = now
+        self.aggregate(fleet_data)
+
+        deviation = abs(grid_frequency - self.f_nominal)
+        disturbed = deviation > self.island_deviation
+        self.healthy_for = self.healthy_for + dt if deviation < self.reconnect_deviation else 0.0
+        events = []
+
+        if self.auto_island and disturbed:
+            to_island = ~self.islanded & (self.counts > 0) & (self.balance >= self.island_margin)
+            events += self._set(to_island, True, "island", grid_frequency, now)
+
+        collapsed = self.islanded & ~self.pinned & (np.abs(self.frequency - self.f_nominal) > self.collapse_band)
+        if not disturbed and collapsed.any():
+            self.collapses += int(collapsed.sum())
+            events += self._set(collapsed, False, "collapse_reconnect", grid_frequency, now)
+
+        if self.healthy_for >= self.reconnect_hold:
+            synced = np.abs(self.frequency - grid_frequency) < self.sync_tolerance
+            events += self._set(self.islanded & ~self.pinned & synced, False, "reconnect", grid_frequency, now)
+        return events
+
+    def step_frequency(self, grid_frequency: float, dt: float):
+        """Advances islanded clusters on their own mismatch; connected ones follow the grid."""
+        if self.islanded.any():
+            self.swing.dt = dt
+            # Batteries form the island: they cover the gap up to their deliverable power
+            # (or absorb surplus up to their rating); only the rest moves the frequency
+            support = np.clip(self.load - self.generation, -self.counts * self.battery_kw, self.deliverable_kw)
+            self.swing.step(self.generation + support, self.load)
+        self.frequency[~self.islanded] = grid_frequency
+
+    def grid_totals(self, total_generation: float, total_load: float):
+        """(generation, load) still connected to the main grid, i.e. without the islanded clusters."""
+        if not self.islanded.any():
+            return total_generation, total_load
+        return (total_generation - float(self.generation[self.islanded].sum()),
+                total_load - float(self.load[self.islanded].sum()))
+
+    def set_islanded(self, clusters, islanded: bool, grid_frequency: float, pin: bool = True) -> list:
+        """Operator override: islands (pinned) or reconnects the given clusters."""
+        mask = np.zeros(self.n_clusters, dtype=bool)
+        mask[np.asarray(clusters, dtype=np.int64)] = True
+        events = self._set(mask & (self.islanded != islanded), islanded, "manual", grid_frequency, time.monotonic())
+        self.pinned[mask] = islanded and pin
+        return events
+
+    def _set(self, mask, islanded: bool, reason: str, grid_frequency: float, now: float) -> list:
+        clusters = np.flatnonzero(mask)
+        if not len(clusters):
+            return []
+        self.islanded[clusters] = islanded
+        self.frequency[clusters] = grid_frequency  # islands start from, and rejoin at, the grid frequency
+        if islanded:
+            self.islandings += len(clusters)
+        else:
+            self.pinned[clusters] = False
+            self.reconnections += len(clusters)
+        logger.info(f"{'Islanded' if islanded else 'Reconnected'} {len(clusters)} cluster(s) ({reason}).")
+        return [{
+            "cluster": int(c),
+            "islanded": islanded,
+            "reason": reason,
+            "balance": round(float(self.balance[c]), 4),
+            "homes": int(self.counts[c]),
+        } for c in clusters]
+
+    def cluster(self, c: int) -> dict:
+        return {
+            "cluster": c,
+            "homes": int(self.counts[c]),
+            "islanded": bool(self.islanded[c]),
+            "pinned": bool(self.pinned[c]),
+            "frequency": float(self.frequency[c]),
+            "load_kw": float(self.load[c]),
+            "generation_kw": float(self.generation[c]),
+            "reserve_kwh": float(self.reserve_kwh[c]),
+            "balance": float(self.balance[c]),
+        }
+
+    def stats(self, worst: int = 5) -> dict:
+        occupied = np.flatnonzero(self.counts > 0)
+        order = occupied[np.argsort(self.balance[occupied])[:worst]]
+        return {
+            "clusters": self.n_clusters,
+            "occupied": len(occupied),
+            "islanded": int(self.islanded.sum()),
+            "pinned": int(self.pinned.sum()),
+            "self_sufficient": int((self.balance[occupied] >= self.island_margin).sum()),
+            "healthy_for_s": round(self.healthy_for, 3),
+            "moves": self.moves,
+            "islandings": self.islandings,
+            "reconnections": self.reconnections,
+            "collapses": self.collapses,
+            "weakest": [self.cluster(int(c)) for c in order],
+        }
@@ -1,29 +1,228 @@
 import logging
 import numpy as np
 
+from backend.fleet_state import FleetState
+
 logger = logging.getLogger(__name__)
 
+
+class PatchForecastEngine:
+    """
+    Channel-independent linear PatchTST forecaster over many series at once.
+
+    Every series keeps a sliding window of the last `context` samples in a
+    preallocated ring. The model splits the window into `context // patch_len`
+    non-overlapping patches ending at the newest sample, embeds each patch
+    with W_embed and maps the concatenated tokens through W_head, with
+    instance normalisation (RevIN) around it. Since every step is linear,
+    the embedding is folded into the head once, at construction:
+
+        W_eff[p] = W_embed @ W_head[p]     (patch_len, max_horizon) per patch
+
+    and RevIN comes out of the product from the window mean and std:
+
+        out = x @ W_eff - mu * sum(W_eff) + sigma * c + mu
+
+    so a new sample costs one ring write and a forecast is one batched
+    (n_series, context) @ (context, max_horizon) product over the ring,
+    with the folded weights rotated to the ring's order. Results are cached
+    until the next sample.
+
+    Without trained weights the head reproduces normalised last-patch
+    persistence; trained weights are loaded from an .npz with W_embed,
+    b_embed, W_head and b_head.
+    """
+
+    def __init__(self, n_series: int, context: int = 64, patch_len: int = 8, max_horizon: int = 60,
+                 weights: dict = None):
+        if context % patch_len:
+            raise ValueError("context must be a multiple of patch_len")
+        self.n_series = n_series
+        self.context = context
+        self.patch_len = patch_len
+        self.n_patches = context // patch_len
+        self.max_horizon = max_horizon
+
+        weights = weights or self._persistence_weights()
+        self.W_embed = np.asarray(weights["W_embed"], dtype=np.float32)
+        self.b_embed = np.asarray(weights["b_embed"], dtype=np.float32)
+        self.W_head = np.asarray(weights["W_head"], dtype=np.float32)
+        self.b_head = np.asarray(weights["b_head"], dtype=np.float32)
+        self.d_model = self.W_embed.shape[1]
+        if self.W_head.shape != (self.n_patches * self.d_model, max_horizon):
+            raise ValueError(f"W_head must be {(self.n_patches * self.d_model, max_horizon)}, got {self.W_head.shape}")
+
+        head = self.W_head.reshape(self.n_patches, self.d_model, max_horizon).astype(np.float64)
+        W_eff = np.matmul(self.W_embed.astype(np.float64), head)  # (n_patches, patch_len, max_horizon)
+        self.W_eff = W_eff.reshape(context, max_horizon).astype(np.float32)
+        self._eff_colsum = W_eff.sum(axis=(0, 1)).astype(np.float32)
+        self._eff_bias = (self.b_embed.astype(np.float64) @ head.sum(axis=0) + self.b_head).astype(np.float32)
+
+        self.window = np.zeros((context, n_series), dtype=np.float32)
+        self.samples = 0
+        self._cache = None
+
+    @classmethod
+    def from_file(cls, path: str, n_series: int, **kwargs):
+        with np.load(path) as data:
+            weights = {k: data[k] for k in ("W_embed", "b_embed", "W_head", "b_head")}
+        return cls(n_series, weights=weights, **kwargs)
+
+    def _persistence_weights(self) -> dict:
+        W_head = np.zeros((self.n_patches * self.patch_len, self.max_horizon), dtype=np.float32)
+        W_head[-self.patch_len:, :] = 1.0 / self.patch_len
+        return {
+            "W_embed": np.eye(self.patch_len, dtype=np.float32),
+            "b_embed": np.zeros(self.patch_len, dtype=np.float32),
+            "W_head": W_head,
+            "b_head": np.zeros(self.max_horizon, dtype=np.float32),
+        }
+
+    def push(self, values):
+        """Appends one sample per series and invalidates the cached forecast."""
+        self.window[self.samples % self.context] = values
+        self.samples += 1
+        self._cache = None
+
+    @property
+    def ready(self) -> bool:
+        return self.samples >= self.context
+
+    def forecast(self) -> np.ndarray:
+        """(n_series, max_horizon) forecast, cached until the next sample."""
+        if self._cache is None:
+            self._cache = self._forecast_folded() if self.ready else self._persistence()
+        return self._cache
+
+    def forecast_at(self, horizon: int) -> np.ndarray:
+        """(n_series,) forecast `horizon` steps ahead."""
+        if not 1 <= horizon <= self.max_horizon:
+            raise ValueError(f"horizon must be in 1..{self.max_horizon}")
+        return self.forecast()[:, horizon - 1]
+
+    def forecast_naive(self) -> np.ndarray:
+        """Full recompute through explicit patch tokens; reference path for checks and benchmarks."""
+        if not self.ready:
+            return self._persistence()
+        rows = np.arange(self.samples - self.context, self.samples) % self.context
+        ordered = self.window[rows]  # last `context` samples, oldest first
+        mu = ordered.mean(axis=0, dtype=np.float64)
+        sigma = ordered.std(axis=0, dtype=np.float64) + 1e-5
+        normed = ((ordered - mu) / sigma).astype(np.float32)
+        patches = normed.T.reshape(self.n_series, self.n_patches, self.patch_len)
+        tokens = patches @ self.W_embed + self.b_embed
+        out = tokens.reshape(self.n_series, -1) @ self.W_head + self.b_head
+        return out * sigma[:, None].astype(np.float32) + mu[:, None].astype(np.float32)
+
+    def _forecast_folded(self) -> np.ndarray:
+        window = self.window
+        mu = window.mean(axis=0, dtype=np.float64)
+        sigma = np.sqrt(np.maximum((window * window).mean(axis=0, dtype=np.float64) - mu * mu, 0.0)) + 1e-5
+
+        # Ring row k holds time position (k - oldest) % context of the window
+        oldest = self.samples % self.context
+        weights = self.W_eff[(np.arange(self.context) - oldest) % self.context]
+        out = window.T @ weights
+        mu32, sigma32 = mu.astype(np.float32)[:, None], sigma.astype(np.float32)[:, None]
+        out -= mu32 * self._eff_colsum
+        out += sigma32 * self._eff_bias
+        out += mu32
+        return out
+
+    def _persistence(self) -> np.ndarray:
+        if self.samples == 0:
+            return np.zeros((self.n_series, self.max_horizon), dtype=np.float32)
+        last = self.window[(self.samples - 1) % self.context]
+        return np.repeat(last[:, None], self.max_horizon, axis=1)
+
+
 class PatchTSTForecaster:
     """
     Forecasting grid load and solar generation using PatchTST time-series models.
+
+    observe() feeds one fleet sample per control tick into a PatchForecastEngine
+    whose series are every home's load, the fleet total load, every home's
+    generation and the fleet total generation, so the whole fleet is forecast
+    in one batched call.
     """
-    def __init__(self, model_path=None):
+    def __init__(self, model_path=None, context: int = 64, patch_len: int = 8, max_horizon: int = 60):
         self.model_path = model_path
+        self.context = context
+        self.patch_len = patch_len
+        self.max_horizon = max_horizon
+        self.engine = None
+        self.n_homes = 0
         logger.info("PatchTST Forecaster initialized.")
 
-    def forecast_next_hour(self, current_data: dict) -> dict:
+    def _build_engine(self, n_homes: int):
+        n_series = 2 * (n_homes + 1)
+        kwargs = {"context": self.context, "patch_len": self.patch_len, "max_horizon": self.max_horizon}
+        if self.model_path:
+            self.engine = PatchForecastEngine.from_file(self.model_path, n_series, **kwargs)
+        else:
+            self.engine = PatchForecastEngine(n_series, **kwargs)
+        self.n_homes = n_homes
+        self._sample = np.empty(n_series, dtype=np.float32)
+
+    def observe(self, fleet: FleetState):
+        """Pushes the fleet's current load and generation as one sample."""
+        if self.engine is None or len(fleet) != self.n_homes:
+            self._build_engine(len(fleet))
+        n = self.n_homes
+        sample = self._sample
+        sample[:n] = fleet.load_kw
+        sample[n] = fleet.total_load
+        sample[n + 1:2 * n + 1] = fleet.generation_kw
+        sample[2 * n + 1] = fleet.total_generation
+        self.engine.push(sample)
+
+    def forecast(self, horizon: int = None) -> dict:
+        """
+        Per-home and aggregate load/generation `horizon` samples ahead
+        (default: the longest horizon). Per-home values are array views.
         """
-        Uses the provided historical/current data to forecast the next 1 hour of load and generation.
+        if self.engine is None:
+            raise ValueError("No samples observed yet.")
+        horizon = self.max_horizon if horizon is None else horizon
+        values = self.engine.forecast_at(horizon)
+        n = self.n_homes
+        return {
+            "horizon": horizon,
+            "ready": self.engine.ready,
+            "home_load": values[:n],
+            "home_gen": values[n + 1:2 * n + 1],
+            "predicted_load": float(values[n]),
+            "predicted_gen": float(values[2 * n + 1]),
+        }
+
+    def forecast_totals(self, current_data) -> dict:
+        """
+        Fleet load and generation `max_horizon` control ticks ahead (60 s at
+        the default 1 Hz tick).
+        Accepts either a FleetState or a `{home_id: {...}}` dict.
         """
-        # Placeholder for actual model inference
-        # e.g. model.predict(current_data)
         logger.info("Running PatchTST inference on current grid data...")
-        
-        # Simulated forecast: adds a trend to the current data
-        forecasted_load = sum(h.get("load_kw", 0) for h in current_data.values()) * 1.05
-        forecasted_gen = sum(h.get("generation_kw", 0) for h in current_data.values()) * 0.95
-        
+
+        if self.engine is not None and self.engine.ready:
+            result = self.forecast()
+            return {
+                "horizon": result["horizon"],
+                "predicted_load": round(result["predicted_load"], 2),
+                "predicted_gen": round(result["predicted_gen"], 2),
+                "confidence_interval": 0.95
+            }
+
+        # Not enough history yet: simulated forecast that adds a trend to the current data
+        if isinstance(current_data, FleetState):
+            total_load, total_gen = current_data.total_load, current_data.total_generation
+        else:
+            total_load = sum(h.get("load_kw", 0) for h in current_data.values())
+            total_gen = sum(h.get("generation_kw", 0) for h in current_data.values())
+        forecasted_load = total_load * 1.05
+        forecasted_gen = total_gen * 0.95
+
         return {
+            "horizon": self.max_horizon,
             "predicted_load": round(forecasted_load, 2),
             "predicted_gen": round(forecasted_gen, 2),
             "confidence_interval": 0.95
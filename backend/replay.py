@@ -0,0 +1,324 @@
+import logging
+import time
+
+import numpy as np
+
+from backend.attack_detector import SyncSpikeDetector
+from backend.fleet_state import COLUMNS
+from backend.home_simulator import ACTION_FIELDS, STATE_FIELDS, init_homes, step_homes
+from backend.swing_equation import BatchSwingEquation
+
+logger = logging.getLogger(__name__)
+
+# Neutral `[ev, ac, battery]` action: EVs charge freely, no curtailment, battery idle
+NEUTRAL_ACTION = (1.0, 0.0, 0.0)
+
+
+class ReplayTrace:
+    """
+    Recorded fleet telemetry to replay: `t` (T,) epoch seconds and (T, N)
+    `load`, `generation` and optionally `soc` (0-1) arrays, plus the
+    recorded grid `frequency` (T,) when known.
+
+    Each of the N columns stands for `weight` homes. A full telemetry
+    trace has one column per home (weight 1); an aggregate trace rebuilt
+    from grid snapshots has a single column for the whole fleet.
+    """
+
+    def __init__(self, t, load, generation, soc=None, frequency=None, weight: float = 1.0):
+        self.t = np.asarray(t, dtype=np.float64)
+        self.load = np.atleast_2d(np.asarray(load, dtype=np.float64).T).T
+        self.generation = np.atleast_2d(np.asarray(generation, dtype=np.float64).T).T
+        if self.load.shape != self.generation.shape or self.load.shape[0] != len(self.t):
+            raise ValueError("load and generation must be (T, N) with T matching t")
+        if len(self.t) < 2:
+            raise ValueError("A replay trace needs at least two samples.")
+        self.soc = None if soc is None else np.atleast_2d(np.asarray(soc, dtype=np.float64).T).T
+        self.frequency = None if frequency is None else np.asarray(frequency, dtype=np.float64)
+        self.weight = float(weight)
+
+    def __len__(self):
+        return len(self.t)
+
+    @property
+    def n_columns(self) -> int:
+        return self.load.shape[1]
+
+    @property
+    def interval(self) -> float:
+        """Median sample spacing in seconds; each sample is held for this long."""
+        return float(np.median(np.diff(self.t)))
+
+    @classmethod
+    def from_snapshots(cls, docs, interval: float = 1.0):
+        """
+        Aggregate trace from `grid_snapshots` documents, oldest first. Missing
+        timestamps (older documents) are spaced `interval` seconds apart.
+        """
+        docs = list(docs)
+        if not docs:
+            raise ValueError("No snapshots to replay.")
+        columns = {}
+        for field in ("total_load", "total_generation", "frequency"):
+            try:
+                columns[field] = np.array([d[field] for d in docs], dtype=np.float64)
+            except KeyError:
+                raise ValueError(f"Snapshots without '{field}' cannot be replayed.") from None
+            except (TypeError, ValueError):
+                raise ValueError(f"Snapshot '{field}' values must be numeric.") from None
+        stamps = [d.get("timestamp") for d in docs]
+        t = np.arange(len(docs)) * interval if any(s is None for s in stamps) else stamps
+        n_homes = max((d.get("n_homes") or len(d.get("actions") or ()) for d in docs), default=0) or 1
+        return cls(
+            t,
+            columns["total_load"],
+            columns["total_generation"],
+            frequency=columns["frequency"],
+            weight=n_homes,
+        )
+
+    @classmethod
+    def from_history(cls, history, seconds: float = None):
+        """Aggregate trace from the raw ring of a GridHistory, optionally only the last `seconds`."""
+        store = history.aggregate
+        if store.raw_count < 2:
+            raise ValueError("Not enough history recorded yet.")
+        rows = (store.raw_head - store.raw_count + np.arange(store.raw_count)) % store.raw_capacity
+        t = store.raw_t[rows]
+        if seconds is not None:
+            rows = rows[t >= t[-1] - seconds]
+            t = store.raw_t[rows]
+        frequency, load, generation = store.raw_v[rows].T
+        return cls(t, load, generation, frequency=frequency, weight=len(history.fleet))
+
+    @classmethod
+    def synthetic(cls, n_homes: int = 100, seconds: float = 86400.0, interval: float = 1.0, seed: int = 0,
+                  t0: float = 0.0):
+        """Per-home trace generated by the home simulator models with neutral actions (e.g. a day at 1 Hz)."""
+        rng = np.random.default_rng(seed)
+        fleet = np.zeros((len(COLUMNS), n_homes))
+        state = np.zeros((len(STATE_FIELDS), n_homes))
+        control = np.zeros((len(ACTION_FIELDS), n_homes))
+        init_homes(fleet, state, control, rng)
+
+        n_steps = int(seconds / interval)
+        t = t0 + interval * np.arange(1, n_steps + 1)
+        load = np.empty((n_steps, n_homes))
+        generation = np.empty((n_steps, n_homes))
+        soc = np.empty((n_steps, n_homes))
+        for k in range(n_steps):
+            step_homes(fleet, state, control, t[k], interval, rng)
+            load[k], generation[k], soc[k] = fleet
+        return cls(t, load, generation, soc=soc * 0.01)
+
+    def save(self, path: str):
+        arrays = {"t": self.t, "load": self.load, "generation": self.generation, "weight": self.weight}
+        if self.soc is not None:
+            arrays["soc"] = self.soc
+        if self.frequency is not None:
+            arrays["frequency"] = self.frequency
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            return cls(
+                data["t"], data["load"], data["generation"],
+                soc=data["soc"] if "soc" in data else None,
+                frequency=data["frequency"] if "frequency" in data else None,
+                weight=float(data["weight"]) if "weight" in data else 1.0,
+            )
+
+
+class ReplayEngine:
+    """
+    Offline, faster-than-real-time replay of a ReplayTrace through the
+    swing equation, policies and attack detector, with no sleeping.
+
+    Every variant is a dict `{"name", "inertia", "damping", "policy"}`. The
+    physics of all variants advance together as one BatchSwingEquation.
+    Variants that share a policy object get one batched get_actions() call
+    per sample on a (variants x columns, 4) observation matrix. A policy is
+    anything with the controllers' get_actions() signature; None replays
+    the recorded trace open-loop.
+
+    The recorded load is the baseline. A policy's actions move it through a
+    linear flexibility model, in kW per home: pausing EVs sheds `ev_kw`,
+    AC curtailment sheds `ac_kw`, and the battery discharges (+) or charges
+    (-) up to `battery_kw` within `battery_kwh`. Each sample's power
+    mismatch is held for the trace interval. The default exponential
+    integrator is exact for a held mismatch, so one substep per sample is
+    enough.
+
+    Detection runs once, on the recorded per-home load, since that is the
+    telemetry the live detector saw; aggregate traces skip it.
+    """
+
+    def __init__(self, trace: ReplayTrace, variants: list, f_nominal: float = 50.0, method: str = "exp",
+                 substeps: int = 1, limits=(49.8, 50.2), ev_kw: float = 1.0, ac_kw: float = 0.8,
+                 battery_kw: float = 3.0, battery_kwh: float = 10.0, power_scale: float = 1.0,
+                 detect: bool = True):
+        if not variants:
+            raise ValueError("At least one variant is required.")
+        self.trace = trace
+        self.variants = [dict(v) for v in variants]
+        for i, v in enumerate(self.variants):
+            v.setdefault("name", f"variant_{i}")
+        self.f_nominal = f_nominal
+        self.method = method
+        self.substeps = substeps
+        self.limits = limits
+        self.flex = np.array([ev_kw, ac_kw, battery_kw]) * trace.weight
+        self.battery_kwh = battery_kwh * trace.weight
+        self.power_scale = power_scale
+        self.detect = detect and trace.n_columns > 1
+
+        # Variants sharing a policy object are laid out contiguously, so each
+        # group drives a slice of the batch; results come back in input order
+        rank = {}
+        for v in self.variants:
+            rank.setdefault(id(v.get("policy")), len(rank))
+        self.order = sorted(range(len(self.variants)), key=lambda i: rank[id(self.variants[i].get("policy"))])
+        self.variants = [self.variants[i] for i in self.order]
+        self.groups = []
+        for i, v in enumerate(self.variants):
+            policy = v.get("policy")
+            if policy is None:
+                continue
+            if self.groups and self.groups[-1][0] is policy:
+                self.groups[-1][1] = slice(self.groups[-1][1].start, i + 1)
+            else:
+                self.groups.append([policy, slice(i, i + 1)])
+
+    def run(self) -> dict:
+        trace = self.trace
+        n_variants, n_cols, n_steps = len(self.variants), trace.n_columns, len(trace)
+        dt = trace.interval
+        swing = BatchSwingEquation(
+            n_variants, f_nominal=self.f_nominal, dt=dt, substeps=self.substeps, method=self.method,
+            inertia=[v.get("inertia", 0.1) for v in self.variants],
+            damping=[v.get("damping", 0.05) for v in self.variants],
+        )
+        if trace.frequency is not None:
+            swing.reset(trace.frequency[0])
+
+        actions = np.empty((n_variants, n_cols, 3))
+        actions[:] = NEUTRAL_ACTION
+        response = np.zeros((n_variants, n_cols))  # kW added to the recorded load
+        soc = np.empty((n_variants, n_cols))
+        soc[:] = trace.soc[0] if trace.soc is not None else 0.5
+        obs = np.empty((n_variants, n_cols, 4), dtype=np.float32)
+        ev_kw, ac_kw, battery_kw = self.flex
+        energy_limit = self.battery_kwh * 3600.0 / dt
+        soc_per_kw = dt / 3600.0 / self.battery_kwh
+        battery = np.zeros((n_variants, n_cols))
+        shed = np.zeros((n_variants, n_cols))
+        # Recorded mismatch of every sample up front; the loop only adds the policy response
+        net_kw = trace.generation.sum(axis=1) - trace.load.sum(axis=1)
+        per_home_gen = (trace.generation / trace.weight).astype(np.float32)
+
+        deviation = np.empty((n_steps, n_variants), dtype=np.float32)
+        shed_kwh = np.zeros(n_variants)
+        throughput_kwh = np.zeros(n_variants)
+        detector = SyncSpikeDetector(n_cols) if self.detect else None
+        alerts = []
+
+        start = time.perf_counter()
+        for k in range(n_steps):
+            if self.groups:
+                obs[:, :, 0] = swing.frequency[:, None]
+                np.add(trace.load[k], response, out=obs[:, :, 1], casting="unsafe")
+                obs[:, :, 1] *= 1.0 / trace.weight
+                obs[:, :, 2] = per_home_gen[k]
+                obs[:, :, 3] = soc
+                for policy, rows in self.groups:
+                    batch = obs[rows].reshape(-1, 4)
+                    actions[rows] = np.asarray(policy.get_actions(batch)).reshape(-1, n_cols, 3)
+
+                # Battery power, positive while discharging, limited by stored energy and headroom
+                np.multiply(actions[:, :, 2], battery_kw, out=battery)
+                np.minimum(battery, soc * energy_limit, out=battery)
+                np.maximum(battery, (soc - 1.0) * energy_limit, out=battery)
+                soc -= battery * soc_per_kw
+                # Actions are in range for the bundled controllers; out-of-range ones are not clipped here
+                np.multiply(1.0 - actions[:, :, 0], ev_kw, out=shed)
+                shed += actions[:, :, 1] * ac_kw
+                np.add(shed, battery, out=response)
+                np.negative(response, out=response)
+                shed_kwh += shed.sum(axis=1)
+                throughput_kwh += np.abs(battery).sum(axis=1)
+
+            freq = swing.step((net_kw[k] - response.sum(axis=1)) * self.power_scale, 0.0)
+            np.subtract(freq, self.f_nominal, out=deviation[k], casting="unsafe")
+
+            if detector is not None:
+                alert = detector.update(trace.load[k], now=trace.t[k])
+                if alert is not None:
+                    alerts.append({key: alert[key] for key in ("timestamp", "sync_score", "correlation", "fraction")})
+        elapsed = time.perf_counter() - start
+        shed_kwh *= dt / 3600.0
+        throughput_kwh *= dt / 3600.0
+
+        variants = []
+        stats = frequency_stats(deviation, dt, self.limits, self.f_nominal)
+        for i, v in enumerate(self.variants):
+            row = {
+                "name": v["name"],
+                "inertia": float(swing.inertia[i]),
+                "damping": float(swing.damping[i]),
+                "policy": type(v["policy"]).__name__ if v.get("policy") is not None else None,
+                **{key: values[i] for key, values in stats.items()},
+                "shed_kwh": round(float(shed_kwh[i]), 3),
+                "battery_throughput_kwh": round(float(throughput_kwh[i]), 3),
+            }
+            if trace.frequency is not None:
+                recorded = trace.frequency - self.f_nominal
+                row["rmse_vs_recorded_hz"] = round(float(np.sqrt(np.mean((deviation[:, i] - recorded) ** 2))), 6)
+            variants.append(row)
+
+        result = {
+            "samples": n_steps,
+            "interval_s": dt,
+            "simulated_s": n_steps * dt,
+            "elapsed_s": round(elapsed, 3),
+            "speedup": round(n_steps * dt / elapsed, 1) if elapsed > 0 else None,
+            "variants": [variants[j] for j in np.argsort(self.order)],
+        }
+        if trace.frequency is not None:
+            recorded = frequency_stats((trace.frequency - self.f_nominal)[:, None], dt, self.limits, self.f_nominal)
+            result["recorded"] = {key: values[0] for key, values in recorded.items()}
+        if detector is not None:
+            result["alerts"] = alerts
+        return result
+
+
+def frequency_stats(deviation, dt: float, limits=(49.8, 50.2), f_nominal: float = 50.0) -> dict:
+    """
+    Per-column frequency-deviation statistics of a (T, K) Δf array: mean,
+    RMS, p95/p99 and max |Δf|, nadir/zenith, time and excursions outside
+    `limits` and the first crossing (seconds, None if never).
+    """
+    deviation = np.asarray(deviation, dtype=np.float64)
+    magnitude = np.abs(deviation)
+    low, high = limits[0] - f_nominal, limits[1] - f_nominal
+    outside = (deviation < low) | (deviation > high)
+    entries = outside[0].astype(np.int64) + (outside[1:] & ~outside[:-1]).sum(axis=0)
+    crossed = outside.any(axis=0)
+    first = np.where(crossed, (outside.argmax(axis=0) + 1) * dt, np.nan)
+    p95, p99 = np.percentile(magnitude, [95, 99], axis=0)
+
+    def rounded(values, digits=6):
+        return [round(float(x), digits) for x in values]
+
+    return {
+        "mean_hz": rounded(deviation.mean(axis=0)),
+        "rms_hz": rounded(np.sqrt((deviation ** 2).mean(axis=0))),
+        "p95_abs_hz": rounded(p95),
+        "p99_abs_hz": rounded(p99),
+        "max_abs_hz": rounded(magnitude.max(axis=0)),
+        "nadir_hz": rounded(f_nominal + deviation.min(axis=0), 4),
+        "zenith_hz": rounded(f_nominal + deviation.max(axis=0), 4),
+        "seconds_outside": rounded(outside.sum(axis=0) * dt, 3),
+        "excursions": [int(x) for x in entries],
+        "first_crossing_s": [None if np.isnan(x) else round(float(x), 3) for x in first],
+    }
@@ -1,38 +1,97 @@
-import ray
-from ray.tune.registry import register_env
-from backend.vpp_env import VPPEnv
-from ray.rllib.algorithms.ppo import PPOConfig
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from backend.vpp_core import cluster_feature
+
+logger = logging.getLogger(__name__)
+
+SHARED_POLICY_ID = "shared_policy"
+
+
 class MARLController:
+    """
+    PPO controller for the home fleet.
+
+    policy_mode="shared" maps every home to one parameter-shared policy and
+    runs the fleet as a single batched (N, obs_dim) forward pass.
+    policy_mode="per_agent" keeps one policy per home, for comparison.
+    n_clusters > 0 appends a cluster-id feature to each observation so the
+    shared policy can still specialise by neighbourhood.
+
+    Construction is cheap: ray/RLlib are only imported, and the PPO
+    algorithm built and restored, by init_model(). Servers call warm_up()
+    to do that on a worker thread and check `ready` before asking for
+    actions.
+    """
+
+    def __init__(self, n_homes=100, policy_mode="shared", n_clusters=0):
 
-    def __init__(self, n_homes=100):
+        if policy_mode not in ("shared", "per_agent"):
+            raise ValueError(f"Unknown policy_mode: {policy_mode}")
 
         self.n_homes = n_homes
+        self.policy_mode = policy_mode
+        self.n_clusters = n_clusters
         self.algo = None   # lazy load later
+        self.policy = None
+        self.config = None
+        self.warmup_seconds = None
+        self.warmup_error = None
+
+        # Precomputed once; appended to every batched observation
+        self._cluster_col = cluster_feature(n_homes, n_clusters)
+        self.obs_dim = 4 if self._cluster_col is None else 5
+
+    @property
+    def ready(self) -> bool:
+        """True once the policy is built and can serve actions without blocking."""
+        return self.algo is not None
+
+    def build_config(self):
+        """Imports RLlib and assembles the PPO config; the slow part of start-up."""
+        from ray.rllib.algorithms.ppo import PPOConfig
+        from ray.tune.registry import register_env
+        from backend.vpp_env import VPPEnv
+
+        n_homes, n_clusters, policy_mode = self.n_homes, self.n_clusters, self.policy_mode
+        env_config = {"n_homes": n_homes, "n_clusters": n_clusters}
 
         register_env(
             "vpp_env",
             lambda config: VPPEnv(config)
         )
 
-        env = VPPEnv({"n_homes":n_homes})
+        env = VPPEnv(env_config)
 
         obs_space = next(iter(env.observation_spaces.values()))
         act_space = next(iter(env.action_spaces.values()))
+        self.obs_dim = obs_space.shape[0]
+
+        if policy_mode == "shared":
+            self.policies = {
+                SHARED_POLICY_ID: (None, obs_space, act_space, {})
+            }
+            policy_mapping_fn = lambda agent_id, *a, **kw: SHARED_POLICY_ID
+        else:
+            self.policies = {
+                f"home_{i}":(
+                    None,
+                    obs_space,
+                    act_space,
+                    {}
+                )
+                for i in range(n_homes)
+            }
+            policy_mapping_fn = lambda agent_id, *a, **kw: agent_id
 
-        self.policies = {
-            f"home_{i}":(
-                None,
-                obs_space,
-                act_space,
-                {}
-            )
-            for i in range(n_homes)
-        }
         self.config = (
             PPOConfig()
         .environment(
             env=VPPEnv,
-            env_config={"n_homes":n_homes}
+            env_config=env_config
         )
         .framework("tf2")
         .env_runners(
@@ -41,32 +100,111 @@ class MARLController:
         )
         .multi_agent(
             policies=self.policies,
-            policy_mapping_fn=lambda agent_id,*a:agent_id
+            policy_mapping_fn=policy_mapping_fn
         )
         )
 
-    # 🔴 THIS WAS MISSING
     def init_model(self):
 
         if self.algo is None:
 
+            if self.config is None:
+                self.build_config()
+
             print("Initializing PPO model...")
 
-            self.algo = self.config.build()
+            algo = self.config.build()
 
             try:
-                self.algo.restore("checkpoints/vpp_policy")
+                algo.restore("checkpoints/vpp_policy")
                 print("Checkpoint loaded")
             except:
                 print("No checkpoint found, running fresh")
 
-    # 🔴 NEW RLlib 2.7 INFERENCE
+            if self.policy_mode == "shared":
+                self.policy = algo.get_policy(SHARED_POLICY_ID)
+            # Published last: `ready` flips only once the policy is usable
+            self.algo = algo
+
+    async def warm_up(self):
+        """
+        Builds and restores the policy on a worker thread, so the event loop
+        keeps serving (with a fallback controller) meanwhile. Failures are
+        logged and kept in `warmup_error`; the controller then stays not ready.
+        """
+        start = time.monotonic()
+        try:
+            await asyncio.to_thread(self.init_model)
+        except Exception as e:
+            self.warmup_error = f"{type(e).__name__}: {e}"
+            logger.error(f"MARL policy warm-up failed: {self.warmup_error}")
+            return
+        self.warmup_seconds = time.monotonic() - start
+        logger.info(f"MARL policy ready after {self.warmup_seconds:.1f} s.")
+
+    def status(self) -> dict:
+        return {
+            "policy_mode": self.policy_mode,
+            "ready": self.ready,
+            "warmup_seconds": self.warmup_seconds,
+            "warmup_error": self.warmup_error,
+        }
+
     def get_actions(self, observations):
+        """
+        Computes actions for the fleet.
+
+        An (N, obs_dim) array returns an (N, act_dim) array aligned to the
+        fleet row index. A `{home_id: obs}` dict returns a dict of actions.
+        """
 
         self.init_model()
 
-        result = self.algo.compute_actions(
-            observations
-        )
+        if self.policy_mode == "per_agent":
+            if not isinstance(observations, dict):
+                raise TypeError("per_agent mode expects a {home_id: obs} dict.")
+            # One forward pass per home through its own policy
+            return {
+                home_id: self.algo.compute_single_action(obs, policy_id=home_id, explore=False)
+                for home_id, obs in observations.items()
+            }
+
+        if isinstance(observations, dict):
+            home_ids = list(observations.keys())
+            actions = self.compute_batch(np.asarray(list(observations.values()), dtype=np.float32))
+            return dict(zip(home_ids, actions))
+
+        return self.compute_batch(observations)
+
+    def compute_batch(self, obs_batch):
+        """Single forward pass of the shared policy over an (N, obs_dim) batch."""
+
+        self.init_model()
+
+        obs_batch = self._with_cluster_ids(np.asarray(obs_batch, dtype=np.float32))
+        actions, _, _ = self.policy.compute_actions(obs_batch, explore=False)
+
+        # Policy.compute_actions returns raw outputs; map them into the
+        # action Box as algo.compute_single_action does for per_agent mode.
+        # No config means a stand-in policy (benchmarks) that is already in range.
+        config = self.config
+        if config is not None and config.normalize_actions:
+            from ray.rllib.utils.spaces.space_utils import unsquash_action
+            actions = unsquash_action(actions, self.policy.action_space_struct)
+        elif config is not None and config.clip_actions:
+            from ray.rllib.utils.spaces.space_utils import clip_action
+            actions = clip_action(actions, self.policy.action_space_struct)
+
+        return np.asarray(actions)
+
+    def _with_cluster_ids(self, obs_batch):
+
+        if self._cluster_col is None or obs_batch.shape[1] == self.obs_dim:
+            return obs_batch
+
+        if obs_batch.shape[0] != self.n_homes:
+            raise ValueError(
+                f"Expected {self.n_homes} rows to attach cluster ids, got {obs_batch.shape[0]}"
+            )
 
-        return result[0]
\ No newline at end of file
+        return np.concatenate([obs_batch, self._cluster_col[:, None]], axis=1)
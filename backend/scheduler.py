@@ -0,0 +1,164 @@
+import asyncio
+import inspect
+import logging
+import time
+
+from backend.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    One periodically executed step of the control loop.
+
+    `fn` may be a plain function or a coroutine function. A coroutine that
+    exceeds `budget` seconds is cancelled; a plain function runs inline on the
+    event loop and cannot be pre-empted, so it is only measured. Either way the overrun is counted and,
+    if given, `degrade` is called in its place on the next deadline so a slow
+    stage sheds work instead of piling up.
+
+    Every run's duration goes into a LatencyHistogram; when a profiler is
+    attached, it is told about every run so it can keep the slow ones.
+    """
+
+    def __init__(self, name: str, fn, rate_hz: float, budget: float = None, degrade=None):
+        if rate_hz <= 0:
+            raise ValueError(f"Stage {name} needs a positive rate, got {rate_hz}")
+        self.name = name
+        self.fn = fn
+        self.period = 1.0 / rate_hz
+        self.budget = budget if budget is not None else self.period
+        self.degrade = degrade
+
+        self.runs = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.errors = 0
+        self.degraded_runs = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.latency = LatencyHistogram()
+        self.profiler = None
+        self._degraded = False
+        self._started = None
+
+    def remaining(self) -> float:
+        """Seconds left in the current run's budget; the full budget when idle."""
+        if self._started is None:
+            return self.budget
+        return max(0.0, self.budget - (time.monotonic() - self._started))
+
+    async def run_once(self):
+        """Runs the stage (or its degraded fallback) once and records timing."""
+        fn = self.degrade if self._degraded and self.degrade else self.fn
+        if fn is self.degrade:
+            self.degraded_runs += 1
+
+        start = self._started = time.monotonic()
+        overran = False
+        try:
+            if inspect.iscoroutinefunction(fn):
+                await asyncio.wait_for(fn(), timeout=self.budget)
+            else:
+                fn()
+        except asyncio.TimeoutError:
+            overran = True
+            logger.warning(f"Stage {self.name} exceeded its {self.budget * 1000:.0f} ms budget and was cancelled.")
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error in stage {self.name}: {e}", exc_info=True)
+
+        duration = time.monotonic() - start
+        self._started = None
+        overran = overran or duration > self.budget
+        if overran:
+            self.overruns += 1
+
+        self.runs += 1
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+        self.latency.record(duration)
+        if self.profiler is not None:
+            self.profiler.observe(self.name, start, duration)
+        self._degraded = overran
+
+    def stats(self) -> dict:
+        return {
+            "rate_hz": round(1.0 / self.period, 3),
+            "budget_ms": round(self.budget * 1000, 3),
+            "runs": self.runs,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "degraded_runs": self.degraded_runs,
+            "last_ms": round(self.last_duration * 1000, 3),
+            "max_ms": round(self.max_duration * 1000, 3),
+            "p50_ms": round(self.latency.percentile(0.50) * 1000, 3),
+            "p99_ms": round(self.latency.percentile(0.99) * 1000, 3),
+        }
+
+
+class MultiRateScheduler:
+    """
+    Runs each Stage on its own task at its own rate against a monotonic clock.
+
+    Deadlines advance by whole periods from the start time, so work time does
+    not accumulate as drift. A stage that finishes late runs its next tick
+    immediately; any further deadlines it missed are counted as skipped
+    rather than run back-to-back to catch up.
+    """
+
+    def __init__(self, stages=None, clock=time.monotonic, profiler=None):
+        self.stages = {}
+        self.clock = clock
+        self.profiler = profiler
+        self._tasks = []
+        for stage in stages or []:
+            self.add(stage)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def add(self, stage: Stage):
+        if stage.name in self.stages:
+            raise ValueError(f"Duplicate stage name: {stage.name}")
+        stage.profiler = self.profiler
+        self.stages[stage.name] = stage
+        return stage
+
+    def start(self):
+        """Spawns one task per stage on the running event loop."""
+        if self._tasks:
+            return self._tasks
+        start = self.clock()
+        self._tasks = [
+            asyncio.create_task(self._run_stage(stage, start), name=f"stage:{stage.name}")
+            for stage in self.stages.values()
+        ]
+        return self._tasks
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {name: stage.stats() for name, stage in self.stages.items()}
+
+    async def _run_stage(self, stage: Stage, start: float):
+        next_deadline = start
+        while True:
+            await stage.run_once()
+
+            next_deadline += stage.period
+            now = self.clock()
+            if now - next_deadline >= stage.period:
+                # Late by more than a period: drop the backlog, keep the phase
+                missed = int((now - next_deadline) // stage.period)
+                stage.skipped += missed
+                next_deadline += missed * stage.period
+
+            await asyncio.sleep(max(0.0, next_deadline - self.clock()))
@@ -1,6 +1,120 @@
 import numpy as np
 
-class SwingEquation:
+F_MIN, F_MAX = 45.0, 55.0
+
+
+class BatchSwingEquation:
+    """
+    Advances many independent swing-equation scenarios at once:
+    M * d(Δf)/dt + D * Δf = ΔP, one (M, D, f) triple per scenario.
+
+    `inertia`, `damping` and `f0` may be scalars or arrays of length
+    `n_scenarios`. Each call to step() covers `dt` seconds in `substeps`
+    equal substeps, holding ΔP constant over the step, using one of:
+
+    - "euler": explicit Euler (the original scalar model)
+    - "rk4": classic fourth-order Runge-Kutta
+    - "exp": exact exponential integrator for constant ΔP; unconditionally
+      stable, so it is the choice for stiff low-inertia scenarios
+    """
+
+    METHODS = ("euler", "rk4", "exp")
+
+    def __init__(self, n_scenarios=1, f_nominal=50.0, inertia=0.1, damping=0.05, dt=0.1,
+                 substeps=1, method="euler", f0=None):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown integration method: {method}")
+        if substeps < 1:
+            raise ValueError("substeps must be >= 1")
+        self.n_scenarios = n_scenarios
+        self.f_nominal = f_nominal
+        self.inertia = np.broadcast_to(np.asarray(inertia, dtype=np.float64), (n_scenarios,)).copy()
+        self.damping = np.broadcast_to(np.asarray(damping, dtype=np.float64), (n_scenarios,)).copy()
+        self.dt = dt
+        self.substeps = substeps
+        self.method = method
+        self.frequency = np.full(n_scenarios, f_nominal, dtype=np.float64)
+        if f0 is not None:
+            self.frequency[:] = f0
+
+    def _derivative(self, delta_f, delta_p):
+        # d(Δf)/dt = (ΔP - D * Δf) / M
+        return (delta_p - self.damping * delta_f) / self.inertia
+
+    def _advance(self, delta_f, delta_p, h):
+        if self.method == "euler":
+            return delta_f + self._derivative(delta_f, delta_p) * h
+        if self.method == "rk4":
+            k1 = self._derivative(delta_f, delta_p)
+            k2 = self._derivative(delta_f + 0.5 * h * k1, delta_p)
+            k3 = self._derivative(delta_f + 0.5 * h * k2, delta_p)
+            k4 = self._derivative(delta_f + h * k3, delta_p)
+            return delta_f + h / 6.0 * (k1 + 2 * k2 + 2 * k3 + k4)
+        # Exact solution: Δf(h) = Δf_ss + (Δf - Δf_ss) * exp(-D h / M), Δf_ss = ΔP / D.
+        # Written with expm1 so that D -> 0 degrades gracefully to ΔP * h / M.
+        rate = self.damping / self.inertia
+        decay = -np.expm1(-rate * h)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gain = np.where(rate > 0, decay / np.where(rate > 0, rate, 1.0), h)
+        return delta_f + (delta_p / self.inertia - rate * delta_f) * gain
+
+    def step(self, power_generation, power_load):
+        """
+        Advances every scenario by `dt`. Powers broadcast against the
+        scenario axis. Returns the (n_scenarios,) frequency array (a view;
+        copy it to keep it).
+        """
+        delta_p = np.asarray(power_generation, dtype=np.float64) - np.asarray(power_load, dtype=np.float64)
+        delta_f = self.frequency - self.f_nominal
+        h = self.dt / self.substeps
+        for _ in range(self.substeps):
+            delta_f = self._advance(delta_f, delta_p, h)
+        # Bounded slightly to avoid extreme numerical issues
+        np.clip(self.f_nominal + delta_f, F_MIN, F_MAX, out=self.frequency)
+        return self.frequency
+
+    def simulate(self, mismatch, record=True, limits=(49.5, 50.5)):
+        """
+        Runs a ΔP trace of shape (T,) (shared) or (T, n_scenarios) from the
+        current state.
+
+        Returns a dict with `trajectory` (T, n_scenarios) when `record` is set,
+        `final` frequencies, and `first_crossing` (seconds after start, NaN if
+        never) of the `limits` band, plus `nadir` and `zenith` per scenario.
+        """
+        mismatch = np.asarray(mismatch, dtype=np.float64)
+        n_steps = mismatch.shape[0]
+        low, high = limits
+
+        trajectory = np.empty((n_steps, self.n_scenarios)) if record else None
+        first_crossing = np.full(self.n_scenarios, np.nan)
+        nadir = self.frequency.copy()
+        zenith = self.frequency.copy()
+
+        for k in range(n_steps):
+            freq = self.step(mismatch[k], 0.0)
+            if record:
+                trajectory[k] = freq
+            np.minimum(nadir, freq, out=nadir)
+            np.maximum(zenith, freq, out=zenith)
+            newly = np.isnan(first_crossing) & ((freq < low) | (freq > high))
+            first_crossing[newly] = (k + 1) * self.dt
+
+        return {
+            "trajectory": trajectory,
+            "final": self.frequency.copy(),
+            "first_crossing": first_crossing,
+            "nadir": nadir,
+            "zenith": zenith,
+        }
+
+    def reset(self, f0=None):
+        """Resets every scenario to nominal (or `f0`)."""
+        self.frequency[:] = self.f_nominal if f0 is None else f0
+        return self.frequency
+
+
+class SwingEquation(BatchSwingEquation):
     """
     Simulates the grid frequency using the Swing Equation:
     M * d(Δf)/dt + D * Δf = ΔP
@@ -10,37 +124,34 @@ class SwingEquation:
     - D is the load damping coefficient
     - Δf is the frequency deviation from nominal (f - f_nominal)
     - ΔP is the power mismatch (P_generation - P_load)
+
+    This is the single-scenario case of BatchSwingEquation; by default it
+    keeps the original one-step explicit Euler update.
     """
 
-    def __init__(self, f_nominal=50.0, inertia=0.1, damping=0.05, dt=0.1):
-        self.f_nominal = f_nominal
-        self.inertia = inertia
-        self.damping = damping
-        self.dt = dt
-        self.current_frequency = f_nominal
+    def __init__(self, f_nominal=50.0, inertia=0.1, damping=0.05, dt=0.1, substeps=1, method="euler"):
+        super().__init__(
+            n_scenarios=1, f_nominal=f_nominal, inertia=inertia, damping=damping,
+            dt=dt, substeps=substeps, method=method
+        )
+        self.inertia = float(inertia)
+        self.damping = float(damping)
+
+    @property
+    def current_frequency(self) -> float:
+        return float(self.frequency[0])
+
+    @current_frequency.setter
+    def current_frequency(self, value: float):
+        self.frequency[0] = value
 
     def step(self, power_generation: float, power_load: float) -> float:
         """
         Calculates the new grid frequency after one time step based on the given power generation and load.
         """
-        # Calculate power mismatch (ΔP)
-        delta_p = power_generation - power_load
-        
-        # Calculate frequency deviation (Δf)
-        delta_f = self.current_frequency - self.f_nominal
-        
-        # Swing equation: d(Δf)/dt = (ΔP - D * Δf) / M
-        rate_of_change = (delta_p - self.damping * delta_f) / self.inertia
-        
-        # Update current frequency using Euler integration: f_new = f_current + d(Δf)/dt * dt
-        self.current_frequency += rate_of_change * self.dt
-        
-        # Return the new frequency, bounded slightly to avoid extreme numerical issues
-        self.current_frequency = np.clip(self.current_frequency, 45.0, 55.0)
-        
-        return float(self.current_frequency)
+        return float(super().step(power_generation, power_load)[0])
 
     def reset(self):
         """Resets the frequency to nominal."""
-        self.current_frequency = self.f_nominal
-        return float(self.current_frequency)
+        super().reset()
+        return self.current_frequency
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+from backend.fleet_state import FleetState
+from backend.wire_format import KIND_TELEMETRY, FrameError, decode_frame
+
+logger = logging.getLogger(__name__)
+
+INGEST_CAPACITY = int(os.getenv("INGEST_CAPACITY", 262144))
+INGEST_BATCH_WINDOW = float(os.getenv("INGEST_BATCH_WINDOW", 0.01))
+TELEMETRY_STALE_AFTER = float(os.getenv("TELEMETRY_STALE_AFTER", 1.0))
+
+
+class TelemetryRingBuffer:
+    """
+    Bounded single-producer / single-consumer buffer of raw MQTT payloads.
+
+    The paho network thread only appends `(arrival, topic, payload)` tuples;
+    deque append/popleft are atomic in CPython, so no lock is taken on the
+    hot path. When full, the oldest payload is overwritten and counted as
+    dropped. The consumer is woken at most once per batch: the producer
+    schedules a wake-up on the event loop only when none is pending.
+    """
+
+    def __init__(self, capacity: int = INGEST_CAPACITY):
+        self.capacity = capacity
+        self._items = deque(maxlen=capacity)
+        self.received = 0
+        self.dropped = 0
+        self._loop = None
+        self._wake = None
+        self._wake_pending = False
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Attaches the consumer's event loop; must be called from that loop."""
+        self._loop = loop
+        self._wake = asyncio.Event()
+
+    def push(self, topic: str, payload: bytes):
+        """Producer side; safe to call from the paho network thread."""
+        if len(self._items) >= self.capacity:
+            self.dropped += 1
+        self._items.append((time.monotonic(), topic, payload))
+        self.received += 1
+        if self._loop is not None and not self._wake_pending:
+            self._wake_pending = True
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def drain(self, max_items: int = None) -> list:
+        """Consumer side; pops up to `max_items` payloads in arrival order."""
+        n = len(self._items) if max_items is None else min(max_items, len(self._items))
+        popleft = self._items.popleft
+        return [popleft() for _ in range(n)]
+
+    async def wait(self, timeout: float = None):
+        self._wake_pending = False
+        if self._items:
+            return
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class TelemetryIngestor:
+    """
+    Applies buffered home telemetry to a FleetState on the asyncio side.
+
+    Each batch is decoded in one pass (binary frames on `.../batch` topics,
+    legacy JSON on `vpp/telemetry/<home_id>`), coalesced so that only the
+    latest sample per home is kept, and written to the fleet with a single
+    vectorized update. Per-home last-seen times drive staleness tracking.
+    """
+
+    def __init__(self, fleet: FleetState, buffer: TelemetryRingBuffer = None,
+                 batch_window: float = INGEST_BATCH_WINDOW, max_batch: int = 65536,
+                 stale_after: float = TELEMETRY_STALE_AFTER):
+        self.fleet = fleet
+        self.buffer = buffer or TelemetryRingBuffer()
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.stale_after = stale_after
+
+        self.last_seen = np.full(len(fleet), -np.inf)
+        self.applied = 0
+        self.decode_errors = 0
+        self.unknown_homes = 0
+        self.batches = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        # Sequence number of the newest binary telemetry frame applied, echoed in control frames
+        self.last_seq = None
+        self._rate_mark = (time.monotonic(), 0)
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self.buffer.bind(asyncio.get_running_loop())
+            self._task = asyncio.create_task(self._run(), name="telemetry-ingest")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def process_pending(self) -> int:
+        """Drains, decodes, coalesces and applies one batch; returns samples applied."""
+        items = self.buffer.drain(self.max_batch)
+        if not items:
+            return 0
+
+        rows, loads, gens, socs, arrivals = [], [], [], [], []
+        json_rows, json_values, json_arrivals = [], [], []
+        seq = None
+        for arrival, topic, payload in items:
+            try:
+                if topic.endswith("/batch"):
+                    header, records = decode_frame(payload)
+                    if header["kind"] != KIND_TELEMETRY:
+                        continue
+                    rows.append(records["row"])
+                    loads.append(records["load_kw"])
+                    gens.append(records["generation_kw"])
+                    socs.append(records["battery_soc"])
+                    arrivals.append(np.full(len(records), arrival))
+                    seq = header["seq"]
+                else:
+                    row = self.fleet.index.get(topic.rsplit("/", 1)[-1])
+                    if row is None:
+                        self.unknown_homes += 1
+                        continue
+                    state = json.loads(payload)
+                    # Converted here so one bad record is a decode error, not a failed batch
+                    values = (float(state["load_kw"]), float(state["generation_kw"]), float(state["battery_soc"]))
+                    json_rows.append(row)
+                    json_values.append(values)
+                    json_arrivals.append(arrival)
+            except (FrameError, ValueError, KeyError, TypeError):
+                self.decode_errors += 1
+
+        if json_rows:
+            values = np.asarray(json_values, dtype=np.float64).reshape(-1, 3)
+            rows.append(np.asarray(json_rows))
+            loads.append(values[:, 0])
+            gens.append(values[:, 1])
+            socs.append(values[:, 2])
+            arrivals.append(np.asarray(json_arrivals))
+        if not rows:
+            return 0
+
+        rows = np.concatenate(rows).astype(np.int64)
+        arrivals = np.concatenate(arrivals)
+        valid = rows < len(self.fleet)
+        self.unknown_homes += int((~valid).sum())
+
+        # Latest wins: order by arrival, then keep the last sample per home
+        order = np.argsort(arrivals[valid], kind="stable")
+        ordered_rows = rows[valid][order]
+        _, last_rev = np.unique(ordered_rows[::-1], return_index=True)
+        pick = np.flatnonzero(valid)[order][len(ordered_rows) - 1 - last_rev]
+
+        latest_rows = rows[pick]
+        self.fleet.update_rows(
+            latest_rows,
+            load_kw=np.concatenate(loads)[pick],
+            generation_kw=np.concatenate(gens)[pick],
+            battery_soc=np.concatenate(socs)[pick],
+        )
+        now = time.monotonic()
+        self.last_seen[latest_rows] = arrivals[pick]
+
+        self.applied += len(latest_rows)
+        self.batches += 1
+        if seq is not None:
+            self.last_seq = seq
+        self.last_lag = now - items[0][0]
+        self.max_lag = max(self.max_lag, self.last_lag)
+        return len(latest_rows)
+
+    def stale_mask(self, max_age: float = None) -> np.ndarray:
+        """Boolean mask of homes with no telemetry within `max_age` seconds."""
+        max_age = self.stale_after if max_age is None else max_age
+        return time.monotonic() - self.last_seen > max_age
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        mark_t, mark_received = self._rate_mark
+        received = self.buffer.received
+        rate = (received - mark_received) / max(now - mark_t, 1e-9)
+        self._rate_mark = (now, received)
+        return {
+            "ingest_rate_msgs_s": round(rate, 1),
+            "received": received,
+            "dropped": self.buffer.dropped,
+            "buffer_depth": len(self.buffer),
+            "applied": self.applied,
+            "batches": self.batches,
+            "decode_errors": self.decode_errors,
+            "unknown_homes": self.unknown_homes,
+            "stale_homes": int(self.stale_mask().sum()),
+            "last_lag_ms": round(self.last_lag * 1000, 3),
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            "last_seq": self.last_seq,
+        }
+
+    async def _run(self):
+        while True:
+            await self.buffer.wait(timeout=1.0)
+            if self.batch_window:
+                # Let a burst accumulate so it is decoded as one batch
+                await asyncio.sleep(self.batch_window)
+            try:
+                while self.process_pending() and len(self.buffer):
+                    await asyncio.sleep(0)
+            except Exception as e:
+                logger.error(f"Error applying telemetry batch: {e}", exc_info=True)
@@ -0,0 +1,90 @@
+import numpy as np
+
+
+def cluster_feature(n_homes, n_clusters):
+    """
+    Per-home cluster id in [0, 1], assigning contiguous blocks of homes to
+    each of `n_clusters` clusters. Returns None when clustering is off.
+    """
+    if not n_clusters:
+        return None
+    clusters = np.arange(n_homes) * n_clusters // max(n_homes, 1)
+    return (clusters / max(n_clusters - 1, 1)).astype(np.float32)
+
+
+class VPPVectorEnv:
+    """
+    Array-backed core of the VPP environment.
+
+    Steps `n_envs` independent grid instances of `n_homes` homes each in one
+    call. Load, PV and SoC are (n_envs, n_homes) arrays; frequency is one
+    value per instance. Observations come back as an (n_envs, n_homes,
+    obs_dim) float32 batch in the `[freq, load, pv, soc(, cluster)]` layout.
+    VPPEnv wraps a single instance of this behind the MultiAgentEnv dicts.
+    """
+
+    ACT_DIM = 3
+
+    def __init__(self, n_homes=100, n_envs=1, n_clusters=0, H=5, seed=None):
+        self.n_homes = n_homes
+        self.n_envs = n_envs
+        self.H = H
+        self.rng = np.random.default_rng(seed)
+
+        self.cluster_col = cluster_feature(n_homes, n_clusters)
+        self.obs_dim = 4 if self.cluster_col is None else 5
+
+        shape = (n_envs, n_homes)
+        self.freq = np.full(n_envs, 50.0)
+        self.load = np.empty(shape)
+        self.pv = np.empty(shape)
+        self.soc = np.empty(shape)
+
+        self._obs = np.empty(shape + (self.obs_dim,), dtype=np.float32)
+        if self.cluster_col is not None:
+            self._obs[:, :, 4] = self.cluster_col
+
+    def reset(self, seed=None, env_ids=None):
+        """Resets all instances, or only `env_ids`, and returns the observation batch."""
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+
+        rows = slice(None) if env_ids is None else np.asarray(env_ids)
+        n = self.n_envs if env_ids is None else len(rows)
+        shape = (n, self.n_homes)
+
+        self.freq[rows] = 50.0
+        self.load[rows] = self.rng.uniform(3, 6, shape)
+        self.pv[rows] = self.rng.uniform(0, 3, shape)
+        self.soc[rows] = self.rng.uniform(0.4, 0.9, shape)
+
+        return self.observations()
+
+    def step(self, actions):
+        """
+        Applies an (n_envs, n_homes, 3) `[ev, ac, battery]` action batch.
+        Returns `(obs, rewards)` with rewards shaped (n_envs,); every home in
+        an instance shares the grid-frequency reward.
+        """
+        actions = np.asarray(actions).reshape(self.n_envs, self.n_homes, self.ACT_DIM)
+        ev = actions[:, :, 0]
+        ac = actions[:, :, 1]
+        battery = actions[:, :, 2]
+
+        self.load += ev * 0.5 - ac * 0.3
+        self.soc -= battery * 0.01
+
+        Pm = self.pv.sum(axis=1)
+        Pe = self.load.sum(axis=1)
+        self.freq += (Pm - Pe) / (2 * self.H)
+
+        rewards = -(self.freq - 50) ** 2
+        return self.observations(), rewards
+
+    def observations(self):
+        """Fills and returns the reused (n_envs, n_homes, obs_dim) buffer."""
+        self._obs[:, :, 0] = self.freq[:, None]
+        self._obs[:, :, 1] = self.load
+        self._obs[:, :, 2] = self.pv
+        self._obs[:, :, 3] = self.soc
+        return self._obs
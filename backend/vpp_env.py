@@ -2,15 +2,36 @@ from ray.rllib.env.multi_agent_env import MultiAgentEnv
 from gymnasium.spaces import Box
 import numpy as np
 
+from backend.vpp_core import VPPVectorEnv
+
 class VPPEnv(MultiAgentEnv):
+    """
+    MultiAgentEnv dict adapter over a single-instance VPPVectorEnv.
+    Agent `home_i` is row i of the core arrays.
+    """
 
     def __init__(self, config=None):
 
+        config = config or {}
         self.n_homes = config.get("n_homes",100)
+        self.n_clusters = config.get("n_clusters",0)
+
+        self.core = VPPVectorEnv(
+            n_homes=self.n_homes,
+            n_envs=1,
+            n_clusters=self.n_clusters,
+            seed=config.get("seed")
+        )
+
+        low=[49,0,0,0]
+        high=[51,10,5,1]
+        if self.n_clusters:
+            low.append(0)
+            high.append(1)
 
         obs_space = Box(
-            low=np.array([49,0,0,0]),
-            high=np.array([51,10,5,1]),
+            low=np.array(low),
+            high=np.array(high),
             dtype=np.float32
         )
 
@@ -20,88 +41,61 @@ class VPPEnv(MultiAgentEnv):
             dtype=np.float32
         )
 
-        self._agent_ids = {
-            f"home_{i}" for i in range(self.n_homes)
-        }
+        self.agent_ids = [f"home_{i}" for i in range(self.n_homes)]
+        self.agent_index = {agent:i for i,agent in enumerate(self.agent_ids)}
+        self._agent_ids = set(self.agent_ids)
 
         self.observation_spaces = {
             agent:obs_space
-            for agent in self._agent_ids
+            for agent in self.agent_ids
         }
 
         self.action_spaces = {
             agent:act_space
-            for agent in self._agent_ids
+            for agent in self.agent_ids
         }
 
-        self.H=5
-        self.freq=50
+        self._actions = np.zeros((self.n_homes, VPPVectorEnv.ACT_DIM), dtype=np.float32)
+        self._no_terminations = {agent:False for agent in self.agent_ids}
+        self._no_terminations["__all__"] = False
+        self._empty_infos = {agent:{} for agent in self.agent_ids}
 
         self.reset()
 
-    def reset(self,*,seed=None,options=None):
+    @property
+    def freq(self):
+        return float(self.core.freq[0])
 
-        self.freq=50
+    def reset(self,*,seed=None,options=None):
 
-        self.homes={
-            agent:{
-                "load":np.random.uniform(3,6),
-                "pv":np.random.uniform(0,3),
-                "soc":np.random.uniform(0.4,0.9)
-            }
-            for agent in self._agent_ids
-        }
+        obs=self.core.reset(seed=seed)
 
-        obs={
-            agent:np.array([
-                self.freq,
-                h["load"],
-                h["pv"],
-                h["soc"]
-            ],dtype=np.float32)
-            for agent,h in self.homes.items()
-        }
-
-        return obs,{}
+        return self._obs_dict(obs),{}
 
     def step(self,actions):
 
-        total_load=0
-        total_pv=0
-
-        for agent,action in actions.items():
-
-            ev,ac,battery=action
-            home=self.homes[agent]
-
-            home["load"]+=ev*0.5
-            home["load"]-=ac*0.3
-            home["soc"]-=battery*0.01
-
-            total_load+=home["load"]
-            total_pv+=home["pv"]
-
-        Pm=total_pv
-        Pe=total_load
-        self.freq+=(Pm-Pe)/(2*self.H)
-
-        obs,rewards,dones,infos={},{},{},{}
-
-        for agent in self._agent_ids:
-
-            h=self.homes[agent]
-
-            obs[agent]=np.array([
-                self.freq,
-                h["load"],
-                h["pv"],
-                h["soc"]
-            ],dtype=np.float32)
-
-            rewards[agent]=-(self.freq-50)**2
-            dones[agent]=False
-            infos[agent]={}
+        # Agents that did not act this step hold a zero action
+        self._actions.fill(0.0)
+        if len(actions)==self.n_homes:
+            self._actions[:]=[actions[agent] for agent in self.agent_ids]
+        else:
+            for agent,action in actions.items():
+                self._actions[self.agent_index[agent]]=action
+
+        obs,rewards=self.core.step(self._actions[None])
+
+        reward=float(rewards[0])
+        rewards_dict=dict.fromkeys(self.agent_ids,reward)
+
+        return (
+            self._obs_dict(obs),
+            rewards_dict,
+            dict(self._no_terminations),
+            dict(self._no_terminations),
+            dict(self._empty_infos)
+        )
 
-        dones["__all__"]=False
+    def _obs_dict(self,obs):
 
-        return obs,rewards,dones,infos
\ No newline at end of file
+        # Copy once so the per-agent rows do not alias the core's reused buffer
+        return dict(zip(self.agent_ids,obs[0].copy()))
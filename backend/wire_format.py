@@ -0,0 +1,153 @@
+"""
+Compact binary framing for batched telemetry and control over MQTT.
+
+Frame layout (little endian), version 1:
+
+    header   magic "VP" | version u8 | kind u8 | width u8 | seq u32 | timestamp f64 | count u32
+    records  `count` fixed-size records
+
+Telemetry records are `row u32 | load_kw f32 | generation_kw f32 | battery_soc f32`
+(16 bytes). Control records are `row u32` followed by `width` f32 action
+values. `row` is the home's stable fleet index (home_<row>).
+
+When the backend ingests real telemetry, the `seq` of its control frames
+echoes the `seq` of the newest telemetry frame it had applied before
+computing the actions, so a device can time the command round trip.
+"""
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b"VP"
+VERSION = 1
+KIND_TELEMETRY = 1
+KIND_CONTROL = 2
+
+HEADER = struct.Struct("<2sBBBIdI")
+
+TELEMETRY_DTYPE = np.dtype([
+    ("row", "<u4"),
+    ("load_kw", "<f4"),
+    ("generation_kw", "<f4"),
+    ("battery_soc", "<f4"),
+])
+
+# One MQTT message carries at most this many records (~64 KiB of telemetry)
+MAX_RECORDS_PER_FRAME = 4096
+
+
+class FrameError(ValueError):
+    """Raised for payloads that are not a valid frame of a supported version."""
+
+
+def control_dtype(width: int) -> np.dtype:
+    return np.dtype([("row", "<u4"), ("action", "<f4", (width,))])
+
+
+def _frames(kind, width, seq, records, max_records):
+    timestamp = time.time()
+    frames = []
+    for start in range(0, max(len(records), 1), max_records):
+        chunk = records[start:start + max_records]
+        header = HEADER.pack(MAGIC, VERSION, kind, width, seq & 0xFFFFFFFF, timestamp, len(chunk))
+        frames.append(header + chunk.tobytes())
+    return frames
+
+
+def encode_telemetry(rows, load_kw, generation_kw, battery_soc, seq: int = 0,
+                     max_records: int = MAX_RECORDS_PER_FRAME) -> list:
+    """Packs fleet columns into one or more telemetry frames."""
+    records = np.empty(len(rows), dtype=TELEMETRY_DTYPE)
+    records["row"] = rows
+    records["load_kw"] = load_kw
+    records["generation_kw"] = generation_kw
+    records["battery_soc"] = battery_soc
+    return _frames(KIND_TELEMETRY, 0, seq, records, max_records)
+
+
+def encode_control(rows, actions, seq: int = 0, max_records: int = MAX_RECORDS_PER_FRAME) -> list:
+    """Packs an (n,) or (n, width) action array for the given rows into control frames."""
+    actions = np.asarray(actions, dtype=np.float32)
+    if actions.ndim == 1:
+        actions = actions[:, None]
+    records = np.empty(len(rows), dtype=control_dtype(actions.shape[1]))
+    records["row"] = rows
+    records["action"] = actions
+    return _frames(KIND_CONTROL, actions.shape[1], seq, records, max_records)
+
+
+def decode_frame(payload: bytes):
+    """
+    Returns `(header, records)` where records is a structured NumPy array
+    viewing `payload` without copying.
+    """
+    if len(payload) < HEADER.size:
+        raise FrameError("Frame shorter than header.")
+    magic, version, kind, width, seq, timestamp, count = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise FrameError("Bad frame magic.")
+    if version != VERSION:
+        raise FrameError(f"Unsupported frame version {version}.")
+
+    if kind == KIND_TELEMETRY:
+        dtype = TELEMETRY_DTYPE
+    elif kind == KIND_CONTROL:
+        dtype = control_dtype(width)
+    else:
+        raise FrameError(f"Unknown frame kind {kind}.")
+
+    if len(payload) != HEADER.size + count * dtype.itemsize:
+        raise FrameError("Frame length does not match record count.")
+
+    records = np.frombuffer(payload, dtype=dtype, count=count, offset=HEADER.size)
+    header = {"version": version, "kind": kind, "width": width, "seq": seq, "timestamp": timestamp, "count": count}
+    return header, records
+
+
+class ControlDeltaEncoder:
+    """
+    Encodes only the homes whose action changed since the last tick.
+
+    Every `keyframe_every` ticks (0 disables) the full fleet is sent so that
+    homes which missed a frame converge again.
+    """
+
+    def __init__(self, n_homes: int, tolerance: float = 1e-3, keyframe_every: int = 30):
+        self.n_homes = n_homes
+        self.tolerance = tolerance
+        self.keyframe_every = keyframe_every
+        self.last = None
+        self.seq = 0
+
+    def encode(self, actions, max_records: int = MAX_RECORDS_PER_FRAME, seq: int = None) -> list:
+        """
+        Returns the frames to publish for this tick; empty if nothing changed.
+        `seq` overrides the header sequence number (default: the tick count).
+        """
+        actions = np.asarray(actions, dtype=np.float32)
+        if actions.ndim == 1:
+            actions = actions[:, None]
+
+        keyframe = (
+            self.last is None
+            or self.last.shape != actions.shape
+            or (self.keyframe_every and self.seq % self.keyframe_every == 0)
+        )
+        if keyframe:
+            rows = np.arange(self.n_homes, dtype=np.uint32)
+        else:
+            changed = np.abs(actions - self.last).max(axis=1) > self.tolerance
+            rows = np.flatnonzero(changed).astype(np.uint32)
+
+        # Only rows actually sent move the reference, so sub-tolerance drift
+        # still gets published once it accumulates
+        if keyframe:
+            self.last = actions.copy()
+        else:
+            self.last[rows] = actions[rows]
+        seq = self.seq if seq is None else seq
+        self.seq += 1
+        if len(rows) == 0:
+            return []
+        return encode_control(rows, actions[rows], seq=seq, max_records=max_records)
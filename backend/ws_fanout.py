@@ -0,0 +1,266 @@
+import asyncio
+import json
+import logging
+import math
+import time
+from collections import deque
+
+import numpy as np
+from fastapi import WebSocket
+
+from backend.fleet_state import COLUMNS
+
+logger = logging.getLogger(__name__)
+
+
+class FleetDeltaEncoder:
+    """
+    Turns successive FleetState snapshots into FLEET_UPDATE frames.
+
+    Values are quantized to 0.01 so that noise below display precision does
+    not count as a change. Each publish computes the delta against the
+    previous snapshot once; the full keyframe is only serialized when some
+    subscriber actually needs it, and then cached for that sequence number.
+    """
+
+    def __init__(self, decimals: int = 2):
+        self.decimals = decimals
+        self.seq = 0
+        self.home_ids = None
+        self.values = None
+        self.delta_text = None
+        self._keyframe_text = None
+
+    def publish(self, fleet):
+        values = np.round(fleet.data, self.decimals)
+        if self.values is None or values.shape != self.values.shape:
+            rows = None
+            self.home_ids = list(fleet.home_ids)
+        else:
+            rows = np.flatnonzero((values != self.values).any(axis=0))
+
+        self.seq += 1
+        self.values = values
+        self._keyframe_text = None
+        if rows is None:
+            self.delta_text = None
+        else:
+            frame = {"type": "FLEET_UPDATE", "seq": self.seq, "keyframe": False, "rows": rows.tolist()}
+            for i, name in enumerate(COLUMNS):
+                frame[name] = values[i, rows].tolist()
+            self.delta_text = json.dumps(frame)
+
+    def keyframe_text(self) -> str:
+        if self._keyframe_text is None:
+            frame = {"type": "FLEET_UPDATE", "seq": self.seq, "keyframe": True, "home_ids": self.home_ids}
+            for i, name in enumerate(COLUMNS):
+                frame[name] = self.values[i].tolist()
+            self._keyframe_text = json.dumps(frame)
+        return self._keyframe_text
+
+
+class Subscriber:
+    """One dashboard connection: its pending frames and events, preferences and sender task."""
+
+    def __init__(self, websocket: WebSocket, max_queue: int, rate_hz: float = None, fleet: bool = False,
+                 max_events: int = 256):
+        self.websocket = websocket
+        self.frames = deque(maxlen=max_queue)
+        self.events = deque()
+        self.max_events = max_events
+        self.wake = asyncio.Event()
+        self.rate_hz = None
+        self.fleet = fleet
+        self.fleet_seq = 0
+        self.last_send = 0.0
+        self.task = None
+
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.events_dropped = 0
+        self.configure(rate_hz=rate_hz)
+
+    def configure(self, rate_hz=None, fleet=None):
+        """Raises ValueError/TypeError for a bad rate, before changing anything."""
+        if rate_hz is not None:
+            rate_hz = float(rate_hz)
+            if not math.isfinite(rate_hz) or rate_hz < 0:
+                raise ValueError(f"rate_hz must be a non-negative number, got {rate_hz}")
+            self.rate_hz = rate_hz or None
+        if fleet is not None:
+            self.fleet = bool(fleet)
+            self.fleet_seq = 0  # (re)subscribing always starts from a keyframe
+
+    def offer(self, text: str):
+        if len(self.frames) == self.frames.maxlen:
+            self.dropped += 1
+        self.frames.append(text)
+        self.wake.set()
+
+    def offer_event(self, text: str):
+        # Events are never coalesced or evicted by state frames; past
+        # `max_events` the newest is refused, so the backlog stays bounded
+        if len(self.events) >= self.max_events:
+            self.events_dropped += 1
+            return
+        self.events.append(text)
+        self.wake.set()
+
+    def take_events(self) -> list:
+        events = list(self.events)
+        self.events.clear()
+        return events
+
+
+class ConnectionManager:
+    """
+    Fans broadcast frames out to every connected dashboard without blocking the caller.
+
+    broadcast() serializes a message once and appends the text to each
+    subscriber's bounded queue; a per-client sender task does the actual
+    socket writes. A slow client only ever loses its own oldest frames, and
+    a rate-limited client is sent just the newest frame per interval.
+    Events (alerts, islanding) from broadcast_event() sit in a separate
+    queue per subscriber that is never coalesced, and are sent ahead of
+    state frames without waiting for the rate limit.
+    Clients that subscribed to the fleet stream receive FLEET_UPDATE deltas
+    while they keep up and a fresh keyframe whenever they fall behind.
+    Sockets that error or stall past `send_timeout` are dropped.
+    """
+
+    def __init__(self, max_queue: int = 8, send_timeout: float = 5.0):
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.subscribers = {}
+        self.fleet_encoder = FleetDeltaEncoder()
+
+        self.frames_broadcast = 0
+        self.events_broadcast = 0
+        self.disconnects = 0
+
+    @property
+    def active_connections(self):
+        return list(self.subscribers)
+
+    async def connect(self, websocket: WebSocket, rate_hz: float = None, fleet: bool = False):
+        # Validates the preferences before the socket is accepted
+        subscriber = Subscriber(websocket, self.max_queue, rate_hz=rate_hz, fleet=fleet)
+        await websocket.accept()
+        self.subscribers[websocket] = subscriber
+        subscriber.task = asyncio.create_task(self._sender(subscriber))
+        return subscriber
+
+    def disconnect(self, websocket: WebSocket):
+        subscriber = self.subscribers.pop(websocket, None)
+        if subscriber is None:
+            return
+        self.disconnects += 1
+        if subscriber.task is not None and subscriber.task is not asyncio.current_task():
+            subscriber.task.cancel()
+
+    def configure(self, websocket: WebSocket, rate_hz=None, fleet=None):
+        subscriber = self.subscribers.get(websocket)
+        if subscriber is not None:
+            subscriber.configure(rate_hz=rate_hz, fleet=fleet)
+            subscriber.wake.set()
+
+    async def broadcast(self, message: dict):
+        """Encodes `message` once and queues it for every subscriber; never awaits a socket."""
+        if not self.subscribers:
+            return
+        text = json.dumps(message)
+        self.frames_broadcast += 1
+        for subscriber in self.subscribers.values():
+            subscriber.offer(text)
+
+    async def broadcast_event(self, message: dict):
+        """Like broadcast(), for frames every subscriber must receive even when rate-limited or slow."""
+        if not self.subscribers:
+            return
+        text = json.dumps(message)
+        self.events_broadcast += 1
+        for subscriber in self.subscribers.values():
+            subscriber.offer_event(text)
+
+    def wants_fleet(self) -> bool:
+        return any(s.fleet for s in self.subscribers.values())
+
+    def publish_fleet(self, fleet):
+        """Computes the next fleet delta once and wakes the fleet subscribers."""
+        self.fleet_encoder.publish(fleet)
+        for subscriber in self.subscribers.values():
+            if subscriber.fleet:
+                subscriber.wake.set()
+
+    def stats(self) -> dict:
+        subs = list(self.subscribers.values())
+        return {
+            "subscribers": len(subs),
+            "fleet_subscribers": sum(s.fleet for s in subs),
+            "frames_broadcast": self.frames_broadcast,
+            "events_broadcast": self.events_broadcast,
+            "fleet_seq": self.fleet_encoder.seq,
+            "sent": sum(s.sent for s in subs),
+            "dropped": sum(s.dropped for s in subs),
+            "coalesced": sum(s.coalesced for s in subs),
+            "events_dropped": sum(s.events_dropped for s in subs),
+            "queued": sum(len(s.frames) + len(s.events) for s in subs),
+            "disconnects": self.disconnects,
+        }
+
+    def _next_frames(self, subscriber: Subscriber) -> list:
+        frames = subscriber.take_events()
+        if subscriber.frames:
+            if subscriber.rate_hz:
+                # Rate-limited: only the newest state snapshot is worth sending
+                subscriber.coalesced += len(subscriber.frames) - 1
+                frames.append(subscriber.frames[-1])
+            else:
+                frames.extend(subscriber.frames)
+            subscriber.frames.clear()
+
+        encoder = self.fleet_encoder
+        if subscriber.fleet and encoder.seq > subscriber.fleet_seq:
+            if encoder.delta_text is not None and subscriber.fleet_seq == encoder.seq - 1:
+                frames.append(encoder.delta_text)
+            else:
+                frames.append(encoder.keyframe_text())
+            subscriber.fleet_seq = encoder.seq
+        return frames
+
+    async def _send_events(self, subscriber: Subscriber):
+        # Events go out straight away, ahead of any rate-limited state frames
+        for text in subscriber.take_events():
+            await asyncio.wait_for(subscriber.websocket.send_text(text), timeout=self.send_timeout)
+            subscriber.sent += 1
+
+    async def _sender(self, subscriber: Subscriber):
+        websocket = subscriber.websocket
+        try:
+            while True:
+                await subscriber.wake.wait()
+                subscriber.wake.clear()
+                await self._send_events(subscriber)
+
+                while subscriber.rate_hz:
+                    wait = subscriber.last_send + 1.0 / subscriber.rate_hz - time.monotonic()
+                    if wait <= 0:
+                        break
+                    # Sleep out the interval, but let events through as they arrive
+                    try:
+                        await asyncio.wait_for(subscriber.wake.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    subscriber.wake.clear()
+                    await self._send_events(subscriber)
+
+                for text in self._next_frames(subscriber):
+                    await asyncio.wait_for(websocket.send_text(text), timeout=self.send_timeout)
+                    subscriber.sent += 1
+                subscriber.last_send = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to send to websocket, dropping client: {e}")
+            self.disconnect(websocket)
@@ -0,0 +1,37 @@
+import time
+
+
+def time_call(fn, repeat: int = 20, warmup: int = 2) -> dict:
+    """Times `fn()` and returns mean/median/min/max wall time in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return {
+        "mean_ms": sum(samples) / len(samples),
+        "median_ms": sorted(samples)[len(samples) // 2],
+        "min_ms": min(samples),
+        "max_ms": max(samples),
+    }
+
+
+def percentiles(samples_ms: list) -> dict:
+    """p50/p99/max of a list of latencies in milliseconds."""
+    ordered = sorted(samples_ms)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"p50_ms": pick(0.50), "p99_ms": pick(0.99), "max_ms": ordered[-1]}
+
+
+def print_table(title: str, rows: list, columns: list):
+    """Prints a list of result dicts as a fixed-width table."""
+    print(f"\n== {title} ==")
+    print("  ".join(f"{c:>14}" for c in columns))
+    for row in rows:
+        cells = []
+        for c in columns:
+            v = row.get(c, "")
+            cells.append(f"{v:>14.3f}" if isinstance(v, float) else f"{v!s:>14}")
+        print("  ".join(cells))
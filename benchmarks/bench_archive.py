@@ -0,0 +1,109 @@
+"""
+Snapshot archive: per-tick append cost on the loop, segment write time,
+bytes per tick against the BSON `grid_snapshots` document with its
+`actions` dict, the resulting storage per day at 1 Hz, and query latency
+over the archived span: grid series with a frequency filter, one home's
+actions, one home's curtailment count (from the per-segment totals, and
+above a 0.5 threshold, which reads the home's block), and the top
+curtailed homes.
+
+Actions come from the fairness scheduler under a slowly varying request,
+as the control loop would produce them.
+
+    python -m benchmarks.bench_archive
+"""
+import math
+import shutil
+import tempfile
+import time
+
+import bson
+import numpy as np
+
+from backend.archive import SnapshotArchive
+from backend.fairness import FairnessScheduler
+from backend.homes_mqtt import encode_action
+from benchmarks._timing import print_table
+
+# (homes, archived seconds at 1 Hz)
+SIZES = ((10_000, 3 * 3600), (100_000, 1200))
+SEGMENT_S = 300.0
+T0 = 1_767_225_600.0  # 2026-01-01 00:00 UTC
+
+
+def _snapshot(k: int, load: float) -> dict:
+    return {"timestamp": T0 + k, "frequency": 50.0 + 0.08 * math.sin(k / 97.0), "total_load": load,
+            "total_generation": 0.8 * load, "use_featherless": False}
+
+
+def _bson_bytes(home_ids, actions, snapshot) -> int:
+    doc = {**snapshot, "actions": {h: encode_action(a) for h, a in zip(home_ids, actions)}}
+    return len(bson.encode(doc))
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000.0
+
+
+def run(sizes=SIZES) -> list:
+    rows = []
+    for n, seconds in sizes:
+        directory = tempfile.mkdtemp(prefix="bench_archive_")
+        try:
+            rng = np.random.default_rng(0)
+            home_ids = [f"home_{i}" for i in range(n)]
+            load = rng.uniform(0.5, 5.0, n)
+            soc = rng.uniform(0.2, 1.0, n)
+            scheduler = FairnessScheduler(n, seed=0)
+            archive = SnapshotArchive(directory, home_ids, segment_s=SEGMENT_S)
+            archive.open()
+
+            request = np.zeros((n, 3), dtype=np.float32)
+            append_ms = []
+            doc_bytes = None
+            for k in range(seconds):
+                share = 0.02 * (1.0 + math.sin(2 * math.pi * k / 3600.0))
+                request[:, 0], request[:, 1], request[:, 2] = 1.0 - share, share, share
+                actions = scheduler.schedule(request, load, soc, now=float(k))
+                snapshot = _snapshot(k, float(load.sum()))
+                if doc_bytes is None:
+                    doc_bytes = _bson_bytes(home_ids, actions, snapshot)
+                start = time.perf_counter()
+                archive.append(snapshot, actions)
+                append_ms.append((time.perf_counter() - start) * 1000.0)
+            archive.flush()
+            stats = archive.stats()
+            archive_bytes = stats["archived_mb"] * 1e6
+            probe = home_ids[n // 2]
+
+            row = {"homes": n, "hours": round(seconds / 3600.0, 2)}
+            row["append_ms"] = float(np.median(append_ms))
+            row["write_ms"] = stats["last_write_ms"]
+            row["bson_kb_tick"] = doc_bytes / 1e3
+            row["archive_kb_tick"] = archive_bytes / seconds / 1e3
+            row["bson_gb_day"] = doc_bytes * 86400 / 1e9
+            row["archive_gb_day"] = archive_bytes / seconds * 86400 / 1e9
+            row["reduction"] = doc_bytes * seconds / archive_bytes
+            reader = SnapshotArchive(directory, home_ids, segment_s=SEGMENT_S)
+            reader.open()
+            row["q_grid_ms"] = _timed(lambda: reader.query_grid(where={"frequency": [0.0, 49.95]}))
+            row["q_home_ms"] = _timed(lambda: reader.home_actions([probe]))
+            row["q_curtail_ms"] = _timed(lambda: reader.participation([probe], field="ac"))
+            row["q_curtail_half_ms"] = _timed(lambda: reader.participation([probe], field="ac", above=0.5))
+            row["q_top_ms"] = _timed(lambda: reader.participation(None, field="ac", top=10))
+            rows.append(row)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return rows
+
+
+if __name__ == "__main__":
+    print_table(
+        "Snapshot archive (1 Hz)",
+        run(),
+        ["homes", "hours", "append_ms", "write_ms", "bson_kb_tick", "archive_kb_tick", "bson_gb_day",
+         "archive_gb_day", "reduction", "q_grid_ms", "q_home_ms", "q_curtail_ms", "q_curtail_half_ms",
+         "q_top_ms"],
+    )
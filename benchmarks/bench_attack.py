@@ -0,0 +1,65 @@
+"""
+Synchronized load-spike detection: per-tick cost and detection delay.
+
+Runs the detector over a noisy fleet, then injects a coordinated attack in
+which a fraction of the homes ramp their load up together over a few
+ticks. Reports the mean and worst per-tick cost, the delay from attack
+start to the first alert, and whether any alert fired before the attack.
+
+    python -m benchmarks.bench_attack
+"""
+import numpy as np
+
+from backend.attack_detector import SyncSpikeDetector
+from backend.fleet_state import FleetState
+from benchmarks._timing import time_call, print_table
+
+FLEET_SIZES = (100, 10_000, 100_000)
+ATTACK_FRACTION = 0.05
+ATTACK_KW = 3.0
+RAMP_TICKS = 3
+
+
+def run(sizes=FLEET_SIZES, baseline_ticks: int = 200, attack_ticks: int = 20) -> list:
+    rows = []
+    for n in sizes:
+        fleet = FleetState.random(n, seed=0)
+        detector = SyncSpikeDetector(n, cooldown=0.0)
+        rng = np.random.default_rng(1)
+        attackers = rng.choice(n, size=max(1, int(n * ATTACK_FRACTION)), replace=False)
+
+        false_alarms = 0
+        t = 0.0
+        for _ in range(baseline_ticks):
+            fleet.apply_noise()
+            t += 1.0
+            false_alarms += detector.update(fleet.load_kw, now=t) is not None
+
+        load = fleet.load_kw.copy()
+        cost = time_call(lambda: detector.update(load, now=t), repeat=20)
+
+        delay = None
+        base = fleet.load_kw[attackers].copy()
+        for k in range(attack_ticks):
+            fleet.apply_noise()
+            ramp = min(k + 1, RAMP_TICKS) / RAMP_TICKS
+            fleet.update_rows(attackers, load_kw=base + ATTACK_KW * ramp)
+            t += 1.0
+            if detector.update(fleet.load_kw, now=t) is not None:
+                delay = k + 1
+                break
+
+        rows.append({
+            "homes": n,
+            "attackers": len(attackers),
+            "tick_ms": cost["mean_ms"],
+            "tick_max_ms": cost["max_ms"],
+            "delay_ticks": delay if delay is not None else "missed",
+            "false_alarms": false_alarms,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    print_table("Synchronized spike detection", run(),
+                ["homes", "attackers", "tick_ms", "tick_max_ms", "delay_ticks", "false_alarms"])
@@ -0,0 +1,80 @@
+"""
+Checkpoint costs: the on-loop capture (copy into the spare slot, history
+rows written since that slot's last capture only), the background commit
+(CRC + flush) and the restore on startup, for a fleet plus a full
+aggregate history and the simulator state.
+
+    python -m benchmarks.bench_checkpoint
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from backend.checkpoint import StateCheckpoint
+from backend.fleet_state import FleetState
+from backend.history import GridHistory
+from backend.home_simulator import ACTION_FIELDS, STATE_FIELDS
+from benchmarks._timing import print_table
+
+SIZES = (100, 10_000, 100_000)
+
+
+def _arrays(n_homes):
+    fleet = FleetState.random(n_homes, seed=0)
+    history = GridHistory(fleet, per_home_max_homes=0)
+    for k in range(3600):
+        history.record_grid(50.0, t=1000.0 + k)
+    arrays = {"fleet": fleet.data, **history.aggregate.arrays("history")}
+    arrays["simulator.state"] = np.zeros((len(STATE_FIELDS), n_homes))
+    arrays["simulator.control"] = np.zeros((len(ACTION_FIELDS), n_homes))
+    return fleet, history, arrays
+
+
+def run(sizes=SIZES, repeat: int = 10) -> list:
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            path = os.path.join(tmp, f"state_{n}.ckpt")
+            fleet, history, arrays = _arrays(n)
+            checkpoint = StateCheckpoint(path, arrays, dirty=history.aggregate.write_tracker("history"))
+            clock = [1000.0 + 3600]
+
+            def capture():
+                # One second of the live loop between captures: a history sample and fresh telemetry
+                clock[0] += 1.0
+                history.record_grid(50.0, t=clock[0])
+                fleet.apply_noise()
+                checkpoint.wait()
+                checkpoint.capture({"n": n})
+
+            row = {"homes": n, "file_mb": round(checkpoint.size / 1e6, 1)}
+            capture()
+            row["first_capture_ms"] = checkpoint.last_capture_ms
+            capture()  # both slots now hold a full copy; later captures copy dirty rows only
+            capture_ms = []
+            for _ in range(repeat):
+                capture()
+                capture_ms.append(checkpoint.last_capture_ms)
+            row["capture_ms"] = float(np.median(capture_ms))
+            checkpoint.wait()
+            assert all(np.array_equal(checkpoint._views[checkpoint.slot][k], a, equal_nan=True) for k, a in arrays.items())
+            row["commit_ms"] = checkpoint.last_commit_ms
+            checkpoint.close()
+
+            start = time.perf_counter()
+            restored = StateCheckpoint(path, arrays)
+            restored.restore()
+            row["restart_ms"] = (time.perf_counter() - start) * 1000.0
+            restored.close()
+            rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    print_table(
+        "State checkpoint",
+        run(),
+        ["homes", "file_mb", "first_capture_ms", "capture_ms", "commit_ms", "restart_ms"],
+    )
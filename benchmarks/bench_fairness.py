@@ -0,0 +1,67 @@
+"""
+Per-tick cost of the fairness scheduler (whole tick, and its argpartition
+top-k selection alone) against selecting by a full argsort of the fleet
+by cost, for requests that need roughly 1%, 10% and 50% of the fleet.
+
+    python -m benchmarks.bench_fairness
+"""
+import numpy as np
+
+from backend.fairness import FairnessScheduler
+from benchmarks._timing import time_call, print_table
+
+SIZES = (10_000, 100_000)
+SHARES = (0.01, 0.1, 0.5)
+
+
+def _actions(n, share, rng):
+    """Droop-like actions whose requested reduction needs about `share` of the fleet at full curtailment."""
+    actions = np.empty((n, 3), dtype=np.float32)
+    actions[:, 0] = 1.0 - share
+    actions[:, 1] = share
+    actions[:, 2] = share
+    return actions
+
+
+def _full_sort(cost, capacity, required):
+    order = np.argsort(cost)
+    covered = np.cumsum(capacity[order])
+    return order[:int(np.searchsorted(covered, required)) + 1]
+
+
+def run(sizes=SIZES, shares=SHARES, repeat: int = 20) -> list:
+    rows = []
+    for n in sizes:
+        rng = np.random.default_rng(0)
+        load = rng.uniform(0.5, 5.0, n)
+        soc = rng.uniform(0.2, 1.0, n)
+        for share in shares:
+            scheduler = FairnessScheduler(n)
+            actions = _actions(n, share, rng)
+            ticks = iter(range(10**9))
+            scheduler.schedule(actions, load, soc, now=0.0)
+
+            row = {"homes": n, "share": share}
+            row["schedule_ms"] = time_call(
+                lambda: scheduler.schedule(actions, load, soc, now=float(next(ticks))), repeat=repeat
+            )["median_ms"]
+            capacity = scheduler._capacity.copy()
+            row["select_ms"] = time_call(
+                lambda: scheduler._select(capacity, scheduler.required_kw), repeat=repeat
+            )["median_ms"]
+            row["full_sort_ms"] = time_call(
+                lambda: _full_sort(scheduler.cost, capacity, scheduler.required_kw), repeat=repeat
+            )["median_ms"]
+            stats = scheduler.stats()
+            row["selected"] = stats["selected"]
+            row["jain_index"] = stats["jain_index"]
+            rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    print_table(
+        "Fairness scheduler per tick",
+        run(),
+        ["homes", "share", "schedule_ms", "select_ms", "full_sort_ms", "selected", "jain_index"],
+    )
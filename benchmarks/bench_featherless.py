@@ -0,0 +1,84 @@
+"""
+Offline p50/p99 latency of a Featherless control tick against the local stub.
+
+Starts benchmarks.featherless_stub on a free port, then times
+AsyncFeatherlessClient.infer_action under a healthy endpoint, an endpoint
+with a slow tail (with and without hedging) and a failing endpoint (to show
+the circuit breaker short-circuiting to the fallback).
+
+    python -m benchmarks.bench_featherless
+"""
+import asyncio
+import socket
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from backend.featherless_client import AsyncFeatherlessClient, CircuitBreaker
+from benchmarks import featherless_stub
+from benchmarks._timing import percentiles, print_table
+
+TICKS = 60
+DEADLINE = 0.8
+OBSERVATIONS = {f"home_{i}": [50.0, 1.0, 1.0, 0.5] for i in range(100)}
+
+SCENARIOS = [
+    ("healthy", {"slow_rate": 0.0, "error_rate": 0.0}, None),
+    ("slow_tail", {"slow_rate": 0.05, "error_rate": 0.0}, None),
+    ("slow_tail_hedged", {"slow_rate": 0.05, "error_rate": 0.0}, 0.1),
+    ("failing", {"slow_rate": 0.0, "error_rate": 1.0}, None),
+]
+
+
+def _start_stub() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(featherless_stub.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{base}/stats")
+            return base
+        except httpx.TransportError:
+            time.sleep(0.05)
+    raise RuntimeError("Featherless stub did not start")
+
+
+async def _run_scenario(base: str, stub_config: dict, hedge_after) -> dict:
+    async with httpx.AsyncClient() as admin:
+        await admin.post(f"{base}/config", json=stub_config)
+
+    client = AsyncFeatherlessClient(
+        endpoint=f"{base}/v1/inference",
+        hedge_after=hedge_after,
+        breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60.0),
+    )
+    samples = []
+    for _ in range(TICKS):
+        start = time.perf_counter()
+        await client.infer_action(OBSERVATIONS, deadline=DEADLINE)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    stats = client.stats()
+    await client.aclose()
+    return {**percentiles(samples), "fallbacks": stats["fallbacks"], "hedges": stats["hedges_sent"]}
+
+
+def run() -> list:
+    base = _start_stub()
+    rows = []
+    for name, stub_config, hedge_after in SCENARIOS:
+        row = asyncio.run(_run_scenario(base, stub_config, hedge_after))
+        rows.append({"scenario": name, **row})
+    return rows
+
+
+if __name__ == "__main__":
+    print_table(
+        f"Featherless tick latency ({TICKS} ticks, {DEADLINE * 1000:.0f} ms deadline)",
+        run(),
+        ["scenario", "p50_ms", "p99_ms", "max_ms", "fallbacks", "hedges"],
+    )
@@ -0,0 +1,52 @@
+"""
+Tick-time benchmark for the home state store.
+
+Compares the legacy dict-of-dicts tick (per-home noise, Python sums and
+observation lists) against the columnar FleetState tick.
+
+    python -m benchmarks.bench_fleet_state
+"""
+import random
+
+from backend.fleet_state import FleetState
+from benchmarks._timing import time_call, print_table
+
+FLEET_SIZES = (100, 10_000, 100_000)
+
+
+def _legacy_tick(homes_state: dict, freq: float = 50.0):
+    for state in homes_state.values():
+        state["load_kw"] = max(0.0, round(state["load_kw"] + random.uniform(-0.1, 0.1), 2))
+        state["generation_kw"] = max(0.0, round(state["generation_kw"] + random.uniform(-0.05, 0.05), 2))
+    total_load = sum(h["load_kw"] for h in homes_state.values())
+    total_gen = sum(h["generation_kw"] for h in homes_state.values())
+    observations = {
+        home_id: [freq, state["load_kw"], state["generation_kw"]]
+        for home_id, state in homes_state.items()
+    }
+    return total_load, total_gen, observations
+
+
+def _columnar_tick(fleet: FleetState, freq: float = 50.0):
+    fleet.apply_noise()
+    return fleet.total_load, fleet.total_generation, fleet.observation_matrix(freq)
+
+
+def run(sizes=FLEET_SIZES, repeat: int = 10) -> list:
+    rows = []
+    for n in sizes:
+        fleet = FleetState.random(n, seed=0)
+        legacy = fleet.to_dict()
+        legacy_t = time_call(lambda: _legacy_tick(legacy), repeat=repeat)
+        columnar_t = time_call(lambda: _columnar_tick(fleet), repeat=repeat)
+        rows.append({
+            "homes": n,
+            "legacy_ms": legacy_t["mean_ms"],
+            "columnar_ms": columnar_t["mean_ms"],
+            "speedup": legacy_t["mean_ms"] / max(columnar_t["mean_ms"], 1e-9),
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    print_table("Fleet state tick", run(), ["homes", "legacy_ms", "columnar_ms", "speedup"])
@@ -0,0 +1,48 @@
+"""
+PatchTST forecast latency per control tick.
+
+Times pushing one fleet sample plus a forecast for the engine (embedding
+folded into the head, one product over the ring) against the naive full
+recompute through explicit patch tokens, and checks both agree.
+
+    python -m benchmarks.bench_forecast
+"""
+import numpy as np
+
+from backend.fleet_state import FleetState
+from backend.patchtst_forecast import PatchTSTForecaster
+from benchmarks._timing import time_call, print_table
+
+FLEET_SIZES = (100, 10_000, 100_000)
+
+
+def run(sizes=FLEET_SIZES, repeat: int = 8) -> list:
+    rows = []
+    for n in sizes:
+        fleet = FleetState.random(n, seed=0)
+        forecaster = PatchTSTForecaster()
+        for _ in range(forecaster.context + 1):
+            fleet.apply_noise()
+            forecaster.observe(fleet)
+        engine = forecaster.engine
+        assert np.allclose(engine.forecast(), engine.forecast_naive(), rtol=1e-3, atol=1e-2)
+
+        def engine_tick():
+            forecaster.observe(fleet)
+            forecaster.forecast()
+
+        def naive_tick():
+            forecaster.observe(fleet)
+            engine.forecast_naive()
+
+        rows.append({
+            "homes": n,
+            "engine_ms": time_call(engine_tick, repeat=repeat)["mean_ms"],
+            "engine_max_ms": time_call(engine_tick, repeat=repeat)["max_ms"],
+            "naive_ms": time_call(naive_tick, repeat=repeat)["mean_ms"],
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    print_table("PatchTST forecast per control tick", run(), ["homes", "engine_ms", "engine_max_ms", "naive_ms"])
@@ -0,0 +1,54 @@
+"""
+Sharded home simulator throughput.
+
+Times one in-process step of the home models over the whole fleet, then
+runs the worker pool for a few seconds at each shard count and reports the
+achieved home-steps per second and what the orchestrator pays per tick to
+read the shared fleet.
+
+    python -m benchmarks.bench_home_sim
+"""
+import time
+
+import numpy as np
+
+from backend.home_simulator import ShardedHomeSimulator, step_homes
+from benchmarks._timing import time_call, print_table
+
+FLEET_SIZES = (10_000, 100_000)
+SHARD_COUNTS = (1, 2, 4)
+
+
+def run(sizes=FLEET_SIZES, shard_counts=SHARD_COUNTS, seconds: float = 2.0) -> list:
+    rows = []
+    for n in sizes:
+        # Unthrottled workers: ask for far more ticks than they can deliver
+        sim = ShardedHomeSimulator(n, tick_hz=1000.0, time_scale=60.0)
+        rng = np.random.default_rng(0)
+        step_ms = time_call(
+            lambda: step_homes(sim.fleet.data, sim.state, sim.control, sim.sim_time(), 0.1, rng), repeat=10
+        )["mean_ms"]
+        read_ms = time_call(sim.fleet.refresh, repeat=20)["mean_ms"]
+        try:
+            for shards in shard_counts:
+                sim.rebalance(shards) if sim.running else sim.start(shards)
+                time.sleep(0.5)  # worker start-up
+                before = sim.ticks[:shards].copy()
+                time.sleep(seconds)
+                ticks = sim.ticks[:shards] - before
+                sizes_per_shard = np.array([hi - lo for _, lo, hi in sim.workers])
+                rows.append({
+                    "homes": n,
+                    "shards": shards,
+                    "step_ms_1proc": step_ms,
+                    "read_ms": read_ms,
+                    "home_steps_per_s": float((ticks * sizes_per_shard).sum() / seconds),
+                })
+        finally:
+            sim.close()
+    return rows
+
+
+if __name__ == "__main__":
+    print_table("Sharded home simulator", run(),
+                ["homes", "shards", "step_ms_1proc", "read_ms", "home_steps_per_s"])
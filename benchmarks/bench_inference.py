@@ -0,0 +1,71 @@
+"""
+Control-tick latency with inline inference vs the inference worker.
+
+The policy is the suite's stub MLP plus a sleep that models forward-pass
+jitter: usually 2 ms, but every tenth call stalls for 150 ms (a GC pause
+or an RLlib hiccup). Reports the time the control coroutine spends
+getting actions per tick, and how many ticks reused the last good actions.
+
+    python -m benchmarks.bench_inference
+"""
+import asyncio
+import time
+
+from backend.fleet_state import FleetState
+from backend.inference_worker import InferenceWorker
+from benchmarks._timing import percentiles, print_table
+from benchmarks.suite import StubPolicy
+
+TICKS = 60
+TICK_PERIOD = 0.05
+DEADLINE = 0.02
+FLEET_HOMES = 10_000
+
+
+class JitteryPolicy(StubPolicy):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def get_actions(self, obs):
+        self.calls += 1
+        time.sleep(0.15 if self.calls % 10 == 0 else 0.002)
+        return self.compute_actions(obs)[0]
+
+
+async def _inline() -> dict:
+    fleet, policy = FleetState.random(FLEET_HOMES, seed=0), JitteryPolicy()
+    samples = []
+    for _ in range(TICKS):
+        start = time.perf_counter()
+        policy.get_actions(fleet.observation_matrix(50.0))
+        samples.append((time.perf_counter() - start) * 1000.0)
+        await asyncio.sleep(TICK_PERIOD)
+    return {**percentiles(samples), "misses": 0}
+
+
+async def _worker() -> dict:
+    fleet, policy = FleetState.random(FLEET_HOMES, seed=0), JitteryPolicy()
+    worker = InferenceWorker(policy.get_actions)
+    worker.start()
+    samples = []
+    for _ in range(TICKS):
+        fleet.apply_noise()
+        start = time.perf_counter()
+        await worker.infer(fleet.observation_matrix(50.0), deadline=DEADLINE)
+        samples.append((time.perf_counter() - start) * 1000.0)
+        await asyncio.sleep(TICK_PERIOD)
+    worker.stop()
+    return {**percentiles(samples), "misses": worker.misses}
+
+
+def run() -> list:
+    return [
+        {"mode": "inline", **asyncio.run(_inline())},
+        {"mode": "worker", **asyncio.run(_worker())},
+    ]
+
+
+if __name__ == "__main__":
+    print_table(f"Actions per control tick ({FLEET_HOMES} homes, {DEADLINE * 1000:.0f} ms deadline)", run(),
+                ["mode", "p50_ms", "p99_ms", "max_ms", "misses"])
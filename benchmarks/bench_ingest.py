@@ -0,0 +1,110 @@
+"""
+Sustained telemetry ingest throughput.
+
+A producer thread plays the paho network thread, pushing per-home payloads
+into the ring buffer at a target rate while the asyncio-side ingestor
+decodes, coalesces and applies them to the fleet. Before timing, a batch
+mixing valid JSON and binary payloads with malformed JSON records is
+checked to apply every valid sample and count each bad record.
+
+    python -m benchmarks.bench_ingest
+"""
+import asyncio
+import json
+import threading
+import time
+
+import numpy as np
+
+from backend.fleet_state import FleetState
+from backend.telemetry_ingest import TelemetryIngestor, TelemetryRingBuffer
+from backend.wire_format import encode_telemetry
+from benchmarks._timing import print_table
+
+HOMES = 10_000
+TARGET_RATE = 100_000  # msgs/s, i.e. 10k homes reporting every 100 ms
+DURATION = 2.0
+
+
+def _json_payloads(fleet):
+    return [(f"vpp/telemetry/{home_id}", json.dumps(state).encode()) for home_id, state in fleet.to_dict().items()]
+
+
+def _binary_payloads(fleet):
+    # One record per frame, as a single device would send it
+    return [
+        ("vpp/telemetry/batch", encode_telemetry(np.array([row], dtype=np.uint32), fleet.load_kw[row:row + 1],
+                                                 fleet.generation_kw[row:row + 1], fleet.battery_soc[row:row + 1])[0])
+        for row in range(len(fleet))
+    ]
+
+
+def _produce(buffer, payloads, stop_at):
+    burst = max(1, TARGET_RATE // 1000)
+    i = 0
+    next_t = time.monotonic()
+    while time.monotonic() < stop_at:
+        for _ in range(burst):
+            topic, payload = payloads[i % len(payloads)]
+            buffer.push(topic, payload)
+            i += 1
+        next_t += burst / TARGET_RATE
+        time.sleep(max(0.0, next_t - time.monotonic()))
+
+
+def _check_mixed_batch():
+    fleet = FleetState.random(4, seed=0)
+    ingestor = TelemetryIngestor(fleet, TelemetryRingBuffer())
+    good = {"load_kw": 7.0, "generation_kw": 1.0, "battery_soc": 0.5}
+    ingestor.buffer.push("vpp/telemetry/home_0", json.dumps(good).encode())
+    for home, load in (("home_1", "bad"), ("home_2", None), ("home_3", [1.0])):
+        ingestor.buffer.push(f"vpp/telemetry/{home}", json.dumps({**good, "load_kw": load}).encode())
+    frame = encode_telemetry(np.array([3], dtype=np.uint32), np.array([9.0]), np.array([2.0]), np.array([0.4]))[0]
+    ingestor.buffer.push("vpp/telemetry/batch", frame)
+
+    assert ingestor.process_pending() == 2
+    assert ingestor.decode_errors == 3
+    assert fleet.load_kw[0] == 7.0 and fleet.load_kw[3] == 9.0
+    assert len(ingestor.buffer) == 0
+
+
+async def _run(payload_fn) -> dict:
+    fleet = FleetState.random(HOMES, seed=0)
+    payloads = payload_fn(fleet)
+    ingestor = TelemetryIngestor(fleet, TelemetryRingBuffer())
+    ingestor.start()
+
+    start = time.monotonic()
+    producer = threading.Thread(target=_produce, args=(ingestor.buffer, payloads, start + DURATION))
+    producer.start()
+    while producer.is_alive():
+        await asyncio.sleep(0.05)
+    while len(ingestor.buffer):
+        await asyncio.sleep(0.01)
+    elapsed = time.monotonic() - start
+    await ingestor.stop()
+
+    stats = ingestor.stats()
+    return {
+        "offered_msgs_s": stats["received"] / DURATION,
+        "drained_msgs_s": (stats["received"] - stats["dropped"]) / elapsed,
+        "dropped": stats["dropped"],
+        "batches": stats["batches"],
+        "max_lag_ms": stats["max_lag_ms"],
+    }
+
+
+def run() -> list:
+    _check_mixed_batch()
+    return [
+        {"payload": "json", **asyncio.run(_run(_json_payloads))},
+        {"payload": "binary", **asyncio.run(_run(_binary_payloads))},
+    ]
+
+
+if __name__ == "__main__":
+    print_table(
+        f"Telemetry ingest ({HOMES} homes, target {TARGET_RATE} msgs/s)",
+        run(),
+        ["payload", "offered_msgs_s", "drained_msgs_s", "dropped", "batches", "max_lag_ms"],
+    )
@@ -0,0 +1,55 @@
+"""
+Per-tick cost of the microgrid cluster subsystem: the segmented reduction
+of the fleet into per-cluster totals and balance indices, the vectorized
+island / reconnect decision, the per-cluster frequency step, and
+incremental membership moves, against a per-cluster Python loop baseline.
+
+    python -m benchmarks.bench_microgrid
+"""
+import numpy as np
+
+from backend.fleet_state import FleetState
+from backend.microgrid import MicrogridClusters
+from benchmarks._timing import time_call, print_table
+
+SIZES = ((10_000, 100), (100_000, 1_000))
+
+
+def _loop_aggregate(fleet, members):
+    return [(fleet.load_kw[rows].sum(), fleet.generation_kw[rows].sum(), fleet.battery_soc[rows].sum())
+            for rows in members]
+
+
+def run(sizes=SIZES, repeat: int = 20) -> list:
+    rows = []
+    for n_homes, n_clusters in sizes:
+        fleet = FleetState.random(n_homes, seed=0)
+        grid = MicrogridClusters(n_homes, n_clusters, auto_island=True, reconnect_hold=0.0)
+        members = [np.flatnonzero(grid.cluster_of == c) for c in range(n_clusters)]
+        rng = np.random.default_rng(0)
+        movers = rng.integers(0, n_homes, n_homes // 100)
+        targets = rng.integers(0, n_clusters, len(movers))
+
+        # Alternate a disturbed and a healthy grid so every decision path runs
+        ticks = iter(range(10**9))
+
+        def decide():
+            k = next(ticks)
+            grid.update(fleet.data, 49.0 if k % 2 else 50.0, now=float(k))
+
+        row = {"homes": n_homes, "clusters": n_clusters}
+        row["loop_agg_ms"] = time_call(lambda: _loop_aggregate(fleet, members), repeat=3, warmup=1)["median_ms"]
+        row["aggregate_ms"] = time_call(lambda: grid.aggregate(fleet.data), repeat=repeat)["median_ms"]
+        row["update_ms"] = time_call(decide, repeat=repeat)["median_ms"]
+        row["freq_step_ms"] = time_call(lambda: grid.step_frequency(50.0, 0.1), repeat=repeat)["median_ms"]
+        row["move_1pct_ms"] = time_call(lambda: grid.move(movers, targets), repeat=repeat)["median_ms"]
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    print_table(
+        "Microgrid clusters per tick",
+        run(),
+        ["homes", "clusters", "loop_agg_ms", "aggregate_ms", "update_ms", "freq_step_ms", "move_1pct_ms"],
+    )
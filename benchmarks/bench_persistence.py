@@ -0,0 +1,86 @@
+"""
+Control-path cost of persisting grid snapshots.
+
+Runs against an in-process Mongo stand-in with a fixed round-trip latency
+and compares one awaited insert_one per snapshot with the WriteBehindQueue.
+
+    python -m benchmarks.bench_persistence
+"""
+import asyncio
+import time
+
+from backend.database import WriteBehindQueue
+from benchmarks._timing import percentiles, print_table
+
+ROUND_TRIP_S = 0.002
+SNAPSHOTS = 2_000
+
+
+class InMemoryCollection:
+    """Mongo collection stand-in: every call costs one simulated round trip."""
+
+    def __init__(self, round_trip: float = ROUND_TRIP_S):
+        self.round_trip = round_trip
+        self.documents = []
+        self.round_trips = 0
+
+    async def insert_one(self, document):
+        self.round_trips += 1
+        await asyncio.sleep(self.round_trip)
+        self.documents.append(document)
+
+    async def insert_many(self, documents, **kwargs):
+        self.round_trips += 1
+        await asyncio.sleep(self.round_trip)
+        self.documents.extend(documents)
+
+
+class InMemoryDatabase(dict):
+    def __missing__(self, name):
+        self[name] = InMemoryCollection()
+        return self[name]
+
+
+def _snapshot(i: int) -> dict:
+    return {"frequency": 50.0, "total_load": float(i), "total_generation": float(i), "actions": {}}
+
+
+async def _direct() -> dict:
+    db = InMemoryDatabase()
+    samples = []
+    for i in range(SNAPSHOTS):
+        start = time.perf_counter()
+        await db["grid_snapshots"].insert_one(_snapshot(i))
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return {**percentiles(samples), "round_trips": db["grid_snapshots"].round_trips, "dropped": 0}
+
+
+async def _write_behind(full_policy: str, max_size: int) -> dict:
+    db = InMemoryDatabase()
+    queue = WriteBehindQueue(db, max_size=max_size, batch_size=100, max_age=0.05, full_policy=full_policy)
+    queue.start()
+    samples = []
+    for i in range(SNAPSHOTS):
+        start = time.perf_counter()
+        await queue.put("grid_snapshots", _snapshot(i))
+        samples.append((time.perf_counter() - start) * 1000.0)
+    await queue.close()
+    stats = queue.stats()
+    assert stats["written"] + stats["dropped"] == SNAPSHOTS
+    return {**percentiles(samples), "round_trips": db["grid_snapshots"].round_trips, "dropped": stats["dropped"]}
+
+
+def run() -> list:
+    return [
+        {"mode": "insert_one", **asyncio.run(_direct())},
+        {"mode": "wb_block", **asyncio.run(_write_behind("block", 500))},
+        {"mode": "wb_drop_oldest", **asyncio.run(_write_behind("drop_oldest", 500))},
+    ]
+
+
+if __name__ == "__main__":
+    print_table(
+        f"Snapshot persistence ({SNAPSHOTS} saves, {ROUND_TRIP_S * 1000:.0f} ms round trip)",
+        run(),
+        ["mode", "p50_ms", "p99_ms", "max_ms", "round_trips", "dropped"],
+    )
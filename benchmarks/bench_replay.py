@@ -0,0 +1,60 @@
+"""
+Offline replay throughput: a synthetic day of 1 Hz per-home telemetry run
+through the what-if engine, open-loop and with droop policies, for a
+growing number of (inertia, damping, policy) variants in one pass.
+
+    python -m benchmarks.bench_replay
+"""
+import time
+
+import numpy as np
+
+from backend.fallback_controller import RuleBasedController
+from backend.replay import ReplayEngine, ReplayTrace
+from benchmarks._timing import print_table
+
+N_HOMES = 100
+SECONDS = 86400
+VARIANT_COUNTS = (1, 8, 64)
+
+
+def _variants(n, closed_loop):
+    rng = np.random.default_rng(0)
+    droops = [RuleBasedController(deadband=d) for d in (0.01, 0.02, 0.05)]
+    return [
+        {
+            "inertia": float(rng.uniform(0.1, 2.0)),
+            "damping": float(rng.uniform(0.05, 0.5)),
+            "policy": droops[i % len(droops)] if closed_loop else None,
+        }
+        for i in range(n)
+    ]
+
+
+def run(counts=VARIANT_COUNTS, n_homes: int = N_HOMES, seconds: int = SECONDS) -> list:
+    start = time.perf_counter()
+    trace = ReplayTrace.synthetic(n_homes, seconds)
+    print(f"Generated {seconds} s x {n_homes} homes in {time.perf_counter() - start:.1f} s")
+
+    rows = []
+    for n in counts:
+        for closed_loop in (False, True):
+            for detect in (False, True):
+                result = ReplayEngine(trace, _variants(n, closed_loop), power_scale=0.001, detect=detect).run()
+                rows.append({
+                    "variants": n,
+                    "policy": "droop" if closed_loop else "none",
+                    "detect": detect,
+                    "elapsed_s": result["elapsed_s"],
+                    "speedup": float(result["speedup"]),
+                    "worst_rms_hz": max(v["rms_hz"] for v in result["variants"]),
+                })
+    return rows
+
+
+if __name__ == "__main__":
+    print_table(
+        f"Replay of {SECONDS} s at 1 Hz, {N_HOMES} homes",
+        run(),
+        ["variants", "policy", "detect", "elapsed_s", "speedup", "worst_rms_hz"],
+    )
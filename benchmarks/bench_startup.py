@@ -0,0 +1,92 @@
+"""
+Cold start: process start to first served control tick, and to policy ready.
+
+Each mode runs in a fresh interpreter that imports backend.main and enters
+the app lifespan:
+
+- blocking: the policy is built before the scheduler starts, as the loop
+  used to on its first tick
+- background: the policy builds on a worker thread while the rule-based
+  controller serves ticks
+
+Without ray installed (or with --stub-build), the PPO build and restore are
+replaced by a sleep of --build-seconds and the stub policy from the suite.
+MQTT and Mongo need not be running; their connection errors are only logged.
+
+    python -m benchmarks.bench_startup
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks._timing import print_table
+
+_DRIVER = r"""
+import asyncio, json, os, sys, time
+t0 = time.perf_counter()
+import backend.main as m
+imported = time.perf_counter() - t0
+
+build_s = os.environ.get("BENCH_STUB_BUILD_S")
+if build_s is not None:
+    from backend.rllib_marl import MARLController
+    from benchmarks.suite import StubPolicy
+    def init_model(self):
+        if self.algo is None:
+            time.sleep(float(build_s))
+            self.policy = StubPolicy()
+            self.algo = self.policy
+    MARLController.init_model = init_model
+
+async def main():
+    async with m.app.router.lifespan_context(m.app):
+        while m.scheduler.stages["control"].runs == 0:
+            await asyncio.sleep(0.001)
+        first_tick = time.perf_counter() - t0
+        deadline = time.monotonic() + 120
+        while not m.marl_controller.ready and m.marl_controller.warmup_error is None and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        ready = time.perf_counter() - t0 if m.marl_controller.ready else None
+    print("BENCH " + json.dumps({"import_s": imported, "first_tick_s": first_tick, "ready_s": ready,
+                                 "warmup_error": m.marl_controller.warmup_error}))
+
+asyncio.run(main())
+"""
+
+
+def _ray_available() -> bool:
+    try:
+        import ray  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _run_mode(mode: str, stub_build: float = None) -> dict:
+    env = {**os.environ, "MARL_WARMUP": mode, "CONTROL_HZ": "10"}
+    if stub_build is not None:
+        env["BENCH_STUB_BUILD_S"] = str(stub_build)
+    # Shutdown can wait out Mongo's server-selection timeout when no server runs, so only the
+    # driver's own timings are reported
+    proc = subprocess.run([sys.executable, "-c", _DRIVER], env=env, capture_output=True, text=True, timeout=300)
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH "):
+            return {"mode": mode, **json.loads(line[6:])}
+    raise RuntimeError(f"{mode} run failed:\n{proc.stderr[-2000:]}")
+
+
+def run(build_seconds: float = 5.0, stub_build: bool = None) -> list:
+    stub = (not _ray_available()) if stub_build is None else stub_build
+    build = build_seconds if stub else None
+    return [_run_mode("blocking", build), _run_mode("background", build)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--build-seconds", type=float, default=5.0, help="simulated PPO build time for the stub")
+    parser.add_argument("--stub-build", action="store_true", help="use the stub build even if ray is installed")
+    args = parser.parse_args()
+    rows = run(args.build_seconds, True if args.stub_build else None)
+    print_table("Cold start", rows, ["mode", "import_s", "first_tick_s", "ready_s"])
@@ -0,0 +1,60 @@
+"""
+What-if throughput of the swing-equation integrators.
+
+Times a 10 s contingency (100 steps) across many (inertia, damping)
+parameter sets: a Python loop over scalar SwingEquation instances versus
+one BatchSwingEquation call per method.
+
+    python -m benchmarks.bench_swing
+"""
+import numpy as np
+
+from backend.swing_equation import BatchSwingEquation, SwingEquation
+from benchmarks._timing import time_call, print_table
+
+SCENARIO_COUNTS = (100, 1_000, 10_000)
+STEPS = 100
+
+
+def _params(n, seed=0):
+    rng = np.random.default_rng(seed)
+    inertia = rng.uniform(0.01, 1.0, n)
+    damping = rng.uniform(0.01, 0.5, n)
+    # PV collapse: 0.3 kW deficit after 1 s
+    trace = np.zeros(STEPS)
+    trace[10:] = -0.3
+    return inertia, damping, trace
+
+
+def _scalar_loop(inertia, damping, trace):
+    for m, d in zip(inertia, damping):
+        swing = SwingEquation(inertia=m, damping=d)
+        for dp in trace:
+            swing.step(dp, 0.0)
+
+
+def _batch(inertia, damping, trace, method, substeps):
+    swing = BatchSwingEquation(len(inertia), inertia=inertia, damping=damping, method=method, substeps=substeps)
+    return swing.simulate(trace, record=False)
+
+
+def run(counts=SCENARIO_COUNTS, repeat: int = 3) -> list:
+    rows = []
+    for n in counts:
+        inertia, damping, trace = _params(n)
+        row = {"scenarios": n}
+        if n <= 1_000:
+            row["scalar_ms"] = time_call(lambda: _scalar_loop(inertia, damping, trace), repeat=1, warmup=0)["mean_ms"]
+        for method, substeps in (("euler", 1), ("rk4", 4), ("exp", 1)):
+            row[f"{method}_ms"] = time_call(lambda: _batch(inertia, damping, trace, method, substeps), repeat=repeat)["mean_ms"]
+        row["crossed"] = int(np.isfinite(_batch(inertia, damping, trace, "exp", 1)["first_crossing"]).sum())
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    print_table(
+        f"Swing-equation what-if ({STEPS} steps per scenario)",
+        run(),
+        ["scenarios", "scalar_ms", "euler_ms", "rk4_ms", "exp_ms", "crossed"],
+    )
@@ -0,0 +1,92 @@
+"""
+Env-steps/sec benchmark for the VPP training environment.
+
+Compares the legacy per-agent dict step against the array core, a
+16-instance vector step, and (when ray is installed) the MultiAgentEnv
+adapter.
+
+    python -m benchmarks.bench_vpp_env
+"""
+import numpy as np
+
+from backend.vpp_core import VPPVectorEnv
+from benchmarks._timing import time_call, print_table
+
+FLEET_SIZES = (100, 1_000, 10_000)
+VECTOR_ENVS = 16
+
+
+class _LegacyEnv:
+    """Per-home dict implementation the array core replaced, kept for comparison."""
+
+    def __init__(self, n_homes):
+        self.agents = [f"home_{i}" for i in range(n_homes)]
+        self.H = 5
+        self.freq = 50
+        self.homes = {
+            agent: {"load": np.random.uniform(3, 6), "pv": np.random.uniform(0, 3), "soc": np.random.uniform(0.4, 0.9)}
+            for agent in self.agents
+        }
+
+    def step(self, actions):
+        total_load = total_pv = 0
+        for agent, action in actions.items():
+            ev, ac, battery = action
+            home = self.homes[agent]
+            home["load"] += ev * 0.5
+            home["load"] -= ac * 0.3
+            home["soc"] -= battery * 0.01
+            total_load += home["load"]
+            total_pv += home["pv"]
+        self.freq += (total_pv - total_load) / (2 * self.H)
+        obs, rewards = {}, {}
+        for agent in self.agents:
+            h = self.homes[agent]
+            obs[agent] = np.array([self.freq, h["load"], h["pv"], h["soc"]], dtype=np.float32)
+            rewards[agent] = -(self.freq - 50) ** 2
+        return obs, rewards
+
+
+def _steps_per_sec(step, n_envs=1, repeat=10):
+    mean_ms = time_call(step, repeat=repeat)["mean_ms"]
+    return n_envs * 1000.0 / mean_ms
+
+
+def run(sizes=FLEET_SIZES, repeat: int = 10) -> list:
+    try:
+        from backend.vpp_env import VPPEnv
+    except ImportError:
+        VPPEnv = None
+
+    rows = []
+    for n in sizes:
+        actions = np.zeros((n, 3), dtype=np.float32)
+
+        legacy = _LegacyEnv(n)
+        legacy_actions = dict(zip(legacy.agents, actions))
+        core = VPPVectorEnv(n_homes=n, seed=0)
+        core.reset()
+        vector = VPPVectorEnv(n_homes=n, n_envs=VECTOR_ENVS, seed=0)
+        vector.reset()
+        vector_actions = np.zeros((VECTOR_ENVS, n, 3), dtype=np.float32)
+
+        row = {
+            "homes": n,
+            "legacy_sps": _steps_per_sec(lambda: legacy.step(legacy_actions), repeat=repeat),
+            "core_sps": _steps_per_sec(lambda: core.step(actions), repeat=repeat),
+            "vector_sps": _steps_per_sec(lambda: vector.step(vector_actions), VECTOR_ENVS, repeat),
+        }
+        if VPPEnv is not None:
+            env = VPPEnv({"n_homes": n})
+            env_actions = dict(zip(env.agent_ids, actions))
+            row["adapter_sps"] = _steps_per_sec(lambda: env.step(env_actions), repeat=repeat)
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    print_table(
+        f"VPP env steps/sec (vector mode = {VECTOR_ENVS} instances)",
+        run(),
+        ["homes", "legacy_sps", "core_sps", "vector_sps", "adapter_sps"],
+    )
@@ -0,0 +1,78 @@
+"""
+Encode/decode cost and bytes per tick of the MQTT wire formats.
+
+Compares legacy per-home JSON against batched binary frames for telemetry
+and control, and delta actuation with 10% of homes changing per tick.
+
+    python -m benchmarks.bench_wire_format
+"""
+import json
+
+import numpy as np
+
+from backend.fleet_state import FleetState
+from backend.wire_format import ControlDeltaEncoder, decode_frame, encode_control, encode_telemetry
+from benchmarks._timing import time_call, print_table
+
+FLEET_SIZES = (100, 10_000, 100_000)
+CHANGED_SHARE = 0.10
+
+
+def _json_telemetry(fleet):
+    return [json.dumps(state) for state in fleet.to_dict().values()]
+
+
+def _json_control(home_ids, actions):
+    return [json.dumps({"agent_id": h, "action": a}) for h, a in zip(home_ids, actions.tolist())]
+
+
+def run(sizes=FLEET_SIZES, repeat: int = 5) -> list:
+    rows = []
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        fleet = FleetState.random(n, seed=0)
+        all_rows = np.arange(n, dtype=np.uint32)
+        actions = rng.uniform(-1, 1, (n, 3)).astype(np.float32)
+
+        telemetry = lambda: encode_telemetry(all_rows, fleet.load_kw, fleet.generation_kw, fleet.battery_soc)
+        control = lambda: encode_control(all_rows, actions)
+        telemetry_frames = telemetry()
+        control_frames = control()
+
+        delta = ControlDeltaEncoder(n, keyframe_every=0)
+        delta.encode(actions)
+        changed = rng.choice(n, int(n * CHANGED_SHARE), replace=False)
+        next_actions = actions.copy()
+        next_actions[changed] += 0.5
+        delta_frames = delta.encode(next_actions)
+
+        json_telemetry = _json_telemetry(fleet)
+        json_control = _json_control(fleet.home_ids, actions)
+
+        rows.append({
+            "homes": n,
+            "json_bytes": sum(map(len, json_telemetry)) + sum(map(len, json_control)),
+            "json_msgs": len(json_telemetry) + len(json_control),
+            "bin_bytes": sum(map(len, telemetry_frames)) + sum(map(len, control_frames)),
+            "bin_msgs": len(telemetry_frames) + len(control_frames),
+            "delta_ctl_bytes": sum(map(len, delta_frames)),
+            "json_enc_ms": time_call(lambda: (_json_telemetry(fleet), _json_control(fleet.home_ids, actions)), repeat)["mean_ms"],
+            "bin_enc_ms": time_call(lambda: (telemetry(), control()), repeat)["mean_ms"],
+            "json_dec_ms": time_call(lambda: [json.loads(m) for m in json_telemetry], repeat)["mean_ms"],
+            "bin_dec_ms": time_call(lambda: [decode_frame(f) for f in telemetry_frames], repeat)["mean_ms"],
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    results = run()
+    print_table(
+        "MQTT wire format: bytes and messages per tick (telemetry + control)",
+        results,
+        ["homes", "json_bytes", "json_msgs", "bin_bytes", "bin_msgs", "delta_ctl_bytes"],
+    )
+    print_table(
+        "MQTT wire format: encode/decode time per tick",
+        results,
+        ["homes", "json_enc_ms", "bin_enc_ms", "json_dec_ms", "bin_dec_ms"],
+    )
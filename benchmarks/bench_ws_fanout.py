@@ -0,0 +1,119 @@
+"""
+Cost of a dashboard broadcast on the control loop.
+
+Compares the old sequential await-per-client broadcast with the queued
+fan-out, with 10% of the dashboards on a slow (50 ms per frame) link.
+Before timing, checks that an alert broadcast between state frames reaches
+both a rate-limited and a slow dashboard.
+
+    python -m benchmarks.bench_ws_fanout
+"""
+import asyncio
+import json
+import time
+
+from backend.fleet_state import FleetState
+from backend.ws_fanout import ConnectionManager
+from benchmarks._timing import percentiles, print_table
+
+SUBSCRIBER_COUNTS = (10, 100, 500)
+SLOW_SHARE = 0.10
+SLOW_DELAY = 0.05
+TICKS = 20
+FLEET_HOMES = 10_000
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.received = 0
+        self.texts = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received += 1
+        self.texts.append(text)
+
+    async def send_json(self, message):
+        await self.send_text(json.dumps(message))
+
+
+def _sockets(n):
+    n_slow = int(n * SLOW_SHARE)
+    return [FakeWebSocket(SLOW_DELAY if i < n_slow else 0.0) for i in range(n)]
+
+
+def _message(i):
+    return {"type": "GRID_UPDATE", "frequency": 50.0, "total_load": float(i), "total_generation": float(i)}
+
+
+async def _sequential(n) -> dict:
+    sockets = _sockets(n)
+    samples = []
+    for i in range(TICKS):
+        start = time.perf_counter()
+        for ws in sockets:
+            await ws.send_json(_message(i))
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return percentiles(samples)
+
+
+async def _fanout(n, fleet: bool) -> dict:
+    manager = ConnectionManager()
+    state = FleetState.random(FLEET_HOMES, seed=0)
+    for ws in _sockets(n):
+        await manager.connect(ws, fleet=fleet)
+    samples = []
+    for i in range(TICKS):
+        start = time.perf_counter()
+        await manager.broadcast(_message(i))
+        if fleet:
+            state.apply_noise()
+            manager.publish_fleet(state)
+        samples.append((time.perf_counter() - start) * 1000.0)
+        await asyncio.sleep(0.01)
+    for ws in list(manager.subscribers):
+        manager.disconnect(ws)
+    return {**percentiles(samples), "dropped": manager.stats()["dropped"]}
+
+
+async def _check_alert_delivery():
+    manager = ConnectionManager()
+    limited, slow = FakeWebSocket(), FakeWebSocket(SLOW_DELAY)
+    await manager.connect(limited, rate_hz=2.0)
+    await manager.connect(slow)
+    for i in range(3 * manager.max_queue):
+        await manager.broadcast(_message(i))
+        if i == manager.max_queue:
+            await manager.broadcast_event({"type": "ATTACK_ALERT", "alert": {"tick": i}})
+        await asyncio.sleep(0.001)
+    await asyncio.sleep(0.05)
+    # Well inside its 0.5 s interval, the rate-limited client already has the alert
+    assert any('"ATTACK_ALERT"' in text for text in limited.texts), "alert held back by the rate limit"
+    await asyncio.sleep(1.0)  # the slow link drains its backlog of state frames
+    for ws in (limited, slow):
+        assert any('"ATTACK_ALERT"' in text for text in ws.texts), "alert lost behind state frames"
+    for ws in list(manager.subscribers):
+        manager.disconnect(ws)
+
+
+def run() -> list:
+    asyncio.run(_check_alert_delivery())
+    rows = []
+    for n in SUBSCRIBER_COUNTS:
+        rows.append({"clients": n, "mode": "sequential", **asyncio.run(_sequential(n))})
+        rows.append({"clients": n, "mode": "fanout", **asyncio.run(_fanout(n, fleet=False))})
+        rows.append({"clients": n, "mode": "fanout+fleet", **asyncio.run(_fanout(n, fleet=True))})
+    return rows
+
+
+if __name__ == "__main__":
+    print_table(
+        f"Broadcast cost per tick ({SLOW_SHARE:.0%} slow clients, fleet of {FLEET_HOMES})",
+        run(),
+        ["clients", "mode", "p50_ms", "p99_ms", "max_ms"],
+    )
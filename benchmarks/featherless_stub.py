@@ -0,0 +1,63 @@
+"""
+Local stand-in for the Featherless inference endpoint with injectable latency.
+
+    uvicorn benchmarks.featherless_stub:app --port 8100
+    FEATHERLESS_ENDPOINT=http://127.0.0.1:8100/v1/inference
+
+Latency and failures are controlled by environment variables or, at
+runtime, by POSTing the same keys to /config:
+
+    STUB_LATENCY_MS       base latency per request (default 20)
+    STUB_JITTER_MS        uniform jitter added on top (default 5)
+    STUB_SLOW_RATE        fraction of requests that take STUB_SLOW_MS (default 0)
+    STUB_SLOW_MS          latency of a slow request (default 2000)
+    STUB_ERROR_RATE       fraction of requests answered with HTTP 503 (default 0)
+"""
+import asyncio
+import os
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+config = {
+    "latency_ms": float(os.getenv("STUB_LATENCY_MS", 20)),
+    "jitter_ms": float(os.getenv("STUB_JITTER_MS", 5)),
+    "slow_rate": float(os.getenv("STUB_SLOW_RATE", 0)),
+    "slow_ms": float(os.getenv("STUB_SLOW_MS", 2000)),
+    "error_rate": float(os.getenv("STUB_ERROR_RATE", 0)),
+}
+counters = {"requests": 0, "errors": 0, "slow": 0}
+
+app = FastAPI(title="Featherless inference stub")
+
+
+@app.post("/config")
+async def set_config(request: Request):
+    data = await request.json()
+    config.update({k: float(v) for k, v in data.items() if k in config})
+    return config
+
+
+@app.get("/stats")
+def stats():
+    return counters
+
+
+@app.post("/v1/inference")
+async def inference(request: Request):
+    counters["requests"] += 1
+    payload = await request.json()
+
+    latency = config["latency_ms"] + random.uniform(0, config["jitter_ms"])
+    if random.random() < config["slow_rate"]:
+        counters["slow"] += 1
+        latency = config["slow_ms"]
+    await asyncio.sleep(latency / 1000.0)
+
+    if random.random() < config["error_rate"]:
+        counters["errors"] += 1
+        return JSONResponse({"error": "injected failure"}, status_code=503)
+
+    # 1 : Maintain, matching FeatherlessClient._fallback_actions
+    return {"actions": {agent_id: 1 for agent_id in payload.get("observations", {})}}
@@ -0,0 +1,462 @@
+"""
+End-to-end fleet load test over MQTT.
+
+Simulates N homes with the home_simulator physics and publishes their
+telemetry as binary frames on `vpp/telemetry/batch`, every `--interval-ms`
+(100 ms in `architecture`). It subscribes to `vpp/control/#` and applies
+the commands to the simulated homes, which closes the loop. The backend
+echoes the newest telemetry `seq` it had applied in each control frame, so
+every control tick gives one command round-trip sample: from publishing
+that telemetry tick to receiving the control that answered it.
+
+Homes are spread over `--clients` MQTT connections. `--homes-per-frame`
+sets how many homes share a message: the default batches like a gateway,
+and 1 sends one message per home as single devices would.
+
+Without `--broker` the harness runs its own in-process broker
+(benchmarks.mqtt_broker). `--spawn-backend` starts `backend.main` under
+uvicorn in real-telemetry mode against that broker. It inherits the
+environment (e.g. CONTROL_HZ=10 for the 100 ms loop), and delta actuation
+is off unless MQTT_DELTA_ACTUATION is set. Otherwise point
+`--backend-url` / `--backend-pid` at a running backend.
+
+The report covers:
+
+- sustained telemetry and control msg/s
+- generator tick duration and lateness percentiles
+- command round-trip percentiles
+- the backend's control tick percentiles over the run, from /metrics
+- messages dropped at the generator, the broker and the backend ingest
+  buffer, and messages lost in transit
+- backend CPU and RSS, sampled from /proc
+
+    python -m benchmarks.fleet_loadgen --homes 10000 --spawn-backend
+    python -m benchmarks.fleet_loadgen --homes 100000 --interval-ms 100 --duration 60 --spawn-backend --out load.json
+    python -m benchmarks.fleet_loadgen --broker localhost:1883 --backend-url http://localhost:8000 --backend-pid 4242
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+import numpy as np
+from paho.mqtt.client import MQTT_ERR_SUCCESS, CallbackAPIVersion, Client
+
+from backend.fleet_state import COLUMNS
+from backend.home_simulator import ACTION_FIELDS, STATE_FIELDS, init_homes, step_homes
+from backend.homes_mqtt import CONTROL_BATCH_TOPIC, TELEMETRY_BATCH_TOPIC
+from backend.wire_format import KIND_CONTROL, MAX_RECORDS_PER_FRAME, FrameError, decode_frame, encode_telemetry
+from benchmarks._timing import percentiles, print_table
+from benchmarks.mqtt_broker import InProcessBroker
+
+logger = logging.getLogger(__name__)
+
+LOAD, GEN, SOC = (COLUMNS.index(c) for c in ("load_kw", "generation_kw", "battery_soc"))
+# Telemetry ticks remembered for matching echoed control seqs
+SENT_HISTORY = 4096
+
+
+class FleetLoadGenerator:
+    """
+    Publishes the telemetry of `n_homes` simulated homes every `interval`
+    seconds and times the control frames that come back.
+
+    Ticks run on their own thread against a drift-free schedule. A tick
+    that finishes late starts the next one straight away; ticks are never
+    skipped. Control frames are decoded on the paho network thread of the
+    first client. They write the actions into the simulator's control block,
+    and the first frame of each control tick is matched to the telemetry
+    tick its `seq` echoes.
+    """
+
+    def __init__(self, n_homes: int, broker: str = "127.0.0.1", port: int = 1883, interval: float = 0.1,
+                 clients: int = 4, homes_per_frame: int = MAX_RECORDS_PER_FRAME, max_queued: int = 100_000,
+                 seed: int = 0):
+        self.n_homes = n_homes
+        self.broker = broker
+        self.port = port
+        self.interval = interval
+        self.homes_per_frame = max(1, min(homes_per_frame, MAX_RECORDS_PER_FRAME))
+
+        rng = np.random.default_rng(seed)
+        self.rng = rng
+        self.fleet = np.zeros((len(COLUMNS), n_homes))
+        self.state = np.zeros((len(STATE_FIELDS), n_homes))
+        self.control = np.zeros((len(ACTION_FIELDS), n_homes))
+        init_homes(self.fleet, self.state, self.control, rng)
+
+        bounds = np.linspace(0, n_homes, max(1, min(clients, n_homes)) + 1).astype(int)
+        self.slices = [(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:])]
+        self.clients = []
+        for i in range(len(self.slices)):
+            client = Client(CallbackAPIVersion.VERSION2, f"vpp_loadgen_{os.getpid()}_{i}", clean_session=True)
+            client.max_queued_messages_set(max_queued)
+            self.clients.append(client)
+        self.clients[0].on_connect = self._on_connect
+        self.clients[0].on_message = self._on_message
+        self._subscribed = threading.Event()
+
+        self._sent = OrderedDict()  # telemetry seq -> monotonic publish time
+        self._last_control = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.measure_from = 0.0
+
+        self.ticks = 0
+        self.published = 0
+        self.publish_failures = 0
+        self.bytes_published = 0
+        self.control_frames = 0
+        self.control_ticks = 0
+        self.control_records = 0
+        self.control_unmatched = 0
+        self.decode_errors = 0
+        self.tick_ms = []
+        self.late_ms = []
+        self.rtt_ms = []
+
+    def connect(self, timeout: float = 10.0):
+        for client in self.clients:
+            client.connect(self.broker, self.port, 60)
+            client.loop_start()
+        if not self._subscribed.wait(timeout):
+            raise RuntimeError(f"Could not subscribe to control frames on {self.broker}:{self.port}")
+
+    def disconnect(self):
+        for client in self.clients:
+            client.loop_stop()
+            client.disconnect()
+
+    def _on_connect(self, client, userdata, flags, rc, properties=None):
+        if rc == 0:
+            client.subscribe("vpp/control/#")
+            self._subscribed.set()
+        else:
+            logger.error(f"Load generator failed to connect to MQTT, return code: {rc}")
+
+    def _on_message(self, client, userdata, msg):
+        received = time.monotonic()
+        if msg.topic != CONTROL_BATCH_TOPIC:
+            return  # per-home JSON control is not timed
+        try:
+            header, records = decode_frame(msg.payload)
+        except FrameError:
+            self.decode_errors += 1
+            return
+        if header["kind"] != KIND_CONTROL:
+            return
+        self.control_frames += 1
+        self.control_records += header["count"]
+        rows = records["row"].astype(np.int64)
+        valid = rows < self.n_homes
+        width = min(header["width"], len(ACTION_FIELDS))
+        self.control[:width, rows[valid]] = records["action"][valid, :width].T
+
+        # All frames of one control tick share its timestamp; time the first
+        if header["timestamp"] == self._last_control:
+            return
+        self._last_control = header["timestamp"]
+        self.control_ticks += 1
+        sent = self._sent.get(header["seq"])
+        if sent is None:
+            self.control_unmatched += 1
+        elif received >= self.measure_from and not self._stop.is_set():
+            self.rtt_ms.append((received - sent) * 1000.0)
+
+    def start(self, measure_after: float = 0.0):
+        self.measure_from = time.monotonic() + measure_after
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="fleet-loadgen", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            start = time.monotonic()
+            self.tick(seq=self.ticks)
+            if start >= self.measure_from:
+                self.late_ms.append((start - next_tick) * 1000.0)
+                self.tick_ms.append((time.monotonic() - start) * 1000.0)
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                next_tick = time.monotonic()  # late: start the next tick now, don't burst to catch up
+
+    def tick(self, seq: int):
+        """Steps the homes by one interval and publishes their telemetry as tick `seq`."""
+        step_homes(self.fleet, self.state, self.control, time.time(), self.interval, self.rng)
+        sent = self._sent
+        sent[seq & 0xFFFFFFFF] = time.monotonic()
+        if len(sent) > SENT_HISTORY:
+            sent.popitem(last=False)
+        for client, (lo, hi) in zip(self.clients, self.slices):
+            frames = encode_telemetry(
+                np.arange(lo, hi, dtype=np.uint32), self.fleet[LOAD, lo:hi], self.fleet[GEN, lo:hi],
+                self.fleet[SOC, lo:hi], seq=seq, max_records=self.homes_per_frame,
+            )
+            for frame in frames:
+                if client.publish(TELEMETRY_BATCH_TOPIC, frame).rc == MQTT_ERR_SUCCESS:
+                    self.published += 1
+                    self.bytes_published += len(frame)
+                else:
+                    self.publish_failures += 1
+        self.ticks += 1
+
+
+class ProcessSampler:
+    """CPU share and RSS of one process, sampled from /proc (Linux only)."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.clock_ticks = os.sysconf("SC_CLK_TCK")
+        self.cpu_pct = []
+        self.rss_mb = []
+        self._last = None
+
+    def _read(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / self.clock_ticks  # utime + stime
+        with open(f"/proc/{self.pid}/status") as f:
+            rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        return time.monotonic(), cpu, rss / 1024.0
+
+    def sample(self):
+        try:
+            now, cpu, rss = self._read()
+        except (OSError, StopIteration, IndexError):
+            return
+        if self._last is not None:
+            last_t, last_cpu = self._last
+            self.cpu_pct.append((cpu - last_cpu) / max(now - last_t, 1e-9) * 100.0)
+            self.rss_mb.append(rss)
+        self._last = (now, cpu)
+
+    def summary(self) -> dict:
+        if not self.cpu_pct:
+            return {}
+        return {
+            "backend_cpu_mean_pct": sum(self.cpu_pct) / len(self.cpu_pct),
+            "backend_cpu_max_pct": max(self.cpu_pct),
+            "backend_rss_mb": self.rss_mb[-1],
+            "backend_rss_max_mb": max(self.rss_mb),
+        }
+
+
+_METRIC_LINE = re.compile(r"^(\w+)(\{.*\})?\s+(\S+)$")
+
+
+async def scrape(http: httpx.AsyncClient, url: str) -> dict:
+    """The backend's /metrics as `{(name, labels): value}`, namespace prefix stripped."""
+    response = await http.get(f"{url}/metrics")
+    response.raise_for_status()
+    values = {}
+    for line in response.text.splitlines():
+        match = _METRIC_LINE.match(line)
+        if match:
+            name, labels, value = match.groups()
+            values[(name.split("_", 1)[1], labels or "")] = float(value)
+    return values
+
+
+def _counter(metrics: dict, name: str) -> float:
+    return metrics.get((name, ""), 0.0)
+
+
+def stage_percentiles(before: dict, after: dict, stage: str) -> dict:
+    """p50/p90/p99 of one stage's runs between two scrapes, from the histogram bucket deltas."""
+    prefix = f'{{stage="{stage}",le="'
+    buckets = []
+    for (name, labels), total in after.items():
+        if name == "stage_duration_seconds_bucket" and labels.startswith(prefix):
+            le = labels[len(prefix):-2]
+            bound = float("inf") if le == "+Inf" else float(le)
+            buckets.append((bound, total - before.get((name, labels), 0.0)))
+    buckets.sort()
+    if not buckets or not buckets[-1][1]:
+        return {}
+    count = buckets[-1][1]
+    out = {f"{stage}_ticks": int(count)}
+    for q in (0.50, 0.90, 0.99):
+        bound = next(b for b, c in buckets if c >= q * count)
+        out[f"{stage}_p{int(q * 100)}_ms"] = bound * 1000.0 if bound != float("inf") else None
+    return out
+
+
+def spawn_backend(n_homes: int, broker_host: str, broker_port: int, http_port: int, log_path: str):
+    # Full control frames every tick, so each one is a round-trip sample, unless the caller set it
+    env = {
+        "MQTT_DELTA_ACTUATION": "0",
+        **os.environ,
+        "MQTT_BROKER": broker_host,
+        "MQTT_PORT": str(broker_port),
+        "MQTT_SIMULATE_HOMES": "0",
+        "MQTT_WIRE_MODE": "binary",
+        "VPP_N_HOMES": str(n_homes),
+    }
+    log = open(log_path, "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(http_port), "--log-level", "warning"],
+        env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    logger.info(f"Started backend (pid {process.pid}), log in {log_path}")
+    return process
+
+
+async def wait_for_backend(http: httpx.AsyncClient, url: str, timeout: float, process=None):
+    """Returns once the backend's control stage has run; its lifespan may wait on MongoDB first."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Backend exited with code {process.returncode} during startup.")
+        try:
+            response = await http.get(f"{url}/api/scheduler")
+            if response.status_code == 200 and response.json().get("control", {}).get("runs", 0) > 0:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"Backend at {url} not ticking after {timeout:.0f} s.")
+
+
+async def run(args) -> dict:
+    broker = None
+    if args.broker:
+        host, _, port = args.broker.partition(":")
+        port = int(port or 1883)
+    else:
+        broker = InProcessBroker("127.0.0.1", args.broker_port)
+        await broker.start()
+        host, port = "127.0.0.1", broker.port
+
+    process = None
+    url = args.backend_url
+    pid = args.backend_pid
+    if args.spawn_backend:
+        process = spawn_backend(args.homes, host, port, args.backend_port, args.backend_log)
+        url = url or f"http://127.0.0.1:{args.backend_port}"
+        pid = process.pid
+
+    generator = FleetLoadGenerator(args.homes, host, port, interval=args.interval_ms / 1000.0,
+                                   clients=args.clients, homes_per_frame=args.homes_per_frame)
+    sampler = ProcessSampler(pid) if pid else None
+    report = {"homes": args.homes, "interval_ms": args.interval_ms, "duration_s": args.duration,
+              "clients": len(generator.clients), "homes_per_frame": generator.homes_per_frame}
+    try:
+        async with httpx.AsyncClient(timeout=10.0) as http:
+            if url:
+                await wait_for_backend(http, url, args.ready_timeout, process)
+            # The in-process broker runs on this loop, so block elsewhere
+            await asyncio.to_thread(generator.connect)
+            before = await scrape(http, url) if url else {}
+
+            generator.start(measure_after=args.warmup)
+            await asyncio.sleep(args.warmup)
+            measured_at = time.monotonic()
+            ticks, published, control_frames = generator.ticks, generator.published, generator.control_frames
+            if sampler is not None:
+                sampler.sample()
+            window = await scrape(http, url) if url else {}
+            while time.monotonic() - measured_at < args.duration:
+                await asyncio.sleep(1.0)
+                if sampler is not None:
+                    sampler.sample()
+            elapsed = time.monotonic() - measured_at
+            telemetry_rate = (generator.published - published) / elapsed
+            homes_rate = (generator.ticks - ticks) * generator.n_homes / elapsed
+            control_rate = (generator.control_frames - control_frames) / elapsed
+            await asyncio.to_thread(generator.stop)
+            await asyncio.sleep(args.settle)
+            after = await scrape(http, url) if url else {}
+    finally:
+        await asyncio.to_thread(generator.disconnect)
+        if process is not None:
+            process.terminate()
+            try:
+                await asyncio.to_thread(process.wait, 30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if broker is not None:
+            await broker.stop()
+
+    report.update({
+        "telemetry_msgs_s": telemetry_rate,
+        "homes_reported_s": homes_rate,
+        "control_msgs_s": control_rate,
+        "ticks": generator.ticks,
+        "published": generator.published,
+        "generator_dropped": generator.publish_failures,
+        "control_ticks": generator.control_ticks,
+        "control_unmatched": generator.control_unmatched,
+    })
+    for key, samples in (("tick", generator.tick_ms), ("late", generator.late_ms), ("rtt", generator.rtt_ms)):
+        if samples:
+            report.update({f"{key}_{k}": v for k, v in percentiles(samples).items()})
+    if broker is not None:
+        stats = broker.stats()
+        report.update({"broker_received": stats["received"], "broker_dropped": stats["dropped"]})
+    if after:
+        received = _counter(after, "mqtt_messages_received_total") - _counter(before, "mqtt_messages_received_total")
+        report.update({
+            "backend_received": int(received),
+            "backend_dropped": int(_counter(after, "mqtt_messages_dropped_total")
+                                   - _counter(before, "mqtt_messages_dropped_total")),
+            "lost_in_transit": int(generator.published - received),
+            "control_published": int(_counter(after, "mqtt_messages_published_total")
+                                     - _counter(before, "mqtt_messages_published_total")),
+            **stage_percentiles(window, after, args.stage),
+        })
+    if sampler is not None:
+        report.update(sampler.summary())
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--homes", type=int, default=10_000)
+    parser.add_argument("--interval-ms", type=float, default=100.0, help="telemetry period per home")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds, after the warmup")
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds to let queues drain before the final scrape")
+    parser.add_argument("--clients", type=int, default=4, help="MQTT connections the homes are spread over")
+    parser.add_argument("--homes-per-frame", type=int, default=MAX_RECORDS_PER_FRAME)
+    parser.add_argument("--broker", default=None, help="host[:port] of an external broker (default: in-process)")
+    parser.add_argument("--broker-port", type=int, default=0, help="port of the in-process broker (0 = any free)")
+    parser.add_argument("--spawn-backend", action="store_true", help="start backend.main against the broker")
+    parser.add_argument("--backend-port", type=int, default=8765)
+    parser.add_argument("--backend-log", default="loadgen_backend.log")
+    parser.add_argument("--backend-url", default=None, help="running backend to scrape /metrics from")
+    parser.add_argument("--backend-pid", type=int, default=None, help="running backend to sample CPU / RSS of")
+    parser.add_argument("--ready-timeout", type=float, default=180.0)
+    parser.add_argument("--stage", default="control", help="scheduler stage whose tick latency is reported")
+    parser.add_argument("--out", default=None, help="write the report JSON here")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+
+    report = asyncio.run(run(args))
+    print_table(f"Fleet load test ({args.homes} homes every {args.interval_ms:g} ms)",
+                [{"metric": k, "value": v} for k, v in report.items()], ["metric", "value"])
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
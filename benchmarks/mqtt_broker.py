@@ -0,0 +1,248 @@
+"""
+Minimal in-process MQTT 3.1.1 broker for load tests on machines without
+mosquitto.
+
+It covers what the backend and the fleet load generator use: CONNECT,
+SUBSCRIBE / UNSUBSCRIBE with `+` and `#` wildcards, PUBLISH, PINGREQ and
+DISCONNECT. Messages are delivered at QoS 0 whatever QoS they were
+published with. QoS 1 and 2 publishes are acknowledged so clients do not
+stall. There are no retained messages, sessions, wills or auth.
+
+A subscriber whose socket buffer is over `max_buffer` bytes is a slow
+consumer. Messages for it are dropped and counted instead of queued, so
+the broker shows backpressure rather than hiding it in memory.
+
+    python -m benchmarks.mqtt_broker --port 1883
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+def _remaining_length(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        n, digit = divmod(n, 128)
+        out.append(digit | (0x80 if n else 0))
+        if not n:
+            return bytes(out)
+
+
+def _packet(kind: int, flags: int, body: bytes) -> bytes:
+    return bytes([kind << 4 | flags]) + _remaining_length(len(body)) + body
+
+
+def _string(data: bytes, pos: int):
+    length = int.from_bytes(data[pos:pos + 2], "big")
+    return data[pos + 2:pos + 2 + length].decode(), pos + 2 + length
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """MQTT filter match: `+` is one level, a trailing `#` is any number of levels."""
+    levels = topic.split("/")
+    parts = pattern.split("/")
+    for i, part in enumerate(parts):
+        if part == "#":
+            return True
+        if i >= len(levels) or (part != "+" and part != levels[i]):
+            return False
+    return len(parts) == len(levels)
+
+
+class _Session(asyncio.Protocol):
+    """One client connection: frames packets out of the byte stream and hands them to the broker."""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.transport = None
+        self.client_id = None
+        self.filters = set()
+        self._buffer = bytearray()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.broker.connections += 1
+
+    def connection_lost(self, exc):
+        self.broker.drop_session(self)
+
+    def data_received(self, data):
+        buffer = self._buffer
+        buffer += data
+        pos = 0
+        end = len(buffer)
+        while end - pos >= 2:
+            # Fixed header: type/flags byte, then a 1-4 byte remaining length
+            length, shift, i, complete = 0, 0, pos + 1, False
+            while i < end and shift <= 21:
+                byte = buffer[i]
+                i += 1
+                length |= (byte & 0x7F) << shift
+                shift += 7
+                if not byte & 0x80:
+                    complete = True
+                    break
+            if not complete or end - i < length:
+                break
+            self._handle(buffer[pos] >> 4, buffer[pos] & 0x0F, bytes(buffer[i:i + length]))
+            pos = i + length
+        del buffer[:pos]
+
+    def _handle(self, kind: int, flags: int, body: bytes):
+        broker = self.broker
+        if kind == PUBLISH:
+            topic, pos = _string(body, 0)
+            qos = flags >> 1 & 0x03
+            if qos:
+                packet_id = body[pos:pos + 2]
+                pos += 2
+                self.transport.write(_packet(PUBACK if qos == 1 else PUBREC, 0, packet_id))
+            broker.publish(topic, body[pos:])
+        elif kind == PUBREL:
+            self.transport.write(_packet(PUBCOMP, 0, body[:2]))
+        elif kind == SUBSCRIBE:
+            pos, granted = 2, bytearray()
+            while pos < len(body):
+                pattern, pos = _string(body, pos)
+                pos += 1  # requested QoS; everything is delivered at 0
+                self.filters.add(pattern)
+                granted.append(0)
+            broker.invalidate()
+            self.transport.write(_packet(SUBACK, 0, body[:2] + bytes(granted)))
+        elif kind == UNSUBSCRIBE:
+            pos = 2
+            while pos < len(body):
+                pattern, pos = _string(body, pos)
+                self.filters.discard(pattern)
+            broker.invalidate()
+            self.transport.write(_packet(UNSUBACK, 0, body[:2]))
+        elif kind == CONNECT:
+            _, pos = _string(body, 0)
+            level = body[pos]
+            self.client_id, _ = _string(body, pos + 4)
+            if level not in (3, 4):
+                # Unacceptable protocol version
+                self.transport.write(_packet(CONNACK, 0, b"\x00\x01"))
+                self.transport.close()
+                return
+            self.transport.write(_packet(CONNACK, 0, b"\x00\x00"))
+        elif kind == PINGREQ:
+            self.transport.write(_packet(PINGRESP, 0, b""))
+        elif kind == DISCONNECT:
+            self.transport.close()
+
+
+class InProcessBroker:
+    """
+    Asyncio MQTT broker running on the caller's event loop.
+
+    Subscriber lists are resolved once per distinct topic and cached until
+    a subscription changes. A publish encodes its outgoing packet once and
+    writes the same bytes to every matching subscriber.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 1883, max_buffer: int = 64 * 1024 * 1024):
+        self.host = host
+        self.port = port
+        self.max_buffer = max_buffer
+        self.sessions = set()
+        self._routes = {}
+        self._server = None
+        self._started = None
+
+        self.connections = 0
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._server = await loop.create_server(lambda: self._track(_Session(self)), self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # resolves port 0
+        self._started = time.monotonic()
+        logger.info(f"In-process MQTT broker listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for session in list(self.sessions):
+                session.transport.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _track(self, session):
+        self.sessions.add(session)
+        return session
+
+    def drop_session(self, session):
+        self.sessions.discard(session)
+        if session.filters:
+            self.invalidate()
+
+    def invalidate(self):
+        self._routes.clear()
+
+    def publish(self, topic: str, payload: bytes):
+        self.received += 1
+        self.bytes_in += len(payload)
+        subscribers = self._routes.get(topic)
+        if subscribers is None:
+            subscribers = self._routes[topic] = [
+                s for s in self.sessions if any(topic_matches(f, topic) for f in s.filters)
+            ]
+        if not subscribers:
+            return
+        topic_bytes = topic.encode()
+        packet = _packet(PUBLISH, 0, len(topic_bytes).to_bytes(2, "big") + topic_bytes + payload)
+        for session in subscribers:
+            transport = session.transport
+            if transport.is_closing() or transport.get_write_buffer_size() > self.max_buffer:
+                self.dropped += 1
+                continue
+            transport.write(packet)
+            self.delivered += 1
+            self.bytes_out += len(packet)
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        return {
+            "clients": len(self.sessions),
+            "connections": self.connections,
+            "received": self.received,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "received_msgs_s": round(self.received / elapsed, 1) if elapsed else 0.0,
+            "mb_in": round(self.bytes_in / 1e6, 3),
+            "mb_out": round(self.bytes_out / 1e6, 3),
+        }
+
+
+async def _serve(host: str, port: int):
+    broker = InProcessBroker(host, port)
+    await broker.start()
+    try:
+        while True:
+            await asyncio.sleep(10.0)
+            logger.info(f"Broker: {broker.stats()}")
+    finally:
+        await broker.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    try:
+        asyncio.run(_serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
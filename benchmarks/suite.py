@@ -0,0 +1,343 @@
+"""
+Benchmark suite for the backend hot paths, with regression checks.
+
+Every case is timed at each fleet size and the results are written as
+JSON; `--compare` checks a run against a saved baseline and exits non-zero
+when any case got slower than `--threshold`. MQTT, Mongo and the policy
+are replaced by in-process stand-ins, so results only reflect our own code.
+Cases whose dependencies (e.g. ray) are not installed are reported as
+skipped.
+
+    python -m benchmarks.suite --out baseline.json
+    python -m benchmarks.suite --compare baseline.json --out current.json
+    python -m benchmarks.suite --sizes 100,1000 --cases control_tick,ws_broadcast
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from backend.attack_detector import SyncSpikeDetector
+from backend.database import WriteBehindQueue
+from backend.fleet_state import FleetState
+from backend.history import GridHistory
+from backend.homes_mqtt import MQTTHub
+from backend.patchtst_forecast import PatchTSTForecaster
+from backend.swing_equation import SwingEquation
+from backend.vpp_core import VPPVectorEnv
+from backend.ws_fanout import ConnectionManager
+from benchmarks._timing import time_call, print_table
+from benchmarks.bench_persistence import InMemoryDatabase
+from benchmarks.bench_ws_fanout import FakeWebSocket
+
+FLEET_SIZES = (100, 1_000, 10_000, 100_000)
+DASHBOARD_CLIENTS = 10
+REGRESSION_THRESHOLD = 0.25
+# Differences below this are timer noise, whatever the ratio
+NOISE_FLOOR_MS = 0.05
+
+
+class Skip(Exception):
+    """Raised by a case whose optional dependency is missing."""
+
+
+class LoopbackMQTTClient:
+    """paho Client stand-in: publishes are counted and dropped."""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def publish(self, topic, payload):
+        self.messages += 1
+        self.bytes += len(payload)
+
+
+class StubPolicy:
+    """Shared-policy stand-in: a two-layer MLP over the observation batch."""
+
+    def __init__(self, obs_dim: int = 4, hidden: int = 64, act_dim: int = VPPVectorEnv.ACT_DIM, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.W1 = rng.normal(0, 0.1, (obs_dim, hidden)).astype(np.float32)
+        self.W2 = rng.normal(0, 0.1, (hidden, act_dim)).astype(np.float32)
+
+    def compute_actions(self, obs_batch, explore=False):
+        hidden = np.maximum(np.asarray(obs_batch, dtype=np.float32) @ self.W1, 0.0)
+        return np.tanh(hidden @ self.W2), [], {}
+
+    def compute_single_action(self, obs, policy_id=None, explore=False):
+        return self.compute_actions(np.asarray(obs)[None])[0][0]
+
+
+def _hub(n: int, wire_mode: str) -> MQTTHub:
+    hub = MQTTHub(n_homes=n, wire_mode=wire_mode, simulate=True, sim_shards=0)
+    hub.client = LoopbackMQTTClient()
+    return hub
+
+
+class ControlLoop:
+    """
+    One orchestration tick through backend.main's own stage functions:
+    physics, control (telemetry, history, forecast, attack detection,
+    policy, fairness, actuation), persistence and broadcast. The module's
+    services are rebound for a fleet of `n` with every external one
+    in-process; the archive and checkpoint (disk I/O) are left out.
+    """
+
+    def __init__(self, n: int, loop: asyncio.AbstractEventLoop):
+        try:
+            from backend import main
+            from backend.database import Database
+            from backend.microgrid import MicrogridClusters
+            from backend.fairness import FairnessScheduler
+            from backend.rllib_marl import MARLController
+        except ImportError as e:
+            raise Skip(str(e))
+        self.main = main
+        hub = main.mqtt_hub = _hub(n, "binary")
+        main.swing_eq = SwingEquation()
+        main.history = GridHistory(hub.fleet)
+        main.forecaster = PatchTSTForecaster()
+        main.attack_detector = SyncSpikeDetector(n, home_ids=hub.fleet.home_ids)
+        if main.microgrid is not None:
+            main.microgrid = MicrogridClusters(n, main.microgrid.n_clusters, f_nominal=main.swing_eq.f_nominal)
+        if main.fairness is not None:
+            main.fairness = FairnessScheduler(n)
+        main.marl_controller = MARLController(n_homes=n, policy_mode="shared")
+        main.marl_controller.algo = main.marl_controller.policy = StubPolicy()
+        main.inference_worker = None
+        main.archive = None
+        main.manager = ConnectionManager()
+        main.state_store.update(current_freq=50.0, use_featherless=False, last_actions={}, last_actions_raw=None)
+
+        async def start():
+            Database.write_queue = WriteBehindQueue(InMemoryDatabase())
+            Database.write_queue.start()
+            for _ in range(DASHBOARD_CLIENTS):
+                await main.manager.connect(FakeWebSocket())
+        loop.run_until_complete(start())
+
+    async def tick(self):
+        main = self.main
+        main.physics_step()
+        await main.control_step()
+        await main.persistence_step()
+        await main.broadcast_step()
+
+
+def case_control_tick(n, loop):
+    control = ControlLoop(n, loop)
+    return lambda: loop.run_until_complete(control.tick())
+
+
+def case_swing_step(n, loop):
+    fleet = FleetState.random(n, seed=0)
+    swing = SwingEquation()
+    return lambda: swing.step(fleet.total_generation, fleet.total_load)
+
+
+def _vpp_env(n):
+    try:
+        from backend.vpp_env import VPPEnv
+    except ImportError as e:
+        raise Skip(str(e))
+    return VPPEnv({"n_homes": n, "seed": 0})
+
+
+def case_vpp_env_reset(n, loop):
+    env = _vpp_env(n)
+    return env.reset
+
+
+def case_vpp_env_step(n, loop):
+    env = _vpp_env(n)
+    env.reset()
+    actions = dict(zip(env.agent_ids, np.zeros((n, VPPVectorEnv.ACT_DIM), dtype=np.float32)))
+    return lambda: env.step(actions)
+
+
+def case_vpp_core_step(n, loop):
+    core = VPPVectorEnv(n_homes=n, seed=0)
+    core.reset()
+    actions = np.zeros((n, VPPVectorEnv.ACT_DIM), dtype=np.float32)
+    return lambda: core.step(actions)
+
+
+def case_marl_get_actions(n, loop):
+    try:
+        from backend.rllib_marl import MARLController
+    except ImportError as e:
+        raise Skip(str(e))
+    controller = MARLController(n_homes=n, policy_mode="shared")
+    # Stub model in place of the PPO build, so only our batching is timed
+    controller.algo = controller.policy = StubPolicy()
+    obs = FleetState.random(n, seed=0).observation_matrix(50.0)
+    return lambda: controller.get_actions(obs)
+
+
+def case_mqtt_poll_json(n, loop):
+    hub = _hub(n, "json")
+    return lambda: loop.run_until_complete(hub.poll_homes())
+
+
+def case_mqtt_send_json(n, loop):
+    hub = _hub(n, "json")
+    actions = StubPolicy().compute_actions(hub.fleet.observation_matrix(50.0))[0]
+    return lambda: hub.send_control_commands(actions)
+
+
+def case_mqtt_poll_binary(n, loop):
+    hub = _hub(n, "binary")
+    return lambda: loop.run_until_complete(hub.poll_homes())
+
+
+def case_mqtt_send_binary(n, loop):
+    hub = _hub(n, "binary")
+    actions = StubPolicy().compute_actions(hub.fleet.observation_matrix(50.0))[0]
+    return lambda: hub.send_control_commands(actions)
+
+
+def case_ws_broadcast(n, loop):
+    manager = ConnectionManager()
+    fleet = FleetState.random(n, seed=0)
+
+    async def connect():
+        for i in range(DASHBOARD_CLIENTS):
+            await manager.connect(FakeWebSocket(), fleet=i % 2 == 0)
+    loop.run_until_complete(connect())
+    message = {"type": "GRID_UPDATE", "frequency": 50.0, "total_load": fleet.total_load,
+               "total_generation": fleet.total_generation}
+
+    async def broadcast():
+        fleet.apply_noise()
+        await manager.broadcast(message)
+        manager.publish_fleet(fleet)
+    return lambda: loop.run_until_complete(broadcast())
+
+
+CASES = {
+    "control_tick": case_control_tick,
+    "swing_step": case_swing_step,
+    "vpp_env_reset": case_vpp_env_reset,
+    "vpp_env_step": case_vpp_env_step,
+    "vpp_core_step": case_vpp_core_step,
+    "marl_get_actions": case_marl_get_actions,
+    "mqtt_poll_json": case_mqtt_poll_json,
+    "mqtt_send_json": case_mqtt_send_json,
+    "mqtt_poll_binary": case_mqtt_poll_binary,
+    "mqtt_send_binary": case_mqtt_send_binary,
+    "ws_broadcast": case_ws_broadcast,
+}
+
+
+def _environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def _cancel_tasks(loop):
+    """Stops the sender / writer tasks a case left running on the shared loop."""
+    pending = asyncio.all_tasks(loop)
+    if not pending:
+        return
+    for task in pending:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+
+
+def run(cases=None, sizes=FLEET_SIZES) -> dict:
+    """Runs `cases` (default: all) at every size; returns the JSON-ready report."""
+    results = []
+    loop = asyncio.new_event_loop()
+    try:
+        for name in cases or CASES:
+            for n in sizes:
+                entry = {"case": name, "homes": n}
+                try:
+                    fn = CASES[name](n, loop)
+                except Skip as e:
+                    results.append({**entry, "skipped": str(e)})
+                    break
+                repeat = 20 if n <= 10_000 else 5
+                results.append({**entry, "repeat": repeat, **time_call(fn, repeat=repeat)})
+                _cancel_tasks(loop)
+    finally:
+        loop.close()
+    return {"environment": _environment(), "results": results}
+
+
+def compare(current: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> list:
+    """
+    Median-time ratio of every case/size present in both reports. A row is a
+    regression when it is more than `threshold` slower and the difference is
+    above the timer noise floor.
+    """
+    previous = {(r["case"], r["homes"]): r for r in baseline["results"] if "median_ms" in r}
+    rows = []
+    for r in current["results"]:
+        base = previous.get((r["case"], r["homes"]))
+        if base is None or "median_ms" not in r:
+            continue
+        ratio = r["median_ms"] / max(base["median_ms"], 1e-9)
+        rows.append({
+            "case": r["case"],
+            "homes": r["homes"],
+            "baseline_ms": base["median_ms"],
+            "median_ms": r["median_ms"],
+            "ratio": ratio,
+            "regression": ratio > 1.0 + threshold and r["median_ms"] - base["median_ms"] > NOISE_FLOOR_MS,
+        })
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, FLEET_SIZES)), help="comma-separated fleet sizes")
+    parser.add_argument("--cases", default=None, help=f"comma-separated subset of: {', '.join(CASES)}")
+    parser.add_argument("--out", default=None, help="write the results JSON here")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to check against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="allowed slowdown before a case is flagged (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    cases = args.cases.split(",") if args.cases else None
+    unknown = set(cases or ()) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+    report = run(cases, [int(s) for s in args.sizes.split(",")])
+
+    print_table("Backend hot paths", report["results"],
+                ["case", "homes", "median_ms", "mean_ms", "max_ms", "skipped"])
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            rows = compare(report, json.load(f), args.threshold)
+        print_table(f"Against {args.compare} (threshold {args.threshold:.0%})", rows,
+                    ["case", "homes", "baseline_ms", "median_ms", "ratio", "regression"])
+        regressions = [r for r in rows if r["regression"]]
+        if regressions:
+            print(f"\n{len(regressions)} regression(s).")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())